@@ -40,7 +40,7 @@ import bpy
 
 #Import User Libraries
 from .matrix_44 import Mat4
-from .bitstream import BitStream
+from .bitstream import BitStream, BudgetExceeded
 
 #Import Blender Classes
 from bpy.props import StringProperty
@@ -107,12 +107,16 @@ class ImportMT5(Operator, ImportHelper):
 		#Create ninja chunk model
 		mt5 = ShenmueModel(self.filepath)
 
-		#Read and load textures
-		mt5.loadTextureList()
-
-		#Parse model to mesh list
-		mt5.readModelList()
-		mt5.close()
+		#Read and load textures, then parse model to mesh list. A
+		#corrupt model stops at its work budget instead of hanging.
+		try:
+			mt5.loadTextureList()
+			mt5.readModelList()
+		except BudgetExceeded as err:
+			self.report({'ERROR'}, "Import stopped: %s" % err)
+			return {'CANCELLED'}
+		finally:
+			mt5.close()
 
 		#Get array of meshes
 		meshList = mt5.getMeshlist()
@@ -167,6 +171,8 @@ class ShenmueModel:
 		nbTex = self.bs.readUInt()
 
 		for i in range(nbTex):
+			self.bs.budget.spend('chunks')
+
 			#Check for png extension of texture Name
 			texName = "%s_%02d" % (texBase, i)
 			texPath = dirName + texName + ".png"
@@ -189,35 +195,42 @@ class ShenmueModel:
 		self.readNodeTree()
 		return 1
 
-	def readNodeTree(self, ptx = None, pvp = 0):
-		node = self.bs.readNode()
-		mtx = self.createMatrix(node, ptx)
+	def readNodeTree(self, ptx = None, pvp = 0, depth = 0):
+		#Children nest one level deeper, siblings are read in a loop at
+		#the same depth. Every node is charged to the chunk budget, so
+		#a sibling chain that loops back on itself still stops.
+		self.bs.budget.check('depth', depth)
 
-		model = None
+		while True:
+			self.bs.budget.spend('chunks')
+			node = self.bs.readNode()
+			mtx = self.createMatrix(node, ptx)
+
+			model = None
 
-		if node['model']:
-			self.bs.seek_set(node['model'])
-			model = self.bs.readModel()
+			if node['model']:
+				self.bs.seek_set(node['model'])
+				model = self.bs.readModel()
 
-			if model['vertex']:
-				self.bs.seek_set(model['vertex'])
-				self.readVertexList(model['nbVertex'], mtx)
+				if model['vertex']:
+					self.bs.seek_set(model['vertex'])
+					self.readVertexList(model['nbVertex'], mtx)
 
-			if model['polygon']:
-				self.bs.seek_set(model['polygon'])
-				self.readPolygonList(pvp)
+				if model['polygon']:
+					self.bs.seek_set(model['polygon'])
+					self.readPolygonList(pvp)
 
-		passOn = self.vertex_pointer
-		if model is not None:
-			passOn += model['nbVertex']
+			passOn = self.vertex_pointer
+			if model is not None:
+				passOn += model['nbVertex']
 
-		if node['child']:
-			self.bs.seek_set(node['child'])
-			self.readNodeTree(mtx, passOn)
+			if node['child']:
+				self.bs.seek_set(node['child'])
+				self.readNodeTree(mtx, passOn, depth + 1)
 
-		if(node['sibling']):
+			if not node['sibling']:
+				break
 			self.bs.seek_set(node['sibling'])
-			self.readNodeTree(ptx, pvp)
 
 		return 1
 
@@ -261,6 +274,8 @@ class ShenmueModel:
 		polygonStart = False
 
 		while True:
+			self.bs.budget.spend('chunks')
+
 			#Read dword as two shorts
 			cnkhead = self.bs.readUShort()
 			cnkflag = self.bs.readUShort()
@@ -313,6 +328,7 @@ class ShenmueModel:
 		for i in range(nbStrips):
 			strip = []
 			stripLen = abs(self.bs.readShort())
+			self.bs.budget.spend('strips', stripLen)
 
 			for k in range(stripLen):
 				#Read string indice
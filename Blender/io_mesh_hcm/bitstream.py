@@ -23,14 +23,54 @@ DEALINGS IN THE SOFTWARE.
 """
 #==============================================================
 
+import array
 import struct
 
+#Words searched at a time by find
+FIND_WORDS = 16384
+
+class BudgetExceeded(ValueError):
+
+	#Raised when the importer does more work than its budget allows
+
+	def __init__(self, name, limit):
+		ValueError.__init__(self, "%s budget of %d exceeded" % (name, limit))
+		self.name = name
+		self.limit = limit
+
+class Budget:
+
+	#Work one model may take before it is treated as corrupt. Totals
+	#are spent as the importer goes, sizes are checked one at a time.
+	LIMITS = {
+		'scan'   : 64 * 1024 * 1024,	#bytes searched for a tag or terminator
+		'chunks' : 1 << 20,				#polygon chunks and nodes parsed
+		'strips' : 1 << 22,				#strip indices read
+		'string' : 4096,				#length of one string
+		'depth'  : 512					#levels of child nodes below the root
+	}
+
+	def __init__(self, **limits):
+		self.limits = dict(Budget.LIMITS)
+		self.limits.update(limits)
+		self.used = dict.fromkeys(self.limits, 0)
+
+	def spend(self, name, amount = 1):
+		self.used[name] += amount
+		if self.used[name] > self.limits[name]:
+			raise BudgetExceeded(name, self.limits[name])
+
+	def check(self, name, value):
+		if value > self.limits[name]:
+			raise BudgetExceeded(name, self.limits[name])
+
 class BitStream:
 
 	PI = 3.141592
 
-	def __init__(self, filepath):
+	def __init__(self, filepath, budget = None):
 		self.offset = 0
+		self.budget = budget or Budget()
 		self.bs = open(filepath, 'rb')
 		self.bs.seek(0, 2)
 		self.length = self.bs.tell()
@@ -111,15 +151,26 @@ class BitStream:
 
 		return bytes
 
-	def find(self, bytes):
+	def find(self, target):
+		#Search word by word from the current position, a block at a
+		#time, stopping after the word found
 		origin = self.bs.tell()
+		pos = origin
+		end = self.length - 4
 
-		while self.bs.tell() < (self.length - 4):
+		while pos < end:
+			count = min(FIND_WORDS, (end - pos + 3) // 4)
+			words = array.array('I', self.bs.read(count * 4))
+			self.budget.spend('scan', count * 4)
 
-			uint = self.readUInt()
-			if uint == bytes:
+			try:
+				found = words.index(target)
+			except ValueError:
+				pos += count * 4
+				continue
 
-				return 1
+			self.bs.seek(pos + (found + 1) * 4, 0)
+			return 1
 
 		self.bs.seek(origin, 0)
 		return 0
@@ -133,11 +184,19 @@ class BitStream:
 
 		if length == 0:
 
-			while True:
-				ch = self.readByte()
-				if ch == 0:
-					break
-				string += chr(ch)
+			#Stop at the terminator or the string budget
+			limit = self.budget.limits['string']
+			start = self.bs.tell()
+			data = self.bs.read(limit + 1)
+			end = data.find(b'\0')
+			if end < 0 and len(data) > limit:
+				raise BudgetExceeded('string', limit)
+			elif end < 0:
+				raise struct.error("String runs past the end of the file")
+
+			self.budget.spend('scan', end + 1)
+			self.bs.seek(start + end + 1, 0)
+			string = data[:end].decode("latin-1")
 
 		else:
 
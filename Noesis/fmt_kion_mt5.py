@@ -23,13 +23,50 @@ DEALINGS IN THE SOFTWARE.
 """
 #==============================================================
 
-import math
 import noesis
-import struct
 import rapi
+import hashlib
+import collections
+from array import array
 from inc_noesis import *
 from inc_powervr import *
 
+#Work a model may take before it is treated as corrupt
+BUDGET = {
+    'chunks' : 1 << 20,     # nodes and polygon chunks parsed
+    'strips' : 1 << 22,     # strip indices read
+    'depth'  : 512          # levels of child nodes below the root
+}
+
+class BudgetExceeded(ValueError):
+    pass
+
+#Decoded textures kept for the whole Noesis session, by the hash of
+#their pvr data, so models that share textures decode them once.
+#TEXTURE_CACHE_BYTES is the size of the bitmaps held.
+TEXTURE_CACHE = collections.OrderedDict()
+TEXTURE_CACHE_LIMIT = 64 * 1024 * 1024
+TEXTURE_CACHE_BYTES = 0
+
+def decode_texture(data):
+    global TEXTURE_CACHE_BYTES
+
+    key = hashlib.sha1(data).digest()
+    if key in TEXTURE_CACHE:
+        TEXTURE_CACHE.move_to_end(key)
+        return TEXTURE_CACHE[key]
+
+    tex = PvrTexture(data)
+    entry = (tex.get_width(), tex.get_height(), tex.get_bitmap())
+    TEXTURE_CACHE[key] = entry
+    TEXTURE_CACHE_BYTES = TEXTURE_CACHE_BYTES + len(entry[2])
+
+    #Drop the least recently used past the limit, keeping the newest
+    while TEXTURE_CACHE_BYTES > TEXTURE_CACHE_LIMIT and len(TEXTURE_CACHE) > 1:
+        old = TEXTURE_CACHE.popitem(last = False)[1]
+        TEXTURE_CACHE_BYTES = TEXTURE_CACHE_BYTES - len(old[2])
+    return entry
+
 def registerNoesisTypes():
     #handle = noesis.register("Shenmue Dreamcast Model", ".mt5")
     #handle = noesis.register("Shenmue Dreamcast Model", ".hcm")
@@ -49,16 +86,21 @@ def noepyCheckType(data):
 def noepyLoadModel(data, mdlList):
     ctx = rapi.rpgCreateContext()
     model = ShenmueMt5(data)
-    model.parse()
+    try:
+        model.parse()
+    except BudgetExceeded as err:
+        print("Shenmue model stopped: %s" % err)
+        return 0
     rapi.rpgClearBufferBinds()
     noeMat = NoeModelMaterials(model.noeTextures, model.noeMaterials)
-    rapi.rpgBindPositionBuffer(model.vertex_list, noesis.RPGEODATA_FLOAT, 0x0C)
-    rapi.rpgBindNormalBuffer(model.normal_list, noesis.RPGEODATA_FLOAT, 0x0C)
+    rapi.rpgBindPositionBufferOfs(model.vertex_list, noesis.RPGEODATA_FLOAT, 0x18, 0x00)
+    rapi.rpgBindNormalBufferOfs(model.vertex_list, noesis.RPGEODATA_FLOAT, 0x18, 0x0C)
     rapi.rpgBindUV1Buffer(model.uv_list, noesis.RPGEODATA_FLOAT, 0x08)
 
+    #One strip per material
     for strip in model.polygon_list:
         rapi.rpgSetMaterial("material[%s]"%strip['texId'])
-        rapi.rpgCommitTriangles(strip['face'], noesis.RPGEODATA_USHORT, int(len(strip['face'])/2), noesis.RPGEO_TRIANGLE, 0)
+        rapi.rpgCommitTriangles(strip['face'], noesis.RPGEODATA_USHORT, len(strip['face']) // 2, noesis.RPGEO_TRIANGLE_STRIP, 0)
     mdl = rapi.rpgConstructModel()
     mdl.setModelMaterials(noeMat)
     mdlList.append(mdl)
@@ -73,15 +115,22 @@ class ShenmueMt5:
         self.model_ofs = 0
 
         self.vertex_ofs = 0
-        self.vertex_list = []
-        self.normal_list = []
-        self.uv_list = []
+        #Position and normal of each vertex, as stored in the file
+        self.vertex_list = array('f')
+        self.uv_list = array('f')
         self.polygon_list = []
         self.texture_list = []
         self.uv_table = {}
         self.bs = NoeBitStream(data)
+        self.view = memoryview(data)
         self.noeMaterials = []
         self.noeTextures = []
+        self.used = dict.fromkeys(BUDGET, 0)
+
+    def spend(self, name, amount = 1):
+        self.used[name] += amount
+        if self.used[name] > BUDGET[name]:
+            raise BudgetExceeded("%s budget of %d exceeded" % (name, BUDGET[name]))
 
     def parse(self):
         self.bs.seek(0x04)
@@ -100,64 +149,75 @@ class ShenmueMt5:
         iff = self.bs.readBytes(0x04).decode("ASCII").rstrip("\0")
         if iff != "TEXD":
             return
-        return
         self.bs.seek(0x04, NOESEEK_REL)
         nbTex = self.bs.readUInt()
         for i in range(nbTex):
-            iff = self.bs.readBytes(0x04).decode("ASCII").rstrip("\0")
-            if iff != "TEXN":
-                return
-            self.bs.seek(0x14, NOESEEK_REL)
-            texId = self.bs.readUInt()
-            texName = "texure[%d]"%texId
-
-            iff = self.bs.readBytes(0x04).decode("ASCII").rstrip("\0")
-            if iff != "PVRT":
+            self.spend('chunks')
+            if not self.find_pvrt():
                 return
-            texLen = self.bs.readUInt()
-            texData = self.bs.readBytes(texLen)
-            tex = PvrTexture(texData,texId,texName)
-            tex.convert()
+            #Only located here, decoded once a material uses it
+            tex = {}
+            tex['id'] = i
+            tex['length'] = self.bs.readUInt()
+            tex['offset'] = self.bs.tell()
             self.texture_list.append(tex)
+            self.bs.seek(tex['length'], NOESEEK_REL)
+
+    def find_pvrt(self):
+        PVRT = 0x54525650
+        while self.bs.tell() < self.bs.getSize() - 4:
+            if self.bs.readUInt() == PVRT:
+                return 1
+        return 0
 
     def generateNoeTextures(self):
+        #Polygons refer to textures by their place in the list
+        used = set(polygon.get('texId') for polygon in self.polygon_list)
         for tex in self.texture_list:
-            texId = tex.get_id()
-            name = tex.get_name()
-            width = tex.get_width()
-            height = tex.get_height()
-            bitmap = tex.get_bitmap()
+            texId = tex['id']
+            if texId not in used:
+                continue
+            name = "texture[%d]"%texId
+            data = self.view[tex['offset']:tex['offset'] + tex['length']]
+            width, height, bitmap = decode_texture(data)
             tex = NoeTexture(name, width, height, bitmap, noesis.NOESISTEX_RGBA32)
             self.noeTextures.append(tex)
             matName = "material[%d]"%texId
             noemat = NoeMaterial(matName, name)
             self.noeMaterials.append(noemat)
 
-    def crawl_nodes(self):
-        node = self.read_node()
+    def crawl_nodes(self, depth = 0):
+        #Only children nest, siblings are read in a loop at the same
+        #depth and each node is charged to the chunk budget
+        if depth > BUDGET['depth']:
+            raise BudgetExceeded("depth budget of %d exceeded" % BUDGET['depth'])
 
-        if node['model']:
-            self.bs.seek(node['model'], NOESEEK_ABS)
-            model = self.read_model()
+        while True:
+            self.spend('chunks')
+            node = self.read_node()
 
-            if model['vertex']:
-                self.bs.seek(model['vertex'], NOESEEK_ABS)
-                self.read_vertex_list(model['nbVertex'])
+            if node['model']:
+                self.bs.seek(node['model'], NOESEEK_ABS)
+                model = self.read_model()
 
-            if model['polygon']:
-                self.bs.seek(model['polygon'], NOESEEK_ABS)
-                self.read_polygon_list()
+                if model['vertex']:
+                    self.bs.seek(model['vertex'], NOESEEK_ABS)
+                    self.read_vertex_list(model['nbVertex'])
 
-            if model['vertex']:
-                self.vertex_ofs = self.vertex_ofs + model['nbVertex']
+                if model['polygon']:
+                    self.bs.seek(model['polygon'], NOESEEK_ABS)
+                    self.read_polygon_list()
 
-        if node['child']:
-            self.bs.seek(node['child'])
-            self.crawl_nodes()
+                if model['vertex']:
+                    self.vertex_ofs = self.vertex_ofs + model['nbVertex']
 
-        if node['sibling']:
+            if node['child']:
+                self.bs.seek(node['child'])
+                self.crawl_nodes(depth + 1)
+
+            if not node['sibling']:
+                break
             self.bs.seek(node['sibling'])
-            self.crawl_nodes()
 
     def read_node(self):
         node = {}
@@ -195,18 +255,11 @@ class ShenmueMt5:
         model['radius'] = self.bs.readFloat()
         return model
 
+    def vertex_count(self):
+        return len(self.vertex_list) // 6
+
     def read_vertex_list(self, nbVertex):
-        for i in range(nbVertex):
-            vertex = {}
-            x = self.bs.readFloat()
-            y = self.bs.readFloat()
-            z = self.bs.readFloat()
-            vertex['pos'] = [x, y, z]
-            x = self.bs.readFloat()
-            y = self.bs.readFloat()
-            z = self.bs.readFloat()
-            vertex['norm'] = [x, y, z]
-            self.vertex_list.append(vertex)
+        self.vertex_list.frombytes(self.bs.readBytes(nbVertex * 0x18))
 
     def read_polygon_list(self):
         polygon = {}
@@ -214,6 +267,7 @@ class ShenmueMt5:
         strip_start = False
         polygon_start = False
         while self.bs.tell() < self.bs.getSize() - 4:
+            self.spend('chunks')
             head = self.bs.readUShort()
             flag = self.bs.readUShort()
 
@@ -238,6 +292,7 @@ class ShenmueMt5:
                 for i in range(nbStrips):
                     strip = []
                     strip_len = abs(self.bs.readShort())
+                    self.spend('strips', strip_len)
                     for k in range(strip_len):
                         idx = self.bs.readShort() + self.vertex_ofs
 
@@ -249,13 +304,10 @@ class ShenmueMt5:
                             u1 = self.bs.readShort() / 0x3ff
                             v1 = self.bs.readShort() / 0x3ff
 
-                        if idx >= len(self.vertex_list):
+                        if idx >= self.vertex_count():
                             continue
 
-                        point = {}
-                        point['idx'] = idx
-                        point['uv'] = [u,v]
-                        strip.append(point)
+                        strip.append((idx, (u, v)))
                     polygon['strips'].append(strip)
                 strip_start = False
                 polygon_start = False
@@ -265,63 +317,56 @@ class ShenmueMt5:
                     self.bs.seek(2, NOESEEK_REL)
 
     def alignVertexMap(self):
+        #A vertex used with more than one uv is copied once per uv
+        self.uv_list = array('f', bytes(self.vertex_count() * 0x08))
         for polygon in self.polygon_list:
-            texId = polygon['texId']
             for strip in polygon['strips']:
                 for i in range(len(strip)):
-                    point = strip[i]
-                    idx = point['idx']
-                    if str(idx) not in self.uv_table:
-                        self.uv_table[str(idx)] = [idx]
-                        self.vertex_list[idx]['uv'] = point['uv']
+                    idx, uv = strip[i]
+                    copies = self.uv_table.get(idx)
+                    if copies is None:
+                        self.uv_table[idx] = { uv : idx }
+                        self.uv_list[idx * 2] = uv[0]
+                        self.uv_list[idx * 2 + 1] = uv[1]
+                    elif uv in copies:
+                        idx = copies[uv]
                     else:
-                        found = False
-                        for vpos in self.uv_table[str(idx)]:
-                            if self.vertex_list[vpos]['uv'] == point['uv']:
-                                idx = vpos
-                                found = True
-                                break
-                        if not found:
-                            vertex = self.vertex_list[idx].copy()
-                            vertex['uv'] = point['uv']
-                            vpos = len(self.vertex_list)
-                            self.vertex_list.append(vertex)
-                            self.uv_table[str(idx)].append(vpos)
-                            idx = vpos
+                        vpos = self.vertex_count()
+                        self.vertex_list.extend(self.vertex_list[idx * 6:idx * 6 + 6])
+                        self.uv_list.extend(uv)
+                        copies[uv] = vpos
+                        idx = vpos
                     strip[i] = idx
 
     def generate_buffer(self):
-        vlist_len = len(self.vertex_list)
-
-        pos = []
-        norm = []
-        uv = []
-        for vertex in self.vertex_list:
-            pos.extend(vertex['pos'])
-            norm.extend(vertex['norm'])
-            if 'uv' in vertex:
-                uv.extend(vertex['uv'])
-            else:
-                uv.extend([0.0, 0.0])
-        self.vertex_list = struct.pack('f'*len(pos), *pos)
-        self.normal_list = struct.pack('f'*len(norm), *norm)
-        self.uv_list = struct.pack('f'*len(uv), *uv)
-
-        tri = []
+        #The strips of each material are joined into a single strip
+        faces = collections.OrderedDict()
         for polygon in self.polygon_list:
-            texId = polygon['texId']
+            face = faces.setdefault(polygon['texId'], array('H'))
             for strip in polygon['strips']:
-                face = []
-                for i in range(len(strip) - 2):
-                    a = strip[i]
-                    b = strip[i + 1]
-                    c = strip[i + 2]
-                    if not i%2:
-                        face.extend([a,c,b])
-                    else:
-                        face.extend([a,b,c])
-                pack = {}
-                pack['texId'] = texId
-                pack['face'] = struct.pack('H'*len(face), *face)
-                tri.append(pack)
+                self.stitch_strip(face, strip)
+
+        tri = []
+        for texId, face in faces.items():
+            if not face:
+                continue
+            pack = {}
+            pack['texId'] = texId
+            pack['face'] = face.tobytes()
+            tri.append(pack)
         self.polygon_list = tri
+        self.vertex_list = self.vertex_list.tobytes()
+        self.uv_list = self.uv_list.tobytes()
+
+    def stitch_strip(self, face, strip):
+        if len(strip) < 3:
+            return
+        #Repeated indices between strips only make degenerate triangles
+        if face:
+            face.append(face[-1])
+        face.append(strip[0])
+        #Strips in the file wind the other way, so each one starts on an
+        #odd position, where the winding is flipped
+        if len(face) % 2 == 0:
+            face.append(strip[0])
+        face.extend(strip)
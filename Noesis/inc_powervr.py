@@ -25,9 +25,22 @@ DEALINGS IN THE SOFTWARE.
 
 import math
 import noesis
+import rapi
 import struct
 from inc_noesis import *
 
+#Native untwiddle and color conversion, in the Noesis builds that
+#have them. Otherwise textures are decoded in Python.
+NATIVE_IMAGE = hasattr(rapi, "imageUntwiddlePVR") and hasattr(rapi, "imageDecodeRaw")
+
+#Raw format of each color format for imageDecodeRaw, channels
+#listed from the lowest bit up
+RAW_FORMATS = {
+    0x00 : "b5g5r5a1",
+    0x01 : "b5g6r5",
+    0x02 : "b4g4r4a4"
+}
+
 def registerNoesisTypes():
 	handle = noesis.register("PowerVR Archive", ".kvm")
 	noesis.setHandlerTypeCheck(handle, artCheckType)
@@ -53,6 +66,7 @@ class PvmArchive:
 
     def __init__(self, data):
         self.bs = NoeBitStream(data)
+        self.view = memoryview(data)
         self.texList = self.read_header()
         self.parse_textures()
 
@@ -101,7 +115,9 @@ class PvmArchive:
             if not self.find():
                 return 0
             texLen = self.bs.readUInt()
-            pvrData = self.bs.readBytes(texLen)
+            texOfs = self.bs.tell()
+            pvrData = self.view[texOfs:texOfs + texLen]
+            self.bs.seek(texLen, NOESEEK_REL)
             pvrImg = PvrTexture(pvrData, i)
             tex['width'] = pvrImg.get_width()
             tex['height'] = pvrImg.get_height()
@@ -112,7 +128,11 @@ class PvrTexture:
     BYTE_SIZE          = 1
     WORD_SIZE          = 2
     CODE_COMPONENTS    = 4
-    LOOKUP_TABLE       = {}
+    HEADER_SIZE        = 8
+
+    #Twiddled order and RGBA colors, built once per size and format
+    ORDERS             = {}
+    COLOR_TABLES       = {}
 
     ARGB_1555          = 0x00
     RGB_565            = 0x01
@@ -140,10 +160,10 @@ class PvrTexture:
     SMALLVQ_MM         = 0x11
     TWIDDLED_MM_ALIAS  = 0x12
 
-    def __init__(self, data, texId = -1):
-        self.bs = NoeBitStream(data)
-        self.codebook = 0
+    def __init__(self, data, texId = -1, name = None):
+        self.view = memoryview(data)
         self.texId = texId
+        self.name = name or "texture[%d]" % texId
         self.width = None
         self.height = None
         self.mipWidth = None
@@ -156,11 +176,16 @@ class PvrTexture:
         self.isMipmap = False
         self.codebook_size = 256
 
-        self.dst_array = None
         self.read_header()
         self.debug()
         self.bitmap = self.create_bitmap()
 
+    def get_id(self):
+        return self.texId
+
+    def get_name(self):
+        return self.name
+
     def get_width(self):
         return self.width
 
@@ -183,13 +208,8 @@ class PvrTexture:
             return 256
 
     def read_header(self):
-        self.color_format = self.bs.readUByte()
-        self.data_format = self.bs.readUByte()
-        self.bs.seek(2, NOESEEK_REL)
-        self.width = self.bs.readUShort()
-        self.height = self.bs.readUShort()
-        data = self.bs.getBuffer(self.bs.tell(), self.bs.getSize())
-        self.bs = NoeBitStream(data)
+        head = struct.unpack_from("<BBxxHH", self.view, 0)
+        self.color_format, self.data_format, self.width, self.height = head
 
         if (
             self.data_format == PvrTexture.TWIDDLED or
@@ -238,7 +258,6 @@ class PvrTexture:
         if self.isCompressed:
             self.mipWidth = int(self.mipWidth / 2)
             self.mipHeight = int(self.mipHeight / 2)
-        self.dst_array = [None] * (self.mipWidth * self.mipHeight)
         return 1
 
     def debug(self):
@@ -278,144 +297,135 @@ class PvrTexture:
                     seek_ofs = seek_ofs + PvrTexture.WORD_SIZE
         return seek_ofs
 
-    def create_bitmap(self):
-        tmp_bitmap = []
-        if self.isCompressed:
-            cb_len = PvrTexture.WORD_SIZE
-            cb_len = cb_len * PvrTexture.CODE_COMPONENTS
-            cb_len = cb_len * self.codebook_size
-            data = self.bs.readBytes(cb_len)
-            self.codebook = NoeBitStream(data)
-            data = self.bs.getBuffer(self.bs.tell(), self.bs.getSize())
-            self.bs = NoeBitStream(data)
+    def get_codebook(self):
+        cb_len = PvrTexture.WORD_SIZE * PvrTexture.CODE_COMPONENTS * self.codebook_size
+        return self.view[PvrTexture.HEADER_SIZE:PvrTexture.HEADER_SIZE + cb_len]
 
+    def get_image_offset(self):
+        #Offset of the full size image, after the codebook and mipmaps
+        offset = PvrTexture.HEADER_SIZE
+        if self.isCompressed:
+            offset = offset + len(self.get_codebook())
         if self.isMipmap:
-            seek_ofs = self.get_mipmap_size()
-            self.bs.seek(seek_ofs, NOESEEK_REL)
-            data = self.bs.getBuffer(self.bs.tell(), self.bs.getSize())
-            self.bs = NoeBitStream(data)
-
-        if self.isTwiddled and self.mipWidth == self.mipHeight:
-            self.dst_array = self.detwiddle(self.mipWidth, self.mipHeight)
-
-        elif self.isTwiddled and self.mipWidth > self.mipHeight:
-            width = int(self.mipWidth / 2)
-            height = self.mipHeight
-
-            one = self.detwiddle(width, height)
-            self.bs.seek(int(self.bs.getSize() / 2), NOESEEK_ABS)
-            data = self.bs.getBuffer(self.bs.tell(), self.bs.getSize())
-            self.bs = NoeBitStream(data)
-            two = self.detwiddle(width, height)
-
-            idx1 = 0
-            idx2 = 0
-            for i in range(len(self.dst_array)):
-                x = i % self.mipWidth
-                if x < width:
-                    self.dst_array[i] = one[idx1]
-                    idx1 = idx1 + 1
-                else:
-                    self.dst_array[i] = two[idx2]
-                    idx2 = idx2 + 1
-
-        elif self.isTwiddled and self.mipWidth < self.mipHeight:
-            width = self.mipWidth
-            height = int(self.mipHeight / 2)
-
-            one = self.detwiddle(width, height)
-            self.bs.seek(int(self.bs.getSize() / 2), NOESEEK_ABS)
-            data = self.bs.getBuffer(self.bs.tell(), self.bs.getSize())
-            self.bs = NoeBitStream(data)
-            two = self.detwiddle(width, height)
-
-            idx1 = 0
-            idx2 = 0
-            for i in range(len(self.dst_array)):
-                if i < width * height:
-                    self.dst_array[i] = one[idx1]
-                    idx1 = idx1 + 1
-                else:
-                    self.dst_array[i] = two[idx2]
-                    idx2 = idx2 + 1
+            offset = offset + self.get_mipmap_size()
+        return offset
 
-        else:
-            for i in range(self.mipWidth*self.mipHeight):
-                if self.isCompressed :
-                    self.dst_array[i] = self.bs.readUByte()
-                else :
-                    self.dst_array[i] = self.bs.readUShort()
+    def create_bitmap(self):
+        if self.color_format not in RAW_FORMATS:
+            print("Color format: ", self.color_format)
+            noesis.doException("Non supported pvr color format")
+        if NATIVE_IMAGE:
+            return self.create_native_bitmap()
+
+        #Work on the texture data in place, one pass through a
+        #cached order and color table
+        offset = self.get_image_offset()
+        colors = self.color_table()
 
         if self.isCompressed:
-            x = 0
-            y = 0
-            tmp = [None] * (self.width * self.height)
-
-            for i in  range(len(self.dst_array)):
-                idx = self.untwiddle(x, y)
-                srcPos = self.dst_array[idx]
-                srcPos = srcPos * PvrTexture.WORD_SIZE
-                srcPos = srcPos * PvrTexture.CODE_COMPONENTS
-                self.codebook.seek(srcPos, NOESEEK_ABS)
-
-                for xOfs in range(2):
-                    for yOfs in range(2):
-                        idx = (y * 2 + yOfs) * self.width + (x * 2 + xOfs)
-                        tmp[idx] = self.codebook.readUShort()
-
-                x = x + 1
-                if x >= self.mipWidth:
-                    x = 0
-                    y = y + 1
-            self.dst_array = tmp
-
-        for i in  range(len(self.dst_array)):
-            if self.color_format == 0:
-                color = self.dst_array[i]
-                bitmap = self.ARGB_1555(color)
-                tmp_bitmap.extend(bitmap)
-            elif self.color_format == 1:
-                color = self.dst_array[i]
-                bitmap = self.ARGB_565(color)
-                tmp_bitmap.extend(bitmap)
-            elif self.color_format == 2:
-                color = self.dst_array[i]
-                bitmap = self.ARGB_4444(color)
-                tmp_bitmap.extend(bitmap)
-            else:
-                print("Color format: ", self.color_format)
-                noesis.doException("Non supported pvr color format")
-        return struct.pack('B'*len(tmp_bitmap), *tmp_bitmap)
-
-    def detwiddle(self, w, h):
-        arr = [None] * (w * h)
-        for y in range(h):
-            for x in range(w):
-                i = self.untwiddle(x, y)
-                idx = y * h + x
-                if self.isCompressed:
-                    self.bs.seek(i * PvrTexture.BYTE_SIZE, NOESEEK_ABS)
-                    arr[idx] = self.bs.readUByte()
-                else:
-                    self.bs.seek(i * PvrTexture.WORD_SIZE, NOESEEK_ABS)
-                    arr[idx] = self.bs.readUShort()
-        return arr
-
-    def untwiddle(self, x, y):
-        key = "{0}_{1}".format(x,y)
-        if key in PvrTexture.LOOKUP_TABLE:
-            return PvrTexture.LOOKUP_TABLE[key]
-        def UntwiddleValue(val):
-            untwiddled = 0
-            for i in range(10):
-                shift = int(math.pow(2, i))
-                if val & shift :
-                    untwiddled = untwiddled | (shift << i)
-            return untwiddled
-
-        pos = UntwiddleValue(y)  |  UntwiddleValue(x) << 1
-        PvrTexture.LOOKUP_TABLE[key] = pos
-        return pos
+            codebook = self.get_codebook().cast("H")
+            indices = self.view[offset:offset + self.mipWidth * self.mipHeight]
+            indices = [indices[i] for i in self.twiddle_order(self.mipWidth, self.mipHeight)]
+            pixels = [colors[v] for v in codebook]
+            return self.expand_codebook(indices, pixels)
+
+        #Words are read in the byte order of the machine, little endian
+        #like the textures on the machines Noesis runs on
+        words = self.view[offset:offset + self.width * self.height * PvrTexture.WORD_SIZE].cast("H")
+        if self.isTwiddled:
+            order = self.twiddle_order(self.width, self.height)
+            return b"".join([colors[words[i]] for i in order])
+        return b"".join([colors[v] for v in words])
+
+    def create_native_bitmap(self):
+        #Slice the image out of the data once and let Noesis do the
+        #per pixel work
+        offset = self.get_image_offset()
+
+        if self.isCompressed:
+            image = bytes(self.view[offset:offset + self.mipWidth * self.mipHeight])
+            image = self.untwiddle_native(image, self.mipWidth, self.mipHeight, 8)
+            codebook = self.get_codebook()
+            pixels = [bytes(codebook[i:i + 2]) for i in range(0, len(codebook), 2)]
+            image = self.expand_codebook(image, pixels)
+        else:
+            image = bytes(self.view[offset:offset + self.width * self.height * PvrTexture.WORD_SIZE])
+            if self.isTwiddled:
+                image = self.untwiddle_native(image, self.width, self.height, 16)
+
+        return rapi.imageDecodeRaw(image, self.width, self.height, RAW_FORMATS[self.color_format])
+
+    def untwiddle_native(self, image, w, h, bpp):
+        #Rectangles are stored as squares one after another
+        size = min(w, h)
+        step = size * size * bpp // 8
+        squares = []
+        for ofs in range(0, step * (w * h // (size * size)), step):
+            squares.append(rapi.imageUntwiddlePVR(image[ofs:ofs + step], size, size, bpp))
+
+        if w <= h:
+            return b"".join(squares)
+
+        #Side by side squares are joined row by row
+        stride = size * bpp // 8
+        rows = []
+        for y in range(size):
+            for square in squares:
+                rows.append(square[y * stride:(y + 1) * stride])
+        return b"".join(rows)
+
+    def expand_codebook(self, indices, pixels):
+        #Each entry covers 2x2 pixels, stored column by column, so an
+        #index row becomes a row of top pixels and a row of bottom ones
+        top = [pixels[i] + pixels[i + 2] for i in range(0, len(pixels), 4)]
+        bottom = [pixels[i + 1] + pixels[i + 3] for i in range(0, len(pixels), 4)]
+
+        rows = []
+        for y in range(0, len(indices), self.mipWidth):
+            line = indices[y:y + self.mipWidth]
+            rows.append(b"".join([top[i] for i in line]))
+            rows.append(b"".join([bottom[i] for i in line]))
+        return b"".join(rows)
+
+    def twiddle_order(self, w, h):
+        #Position in the data of each pixel, top row first. Rectangles
+        #are stored as squares one after another.
+        key = (w, h)
+        if key in PvrTexture.ORDERS:
+            return PvrTexture.ORDERS[key]
+
+        size = min(w, h)
+        spread = [self.untwiddle_value(i) for i in range(size)]
+        columns = [(x // size) * size * size | spread[x % size] << 1 for x in range(w)]
+        rows = [(y // size) * size * size | spread[y % size] for y in range(h)]
+
+        order = [row | column for row in rows for column in columns]
+        PvrTexture.ORDERS[key] = order
+        return order
+
+    def untwiddle_value(self, val):
+        untwiddled = 0
+        for i in range(10):
+            shift = int(math.pow(2, i))
+            if val & shift :
+                untwiddled = untwiddled | (shift << i)
+        return untwiddled
+
+    def color_table(self):
+        #RGBA bytes of every 16 bit color
+        if self.color_format in PvrTexture.COLOR_TABLES:
+            return PvrTexture.COLOR_TABLES[self.color_format]
+
+        if self.color_format == 0:
+            convert = self.ARGB_1555
+        elif self.color_format == 1:
+            convert = self.ARGB_565
+        else:
+            convert = self.ARGB_4444
+
+        table = [bytes(convert(v)) for v in range(0x10000)]
+        PvrTexture.COLOR_TABLES[self.color_format] = table
+        return table
 
     def ARGB_1555 (self, v):
         a = 0xFF if (v & (1<<15)) else 0
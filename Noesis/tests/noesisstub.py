@@ -0,0 +1,257 @@
+#==============================================================
+"""
+
+Noesis Stand-in
+The noesis, rapi and inc_noesis modules exist only inside Noesis.
+install() puts small Python versions of the parts the plugins use
+in their place, so the plugins can be loaded and checked offline.
+rapi records the buffers, materials and triangles it is given,
+and the calls to its image routines.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import sys
+import types
+import struct
+
+NOESIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#==============================================================
+"""
+inc_noesis
+"""
+#==============================================================
+
+NOESEEK_ABS = 0
+NOESEEK_REL = 1
+
+class NoeBitStream:
+
+    def __init__(self, data):
+        self.data = bytes(data)
+        self.pos = 0
+
+    def read(self, fmt):
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos = self.pos + struct.calcsize(fmt)
+        return value
+
+    def readUByte(self):
+        return self.read("<B")
+
+    def readUShort(self):
+        return self.read("<H")
+
+    def readShort(self):
+        return self.read("<h")
+
+    def readUInt(self):
+        return self.read("<I")
+
+    def readFloat(self):
+        return self.read("<f")
+
+    def readBytes(self, length):
+        data = self.data[self.pos:self.pos + length]
+        self.pos = self.pos + length
+        return data
+
+    def seek(self, offset, how = NOESEEK_ABS):
+        if how == NOESEEK_REL:
+            offset = offset + self.pos
+        self.pos = offset
+
+    def tell(self):
+        return self.pos
+
+    def getSize(self):
+        return len(self.data)
+
+class NoeTexture:
+
+    def __init__(self, name, width, height, pixelData, pixelType):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.pixelData = pixelData
+        self.pixelType = pixelType
+
+class NoeMaterial:
+
+    def __init__(self, name, texName):
+        self.name = name
+        self.texName = texName
+
+class NoeModelMaterials:
+
+    def __init__(self, texList, matList):
+        self.texList = texList
+        self.matList = matList
+
+#==============================================================
+"""
+noesis
+"""
+#==============================================================
+
+RPGEODATA_FLOAT = 0
+RPGEODATA_USHORT = 1
+RPGEO_TRIANGLE = 2
+RPGEO_TRIANGLE_STRIP = 3
+NOESISTEX_RGBA32 = 1
+
+def doException(message):
+    raise RuntimeError(message)
+
+def logFlush():
+    pass
+
+#==============================================================
+"""
+rapi
+"""
+#==============================================================
+
+class Rapi:
+
+    def __init__(self):
+        self.log = []
+
+    def rpgCreateContext(self):
+        del self.log[:]
+        return 1
+
+    def rpgClearBufferBinds(self):
+        pass
+
+    def rpgBindPositionBufferOfs(self, data, dataType, stride, offset):
+        self.log.append(("position", bytes(data), stride, offset))
+
+    def rpgBindNormalBufferOfs(self, data, dataType, stride, offset):
+        self.log.append(("normal", bytes(data), stride, offset))
+
+    def rpgBindUV1Buffer(self, data, dataType, stride):
+        self.log.append(("uv", bytes(data), stride, 0))
+
+    def rpgSetMaterial(self, name):
+        self.log.append(("material", name))
+
+    def rpgCommitTriangles(self, data, dataType, count, primType, flags):
+        self.log.append(("triangles", bytes(data), dataType, count, primType))
+
+    def rpgConstructModel(self):
+        return StubModel()
+
+    def imageUntwiddlePVR(self, data, width, height, bpp):
+        #Square images only, as in Noesis. The y bits of a position
+        #are the even bits of its twiddled index, x the odd ones.
+        if width != height or width & (width - 1):
+            raise ValueError("Untwiddle needs a power of two square")
+        size = bpp // 8
+        if len(data) != width * height * size:
+            raise ValueError("Untwiddle given %d bytes" % len(data))
+        self.log.append(("untwiddle", width, height, bpp))
+
+        out = bytearray(len(data))
+        for y in range(height):
+            for x in range(width):
+                i = 0
+                for bit in range(width.bit_length()):
+                    i |= ((y >> bit) & 1) << (2 * bit) | ((x >> bit) & 1) << (2 * bit + 1)
+                pos = (y * width + x) * size
+                out[pos:pos + size] = data[i * size:(i + 1) * size]
+        return bytes(out)
+
+    def imageDecodeRaw(self, data, width, height, fmt):
+        #Little endian 16 bit pixels to RGBA32. fmt lists channels from
+        #the lowest bit up, each moved to the top of its byte and one
+        #bit channels set to 0 or 255. Formats without alpha are opaque.
+        fields = []
+        shift = 0
+        for channel, bits in zip(fmt[0::2], fmt[1::2]):
+            fields.append(("rgba".index(channel), shift, int(bits)))
+            shift = shift + int(bits)
+        if shift != 16 or len(data) != width * height * 2:
+            raise ValueError("Cannot decode %d bytes as %s" % (len(data), fmt))
+        self.log.append(("decode", width, height, fmt))
+
+        out = bytearray(width * height * 4)
+        if "a" not in fmt:
+            out[3::4] = b"\xff" * (width * height)
+        for n, (value,) in enumerate(struct.iter_unpack("<H", data)):
+            for place, start, bits in fields:
+                part = (value >> start) & ((1 << bits) - 1)
+                out[n * 4 + place] = 0xFF * part if bits == 1 else part << (8 - bits)
+        return bytes(out)
+
+    def setPreviewOption(self, name, value):
+        pass
+
+    def rpgOptimize(self):
+        pass
+
+class StubModel:
+
+    def setModelMaterials(self, materials):
+        self.materials = materials
+
+#==============================================================
+"""
+Install
+"""
+#==============================================================
+
+def install():
+    #Register the stand-ins and make the plugins importable
+    thisModule = sys.modules[__name__]
+
+    noesis = types.ModuleType("noesis")
+    for name in ("RPGEODATA_FLOAT", "RPGEODATA_USHORT", "RPGEO_TRIANGLE",
+                 "RPGEO_TRIANGLE_STRIP", "NOESISTEX_RGBA32", "doException", "logFlush"):
+        setattr(noesis, name, getattr(thisModule, name))
+
+    incNoesis = types.ModuleType("inc_noesis")
+    for name in ("NOESEEK_ABS", "NOESEEK_REL", "NoeBitStream", "NoeTexture",
+                 "NoeMaterial", "NoeModelMaterials"):
+        setattr(incNoesis, name, getattr(thisModule, name))
+
+    #Bound methods and the log of one Rapi
+    stub = Rapi()
+    rapi = types.ModuleType("rapi")
+    for name in dir(stub):
+        if not name.startswith("_"):
+            setattr(rapi, name, getattr(stub, name))
+    rapi.stub = stub
+
+    sys.modules.setdefault("noesis", noesis)
+    sys.modules.setdefault("inc_noesis", incNoesis)
+    sys.modules.setdefault("rapi", rapi)
+    if NOESIS_DIR not in sys.path:
+        sys.path.insert(0, NOESIS_DIR)
+    return sys.modules["rapi"].stub
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,231 @@
+#==============================================================
+"""
+
+Shenmue Model Strip Tests
+The importer joins the strips of each material into one triangle
+strip with degenerate triangles between them. Expanded again, the
+committed strip must give the triangles of the old importer, which
+cut each strip into triangles itself, with the same winding.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import sys
+import random
+import struct
+import unittest
+import collections
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+#Import User Libraries
+import noesisstub
+rapi = noesisstub.install()
+import fmt_kion_mt5
+
+NODE_SIZE = 0x40
+MODEL_SIZE = 0x20
+VERTEX_SIZE = 0x18
+
+def make_vertex(i):
+    #Small whole numbers are stored exactly as floats
+    return (i, i % 7, -i, 0, 1, 0)
+
+def make_mt5(nbVertex, polygons, textures = []):
+    #One node holding one model. polygons is a list of texId and
+    #strips, each strip a list of index, u, v. textures are the pvr
+    #data of each texture, from its header on.
+    model_ofs = 0x0C
+    vertex_ofs = model_ofs + NODE_SIZE + MODEL_SIZE
+    polygon_ofs = vertex_ofs + nbVertex * VERTEX_SIZE
+
+    chunks = b""
+    for texId, strips in polygons:
+        chunk = struct.pack("<HHHHHH", 0x0002, 0x0010, 0x0009, texId, 0x0011, 0)
+        chunk += struct.pack("<H", len(strips))
+        for k, strip in enumerate(strips):
+            #Strip lengths are stored with either sign
+            length = len(strip) if k % 2 else -len(strip)
+            chunk += struct.pack("<h", length)
+            for point in strip:
+                chunk += struct.pack("<hhh", *point)
+        if len(chunk) % 4:
+            chunk += b"\0\0"
+        chunks += chunk
+    chunks += struct.pack("<HH", 0x8000, 0xFFFF)
+    tex_ofs = polygon_ofs + len(chunks)
+
+    data = b"HRCM" + struct.pack("<II", tex_ofs, model_ofs)
+    data += struct.pack("<IIIII3f3fIIIII", 0, vertex_ofs - MODEL_SIZE, 0, 0, 0,
+                        1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0)
+    data += struct.pack("<IIII4f", 0, vertex_ofs, nbVertex, polygon_ofs, 0, 0, 0, 1)
+    for i in range(nbVertex):
+        data += struct.pack("<6f", *make_vertex(i))
+    if not textures:
+        #No TEXD chunk, the model has no textures
+        return data + chunks + b"\0" * 4
+
+    texd = b""
+    for i, texture in enumerate(textures):
+        texd += b"TEXN" + struct.pack("<IQ", 0x18 + len(texture), i)
+        texd += b"PVRT" + struct.pack("<I", len(texture)) + texture
+    return data + chunks + b"TEXD" + struct.pack("<II", 0x0C + len(texd), len(textures)) + texd
+
+def as_float(value):
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+def point_key(point):
+    #Position and uv of one strip point, as the importer stores them
+    idx, u, v = point
+    return (make_vertex(idx)[:3], (as_float(u / 0x3ff), as_float(v / 0x3ff)))
+
+def rotate(tri):
+    #Same triangle and winding whichever corner comes first
+    k = tri.index(min(tri))
+    return tri[k:] + tri[:k]
+
+def baseline_triangles(polygons):
+    #Triangles of each strip cut one by one, as the importer did
+    #before strips were joined
+    mats = collections.defaultdict(collections.Counter)
+    for texId, strips in polygons:
+        for strip in strips:
+            keys = [point_key(point) for point in strip]
+            for i in range(len(keys) - 2):
+                a = keys[i]
+                b = keys[i + 1]
+                c = keys[i + 2]
+                tri = (a, c, b) if not i % 2 else (a, b, c)
+                if len(set(tri)) == 3:
+                    mats["material[%d]" % texId][rotate(tri)] += 1
+    return mats
+
+def committed_triangles(log):
+    #Expand every committed strip, skipping degenerate triangles
+    buffers = {}
+    mats = collections.defaultdict(collections.Counter)
+    material = None
+    for entry in log:
+        if entry[0] in ("position", "uv"):
+            buffers[entry[0]] = entry[1:]
+        elif entry[0] == "material":
+            material = entry[1]
+        elif entry[0] == "triangles":
+            data, dataType, count, primType = entry[1:]
+            if primType != noesisstub.RPGEO_TRIANGLE_STRIP:
+                raise ValueError("Expected a triangle strip")
+            if count != len(data) // 2:
+                raise ValueError("Index count does not match the buffer")
+            face = struct.unpack("<%dH" % count, data)
+            for i in range(len(face) - 2):
+                if not i % 2:
+                    tri = (face[i], face[i + 1], face[i + 2])
+                else:
+                    tri = (face[i + 1], face[i], face[i + 2])
+                if len(set(tri)) < 3:
+                    continue
+                mats[material][rotate(tuple(vertex_key(buffers, i) for i in tri))] += 1
+    return mats
+
+def vertex_key(buffers, idx):
+    data, stride, offset = buffers["position"]
+    pos = struct.unpack_from("<3f", data, idx * stride + offset)
+    data, stride, offset = buffers["uv"]
+    uv = struct.unpack_from("<2f", data, idx * stride + offset)
+    return (pos, uv)
+
+def load(data):
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not fmt_kion_mt5.noepyLoadModel(data, []):
+            raise ValueError("Model did not load")
+    return list(rapi.log)
+
+class StripTest(unittest.TestCase):
+
+    def check(self, nbVertex, polygons):
+        log = load(make_mt5(nbVertex, polygons))
+        expected = baseline_triangles(polygons)
+        self.assertEqual(committed_triangles(log), expected)
+
+        #One commit per material
+        materials = [entry[1] for entry in log if entry[0] == "material"]
+        self.assertEqual(len(materials), len(set(materials)))
+        self.assertLessEqual(set(expected), set(materials))
+        return log
+
+    def test_strip_lengths(self):
+        #Odd and even lengths move the end of the joined strip between
+        #odd and even positions. Strips under 3 points add nothing.
+        polygons = [
+            (0, [[(0, 0, 0), (1, 0, 0), (2, 0, 0)],
+                 [(3, 0, 0), (4, 0, 0), (5, 0, 0), (6, 0, 0)],
+                 [(7, 0, 0)],
+                 [(2, 0, 0), (5, 0, 0), (8, 0, 0), (9, 0, 0), (1, 0, 0)],
+                 [(4, 0, 0), (6, 0, 0)],
+                 [],
+                 [(9, 0, 0), (8, 0, 0), (7, 0, 0), (6, 0, 0), (5, 0, 0), (4, 0, 0)]])
+        ]
+        self.check(10, polygons)
+
+    def test_materials(self):
+        #Polygons of one texture are joined even when apart in the file
+        polygons = [
+            (0, [[(0, 0, 0), (1, 0, 0), (2, 0, 0), (3, 0, 0)]]),
+            (1, [[(4, 0, 0), (5, 0, 0), (6, 0, 0)], [(1, 0, 0), (2, 0, 0)]]),
+            (0, [[(5, 0, 0), (6, 0, 0), (7, 0, 0)], [(2, 0, 0), (3, 0, 0), (4, 0, 0), (5, 0, 0), (6, 0, 0)]]),
+            (2, [[(0, 0, 0), (7, 0, 0)]])
+        ]
+        log = self.check(8, polygons)
+        self.assertEqual(len([entry for entry in log if entry[0] == "triangles"]), 2)
+
+    def test_shared_vertices(self):
+        #A vertex used with two uvs is copied, and repeated points in a
+        #strip of the file make degenerate triangles of their own
+        polygons = [
+            (3, [[(0, 10, 20), (1, 10, 20), (2, 10, 20), (2, 10, 20), (3, 0, 0)],
+                 [(0, 30, 40), (1, 30, 40), (3, 0, 0), (4, 5, 5)]])
+        ]
+        self.check(5, polygons)
+
+    def test_random_models(self):
+        rand = random.Random(50)
+        for seed in range(20):
+            nbVertex = rand.randrange(3, 40)
+            polygons = []
+            for i in range(rand.randrange(1, 12)):
+                strips = []
+                for k in range(rand.randrange(1, 6)):
+                    strips.append([(rand.randrange(nbVertex), rand.randrange(3) * 100, 0)
+                                   for n in range(rand.randrange(0, 12))])
+                polygons.append((rand.randrange(4), strips))
+            self.check(nbVertex, polygons)
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
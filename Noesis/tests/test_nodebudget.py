@@ -0,0 +1,121 @@
+#==============================================================
+"""
+
+Shenmue Model Budget Tests
+Runs the Noesis importer over the .mt5 files of the budget corpus
+in PythonPVR/tests/corpus. Every model must load, stop with
+BudgetExceeded, or run off the end of its data, within a time
+limit. Long rows of sibling nodes are valid and must load; deep
+nesting and node loops must exhaust the budget they were built for.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import sys
+import time
+import struct
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+#Import User Libraries
+import noesisstub
+rapi = noesisstub.install()
+import fmt_kion_mt5
+
+CORPUS = os.path.join(noesisstub.NOESIS_DIR, "..", "PythonPVR", "tests", "corpus")
+
+#Budget each hostile model must exhaust, and the limits it is read
+#with so the test stays quick
+HOSTILE = {
+    "nodes_deep.mt5" : ('depth', {}),
+    "nodes_loop.mt5" : ('chunks', { 'chunks' : 4096 })
+}
+
+#Models that must load
+VALID = [ "seed.mt5", "nodes_siblings.mt5" ]
+
+#Seconds any one model may take, far more than a budget allows
+TIME_LIMIT = 5.0
+
+def parse(name, limits = {}):
+    with open(os.path.join(CORPUS, name), 'rb') as f:
+        data = f.read()
+
+    saved = dict(fmt_kion_mt5.BUDGET)
+    fmt_kion_mt5.BUDGET.update(limits)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            model = fmt_kion_mt5.ShenmueMt5(data)
+            model.parse()
+        return model
+    finally:
+        fmt_kion_mt5.BUDGET.clear()
+        fmt_kion_mt5.BUDGET.update(saved)
+
+class NodeBudgetTest(unittest.TestCase):
+
+    def test_corpus_within_budget(self):
+        names = sorted(n for n in os.listdir(CORPUS) if n.endswith(".mt5") and n not in HOSTILE)
+        self.assertTrue(names)
+        for name in names:
+            start = time.perf_counter()
+            try:
+                model = parse(name)
+            except fmt_kion_mt5.BudgetExceeded:
+                model = None
+            except (struct.error, RuntimeError):
+                #Read past the end of the data, or an unsupported
+                #texture reported through noesis.doException
+                model = None
+            self.assertLess(time.perf_counter() - start, TIME_LIMIT, name)
+
+            if model is not None:
+                for key, used in model.used.items():
+                    self.assertLessEqual(used, fmt_kion_mt5.BUDGET[key], name)
+            if name in VALID:
+                self.assertIsNotNone(model, name)
+
+    def test_sibling_rows_load(self):
+        #Siblings are not nesting, so a row far longer than the depth
+        #budget loads
+        model = parse("nodes_siblings.mt5")
+        self.assertEqual(model.used['chunks'], 2048)
+
+    def test_hostile_models_exceed_budget(self):
+        for name, (expected, limits) in sorted(HOSTILE.items()):
+            start = time.perf_counter()
+            with self.assertRaises(fmt_kion_mt5.BudgetExceeded, msg = name) as caught:
+                parse(name, limits)
+            self.assertTrue(str(caught.exception).startswith(expected), name)
+            self.assertLess(time.perf_counter() - start, TIME_LIMIT, name)
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,124 @@
+#==============================================================
+"""
+
+PowerVR Decode Tests
+Textures decoded through the native rapi routines must match the
+Python decoder pixel for pixel, for every color format and every
+data format the plugin reads.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import sys
+import random
+import struct
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+#Import User Libraries
+import noesisstub
+rapi = noesisstub.install()
+import inc_powervr
+from inc_powervr import PvrTexture
+
+#Data formats with the sizes each is tested at
+DATA_FORMATS = {
+    PvrTexture.TWIDDLED           : [(8, 8), (64, 64)],
+    PvrTexture.TWIDDLED_MM        : [(16, 16)],
+    PvrTexture.TWIDDLED_MM_ALIAS  : [(32, 32)],
+    PvrTexture.TWIDDLED_RECTANGLE : [(32, 8), (8, 32)],
+    PvrTexture.RECTANGLE          : [(24, 8)],
+    PvrTexture.VQ                 : [(32, 32)],
+    PvrTexture.VQ_MM              : [(64, 64)],
+    PvrTexture.SMALLVQ            : [(16, 16), (32, 32), (64, 64)],
+    PvrTexture.SMALLVQ_MM         : [(32, 32)]
+}
+
+#ARGB 1555, RGB 565 and ARGB 4444. The class names of the first and
+#last are taken by its conversion methods.
+COLOR_FORMATS = [ 0, 1, 2 ]
+
+def make_texture(color_format, data_format, width, height, rand):
+    #Random codebook and image data. Indices after the codebook stay
+    #inside it, the decoder finds where the image itself starts.
+    data = struct.pack("<BBxxHH", color_format, data_format, width, height)
+    compressed = data_format in (PvrTexture.VQ, PvrTexture.VQ_MM,
+                                 PvrTexture.SMALLVQ, PvrTexture.SMALLVQ_MM)
+    if not compressed:
+        return data + bytes(rand.getrandbits(8) for i in range(width * height * 4))
+
+    probe = load(data + bytes(256 * 8 + width * height), native = False)
+    codebook = bytes(rand.getrandbits(8) for i in range(probe.codebook_size * 8))
+    indices = bytes(rand.randrange(probe.codebook_size) for i in range(width * height))
+    return data + codebook + indices
+
+def load(data, native):
+    #Decode through one path or the other, whatever rapi offers
+    saved = inc_powervr.NATIVE_IMAGE
+    inc_powervr.NATIVE_IMAGE = native
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return PvrTexture(data)
+    finally:
+        inc_powervr.NATIVE_IMAGE = saved
+
+class NativeDecodeTest(unittest.TestCase):
+
+    def test_native_routines_found(self):
+        self.assertTrue(inc_powervr.NATIVE_IMAGE)
+
+    def test_native_matches_fallback(self):
+        rand = random.Random(46)
+        for data_format, sizes in sorted(DATA_FORMATS.items()):
+            for width, height in sizes:
+                for color_format in COLOR_FORMATS:
+                    name = "color %d data 0x%02x %dx%d" % (color_format, data_format, width, height)
+                    data = make_texture(color_format, data_format, width, height, rand)
+
+                    del rapi.log[:]
+                    native = load(data, native = True)
+                    decoded = [entry[3] for entry in rapi.log if entry[0] == "decode"]
+                    self.assertEqual(decoded, [inc_powervr.RAW_FORMATS[color_format]], name)
+
+                    fallback = load(data, native = False)
+                    self.assertEqual(len(native.get_bitmap()), width * height * 4, name)
+                    self.assertEqual(native.get_bitmap(), fallback.get_bitmap(), name)
+
+    def test_rectangles_split_into_squares(self):
+        rand = random.Random(47)
+        data = make_texture(1, PvrTexture.TWIDDLED_RECTANGLE, 32, 8, rand)
+        del rapi.log[:]
+        load(data, native = True)
+        untwiddled = [entry[1:] for entry in rapi.log if entry[0] == "untwiddle"]
+        self.assertEqual(untwiddled, [(8, 8, 16)] * 4)
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,140 @@
+#==============================================================
+"""
+
+Shenmue Model Texture Cache Tests
+The importer decodes only the textures its polygons use, and keeps
+decoded textures for the session by a hash of their data, dropping
+the least recently used past TEXTURE_CACHE_LIMIT.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import sys
+import struct
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+#Import User Libraries
+import noesisstub
+rapi = noesisstub.install()
+import fmt_kion_mt5
+from test_mt5strips import make_mt5
+
+#One strip of one triangle
+STRIP = [[(0, 0, 0), (1, 0, 0), (2, 0, 0)]]
+
+def make_texture(seed, size = 8):
+    #Twiddled RGB 565 with words that differ for each seed
+    words = [(seed * 0x1F3 + i * 0x51) & 0xFFFF for i in range(size * size)]
+    return struct.pack("<BBxxHH", 1, 1, size, size) + struct.pack("<%dH" % len(words), *words)
+
+PvrTexture = fmt_kion_mt5.PvrTexture
+
+class CountingTexture(PvrTexture):
+
+    #Every texture the importer decodes
+    made = []
+
+    def __init__(self, data, *args):
+        CountingTexture.made.append(bytes(data))
+        PvrTexture.__init__(self, data, *args)
+
+def load(data):
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = fmt_kion_mt5.ShenmueMt5(data)
+        model.parse()
+    return model
+
+class TextureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.limit = fmt_kion_mt5.TEXTURE_CACHE_LIMIT
+        fmt_kion_mt5.PvrTexture = CountingTexture
+        fmt_kion_mt5.TEXTURE_CACHE.clear()
+        fmt_kion_mt5.TEXTURE_CACHE_BYTES = 0
+        CountingTexture.made = []
+
+    def tearDown(self):
+        fmt_kion_mt5.PvrTexture = PvrTexture
+        fmt_kion_mt5.TEXTURE_CACHE_LIMIT = self.limit
+        fmt_kion_mt5.TEXTURE_CACHE.clear()
+        fmt_kion_mt5.TEXTURE_CACHE_BYTES = 0
+
+    def test_only_used_textures_decoded(self):
+        textures = [make_texture(i) for i in range(4)]
+        model = load(make_mt5(3, [(2, STRIP), (0, STRIP)], textures))
+
+        self.assertEqual(sorted(CountingTexture.made), sorted([textures[0], textures[2]]))
+        self.assertEqual(sorted(tex.name for tex in model.noeTextures), ["texture[0]", "texture[2]"])
+        self.assertEqual(sorted(mat.name for mat in model.noeMaterials), ["material[0]", "material[2]"])
+
+    def test_shared_texture_decoded_once(self):
+        #The same data under two ids, then again in a second model
+        shared = make_texture(7)
+        first = load(make_mt5(3, [(0, STRIP), (1, STRIP)], [shared, shared]))
+        second = load(make_mt5(3, [(1, STRIP)], [make_texture(8), shared]))
+
+        self.assertEqual(CountingTexture.made, [shared])
+        self.assertIs(first.noeTextures[0].pixelData, second.noeTextures[0].pixelData)
+        self.assertEqual(fmt_kion_mt5.TEXTURE_CACHE_BYTES, 8 * 8 * 4)
+
+    def test_least_recently_used_evicted(self):
+        size = 8 * 8 * 4
+        fmt_kion_mt5.TEXTURE_CACHE_LIMIT = size * 2
+        textures = [make_texture(i) for i in range(3)]
+
+        fmt_kion_mt5.decode_texture(textures[0])
+        fmt_kion_mt5.decode_texture(textures[1])
+        fmt_kion_mt5.decode_texture(textures[0])
+        fmt_kion_mt5.decode_texture(textures[2])
+
+        #The second texture was the least recently used
+        self.assertEqual(fmt_kion_mt5.TEXTURE_CACHE_BYTES, size * 2)
+        self.assertEqual(len(fmt_kion_mt5.TEXTURE_CACHE), 2)
+        fmt_kion_mt5.decode_texture(textures[0])
+        fmt_kion_mt5.decode_texture(textures[2])
+        self.assertEqual(len(CountingTexture.made), 3)
+        fmt_kion_mt5.decode_texture(textures[1])
+        self.assertEqual(len(CountingTexture.made), 4)
+
+        #The counter follows what the cache holds
+        held = sum(len(entry[2]) for entry in fmt_kion_mt5.TEXTURE_CACHE.values())
+        self.assertEqual(fmt_kion_mt5.TEXTURE_CACHE_BYTES, held)
+
+    def test_texture_over_limit_kept(self):
+        fmt_kion_mt5.TEXTURE_CACHE_LIMIT = 16
+        fmt_kion_mt5.decode_texture(make_texture(1))
+        fmt_kion_mt5.decode_texture(make_texture(2))
+        self.assertEqual(len(fmt_kion_mt5.TEXTURE_CACHE), 1)
+        self.assertEqual(fmt_kion_mt5.TEXTURE_CACHE_BYTES, 8 * 8 * 4)
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -25,13 +25,27 @@ DEALINGS IN THE SOFTWARE.
 #Import Libraries
 import os
 import sys
+import signal
+import argparse
 
 
 #Import User Libraries
 from pvmarchive import *
+from pipeline import TexturePipeline
+from afsarchive import AfsArchive
+from pakarchive import PakArchive
+from discimage import DiscImage
+from scheduler import Scheduler
+from pngencode import createEncoder
+from texcontainer import createContainer
+from outputsink import createSink
+import streamio
+from bitstream import BudgetExceeded
+from watcher import Watcher
+from seqio import localityOrder
 
 # Define main function
-def main(filepath):
+def main(filepath, encoder = None):
 
     #Check if filepath exists
     if not os.path.exists(filepath):
@@ -42,25 +56,176 @@ def main(filepath):
 
     if ext == ".pvm":
         #PowerVR Archive filetype
-        pvm = PvmArchive(filepath)
-        pvm.writePngImages()
+        pvm = PvmArchive(filepath, True)
+        pvm.writePngImages(encoder)
 
     elif ext == ".mt5":
         #Shenmue Model filetype
         hrc = ShenmueModel(filepath)
-        hrc.writePngImages()
+        hrc.writePngImages(encoder)
+
+    elif ext == ".afs":
+        #Archive of pvm and mt5 files
+        afs = AfsArchive(filepath)
+        afs.writePngImages(encoder)
+
+    elif ext in (".pkf", ".pks"):
+        #Shenmue scene texture packs
+        pak = PakArchive(filepath)
+        pak.writePngImages(encoder)
+
+    elif ext in (".gdi", ".iso"):
+        #Dreamcast disc images
+        disc = DiscImage(filepath)
+        disc.writePngImages(encoder)
 
     else:
         print("Unkown file extension: %s"%ext)
 
     return 0
 
+# Build a pipeline from the command line options
+def createPipeline(args, encoder, sink, decoders):
+    return TexturePipeline(
+        sink      = sink,
+        readers   = args.readers,
+        decoders  = decoders,
+        encoders  = args.encoders,
+        writers   = args.writers,
+        queueSize = args.queue,
+        shared    = not args.no_shared,
+        encoder   = encoder,
+        prefetch  = args.prefetch
+    )
+
+# Convert files again whenever they change
+def watch(paths, args, encoder):
+
+    #Archives cannot replace entries, so watch mode writes files
+    sink = createSink("dir", args.output)
+
+    #One pipeline, so the decode pool is started once and not for
+    #every burst of saves
+    pipeline = createPipeline(args, encoder, sink, args.decoders).open()
+
+    def convert(jobs):
+        pipeline.run(jobs)
+
+    #Stop cleanly when terminated too, so the slabs are unlinked
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    watcher = Watcher(paths, convert, settle = args.settle)
+    print("Watching %s" % ", ".join(paths))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.close()
+        sink.close()
+
+    return 0
+
+# Export several files through the staged pipeline
+def batch(filepaths, args, encoder):
+
+    #Skip files that do not exist
+    filepaths = [ fp for fp in filepaths if os.path.exists(fp) ]
+    jobs = filepaths
+    decoders = args.decoders
+
+    #Order by estimated cost and size the pool to available memory
+    if not args.no_schedule:
+        scheduler = Scheduler(args.decoders)
+        jobs = scheduler.schedule(filepaths, args.locality)
+        decoders = scheduler.workerCount()
+    elif args.locality:
+        jobs = localityOrder(filepaths)
+
+    sink = createSink(args.sink, args.output, args.deflate)
+    pipeline = createPipeline(args, encoder, sink, decoders)
+
+    try:
+        errors = pipeline.run(jobs)
+    finally:
+        sink.close()
+    print("Exported %d textures, %d errors" % (pipeline.getCount(), len(errors)))
+
+    return 1 if errors else 0
+
 # Call main function
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python __main__.py <filename>")
-
-    main(sys.argv[1])
+    parser = argparse.ArgumentParser(usage = "python __main__.py <filename> [<filename> ...]")
+    parser.add_argument("files", nargs = "+")
+    parser.add_argument("--output", default = "output")
+    parser.add_argument("--serial", action = "store_true",
+                        help = "export one texture at a time in a single thread")
+    parser.add_argument("--readers", type = int, default = 1)
+    parser.add_argument("--decoders", type = int, default = None,
+                        help = "decode processes (default: cpu count)")
+    parser.add_argument("--encoders", type = int, default = None,
+                        help = "png encode threads (default: cpu count)")
+    parser.add_argument("--writers", type = int, default = 1)
+    parser.add_argument("--queue", type = int, default = 8,
+                        help = "max items waiting between stages")
+    parser.add_argument("--no-schedule", action = "store_true",
+                        help = "export files in the order given")
+    parser.add_argument("--prefetch", type = int, default = 2,
+                        help = "files to read ahead of the decoders, 0 to disable")
+    parser.add_argument("--locality", action = "store_true",
+                        help = "export files in their order on disk instead of by cost")
+    parser.add_argument("--no-shared", action = "store_true",
+                        help = "pickle decoded bitmaps instead of using shared memory")
+    parser.add_argument("--png", default = "pypng", choices = ["pypng", "parallel", "optimize"],
+                        help = "png encoder backend")
+    parser.add_argument("--level", type = int, default = 6,
+                        help = "deflate compression level")
+    parser.add_argument("--filter", default = "none", choices = ["none", "sub", "up"],
+                        help = "scanline filter for the parallel encoder")
+    parser.add_argument("--strategy", default = "default",
+                        choices = ["default", "filtered", "huffman", "rle"],
+                        help = "zlib strategy for the parallel encoder")
+    parser.add_argument("--format", default = "png", choices = ["png", "dds", "ktx"],
+                        help = "output file format, dds and ktx keep every mipmap")
+    parser.add_argument("--sink", default = "dir", choices = ["dir", "zip", "tar"],
+                        help = "write into a directory or a single archive")
+    parser.add_argument("--deflate", action = "store_true",
+                        help = "compress zip entries instead of storing them")
+    parser.add_argument("--raw", action = "store_true",
+                        help = "write raw RGBA instead of an image file, with - only")
+    parser.add_argument("--frames", action = "store_true",
+                        help = "read length prefixed inputs from stdin until closed")
+    parser.add_argument("--watch", action = "store_true",
+                        help = "keep converting files and folders as they change")
+    parser.add_argument("--settle", type = float, default = 0.2,
+                        help = "seconds a changed file must stay unchanged before converting")
+    args = parser.parse_args()
+
+    if args.format == "png":
+        encoder = createEncoder(args.png, level = args.level,
+                                filter = args.filter, strategy = args.strategy)
+    else:
+        encoder = createContainer(args.format)
+
+    try:
+        if args.files == ["-"]:
+            #Read from stdin and write to stdout
+            status = streamio.run(encoder, args.raw, args.frames)
+        elif args.watch:
+            status = watch(args.files, args, encoder)
+        elif args.serial:
+            for filepath in args.files:
+                try:
+                    main(filepath, encoder)
+                except BudgetExceeded as err:
+                    print("Skipping %s: %s" % (filepath, err))
+            status = 0
+        else:
+            status = batch(args.files, args, encoder)
+    finally:
+        encoder.close()
+
+    sys.exit(status)
 
 #==============================================================
 """
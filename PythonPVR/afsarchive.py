@@ -0,0 +1,127 @@
+#==============================================================
+"""
+
+AFS Archive
+Reads the AFS archives most of Shenmue's data is packed in. The
+archive is memory mapped and each entry is handed to the pvm and
+mt5 readers as a slice of the map, so nothing is extracted.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import struct
+
+#Import User Libraries
+from pvmarchive import *
+import formats
+
+#Size of one filename table record
+NAME_SIZE = 0x30
+
+def readAfsNames(view, count, entries):
+    #Filename table pointer, after the contents or before the data
+    candidates = [ 0x08 + count * 0x08 ]
+    if entries:
+        candidates.append(min(entry['offset'] for entry in entries) - 0x08)
+
+    for ofs in candidates:
+        if ofs < 0 or ofs + 0x08 > len(view):
+            continue
+        tableOfs, tableLen = struct.unpack_from('<II', view, ofs)
+        if tableOfs and tableOfs + count * NAME_SIZE <= len(view):
+            break
+    else:
+        return {}
+
+    names = {}
+    for i in range(count):
+        start = tableOfs + i * NAME_SIZE
+        raw = bytes(view[start:start + 0x20]).split(b'\0')[0]
+        if raw:
+            names[i] = raw.decode('ascii', 'replace')
+    return names
+
+def readAfsEntries(view, name, budget = None):
+    #Offset, length and name of every entry in the table of contents
+    if bytes(view[0:4]) != AfsArchive.AFS:
+        return []
+
+    count = struct.unpack_from('<I', view, 0x04)[0]
+    if 0x08 + count * 0x08 > len(view):
+        return []
+    if budget is not None:
+        budget.spend('chunks', count)
+
+    table = struct.unpack_from('<%dI' % (count * 2), view, 0x08)
+    entries = []
+    for i in range(count):
+        offset, length = table[i * 2], table[i * 2 + 1]
+        if offset + length > len(view):
+            continue
+        entries.append({ 'index' : i, 'offset' : offset, 'length' : length })
+
+    names = readAfsNames(view, count, entries)
+    base = os.path.splitext(name)[0]
+    for entry in entries:
+        entry['name'] = names.get(entry['index'], "%s_%04d" % (base, entry['index']))
+
+    return entries
+
+def afsTextures(name, view, depth = 0, budget = None):
+    #Textures of every entry, addressed from the start of the afs
+    textures = []
+    for entry in readAfsEntries(view, name, budget):
+        data = view[entry['offset'] : entry['offset'] + entry['length']]
+        textures.extend(formats.sliceTextures(entry['name'], data, entry['offset'],
+                                              depth + 1, budget))
+    return textures
+
+#==============================================================
+"""
+AfsArchive Class
+Table of contents of offset and size pairs, then an optional
+filename table of 0x30 byte records. The table pointer normally
+follows the contents, but some archives keep it just before the
+first entry instead.
+"""
+#==============================================================
+
+class AfsArchive(formats.ContainerArchive):
+
+    AFS = b'AFS\0'
+
+    def __init__(self, filepath):
+        formats.ContainerArchive.__init__(self, filepath)
+        self.entries = readAfsEntries(self.view, self.fp)
+
+    def getEntry(self, index):
+        #Zero-copy view of one entry
+        entry = self.entries[index]
+        return self.view[entry['offset'] : entry['offset'] + entry['length']]
+
+formats.registerFormat(AfsArchive.AFS, afsTextures)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -23,15 +23,97 @@ DEALINGS IN THE SOFTWARE.
 """
 #==============================================================
 
+import mmap
+import array
 import struct
 
+#Words searched at a time by find
+FIND_WORDS = 16384
+
+class BudgetExceeded(ValueError):
+
+	#Raised when a parser does more work than its budget allows
+
+	def __init__(self, name, limit):
+		ValueError.__init__(self, "%s budget of %d exceeded" % (name, limit))
+		self.name = name
+		self.limit = limit
+
+class Budget:
+
+	#Work one file may take before it is treated as corrupt. Totals
+	#are spent as a parser goes, sizes are checked one at a time.
+	LIMITS = {
+		'scan'    : 64 * 1024 * 1024,	#bytes searched for a tag or terminator
+		'chunks'  : 1 << 20,			#headers, entries and nodes parsed
+		'strips'  : 1 << 22,			#strip indices read
+		'string'  : 4096,				#length of one string
+		'nesting' : 8,					#containers inside containers
+		'depth'   : 512					#levels of child nodes below the root
+	}
+
+	def __init__(self, **limits):
+		self.limits = dict(Budget.LIMITS)
+		self.limits.update(limits)
+		self.used = dict.fromkeys(self.limits, 0)
+
+	def spend(self, name, amount = 1):
+		self.used[name] += amount
+		if self.used[name] > self.limits[name]:
+			raise BudgetExceeded(name, self.limits[name])
+
+	def check(self, name, value):
+		if value > self.limits[name]:
+			raise BudgetExceeded(name, self.limits[name])
+
+class BufferReader:
+
+	#File-like reads over a buffer or mmap without copying it first
+
+	def __init__(self, buf):
+		self.view = memoryview(buf).cast('B')
+		self.pos = 0
+
+	def read(self, length = -1):
+		end = len(self.view)
+		if length >= 0:
+			end = min(end, self.pos + length)
+		data = bytes(self.view[self.pos:end])
+		self.pos = max(self.pos, end)
+		return data
+
+	def seek(self, offset, whence = 0):
+		if whence == 1:
+			offset += self.pos
+		elif whence == 2:
+			offset += len(self.view)
+		self.pos = max(0, offset)
+		return self.pos
+
+	def tell(self):
+		return self.pos
+
+	def close(self):
+		self.view = memoryview(b'')
+
 class BitStream:
 
 	PI = 3.141592
 
-	def __init__(self, filepath):
+	def __init__(self, filepath, budget = None):
 		self.offset = 0
-		self.bs = open(filepath, 'rb')
+		self.budget = budget or Budget()
+
+		#Accept in-memory data as well as a path on disk
+		if isinstance(filepath, (bytes, bytearray, memoryview, mmap.mmap)):
+			self.bs = BufferReader(filepath)
+		elif hasattr(filepath, 'read'):
+			self.bs = filepath
+		else:
+			#Paths are read lazily, so header passes only touch headers.
+			#Readers that need the whole file pass it in from readInput.
+			self.bs = open(filepath, 'rb')
+
 		self.bs.seek(0, 2)
 		self.length = self.bs.tell()
 		self.bs.seek(0, 0)
@@ -111,16 +193,8 @@ class BitStream:
 
 		return bytes
 
-	def find(self, bytes):
-		origin = self.bs.tell()
-
-		while self.bs.tell() < (self.length - 4):
-
-			uint = self.readUInt()
-			if uint == bytes:
-				return 1
-
-		return 0
+	def readBytes(self, length):
+		return self.bs.read(length)
 
 	def readIFF(self):
 		bytes = self.bs.read(4)
@@ -131,11 +205,19 @@ class BitStream:
 
 		if length == 0:
 
-			while True:
-				ch = self.readByte()
-				if ch == 0:
-					break
-				string += chr(ch)
+			#Stop at the terminator or the string budget
+			limit = self.budget.limits['string']
+			start = self.bs.tell()
+			data = self.bs.read(limit + 1)
+			end = data.find(b'\0')
+			if end < 0 and len(data) > limit:
+				raise BudgetExceeded('string', limit)
+			elif end < 0:
+				raise struct.error("String runs past the end of the file")
+
+			self.budget.spend('scan', end + 1)
+			self.bs.seek(start + end + 1, 0)
+			string = data[:end].decode("latin-1")
 
 		else:
 
@@ -174,9 +256,25 @@ class BitStream:
 		return bytes
 
 	def find(self, target):
-		while(self.bs.tell() < self.length - 4):
-			if self.readUInt() == target:
-				return 1
+		#Search word by word from the current position, a block at a
+		#time, stopping after the word found
+		pos = self.bs.tell()
+		end = self.length - 4
+
+		while pos < end:
+			count = min(FIND_WORDS, (end - pos + 3) // 4)
+			words = array.array('I', self.bs.read(count * 4))
+			self.budget.spend('scan', count * 4)
+
+			try:
+				found = words.index(target)
+			except ValueError:
+				pos += count * 4
+				continue
+
+			self.bs.seek(pos + (found + 1) * 4, 0)
+			return 1
+
 		return 0
 
 #==============================================================
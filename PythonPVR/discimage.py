@@ -0,0 +1,323 @@
+#==============================================================
+"""
+
+Disc Images
+Reads files straight out of Dreamcast GDI dumps and plain ISO
+images. Each data track is memory mapped, the ISO9660 directory
+records are walked to find every file, and the files are passed
+to the format registry as slices, so nothing is copied to disk.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import shlex
+import struct
+
+#Import User Libraries
+from bitstream import BitStream, Budget
+from pvmarchive import *
+import formats
+import afsarchive
+import pakarchive
+
+#User data bytes in every sector
+SECTOR_SIZE   = 2048
+RAW_SECTOR    = 2352
+RAW_SYNC      = b'\x00' + b'\xff' * 10 + b'\x00'
+
+#First sector of the GD-ROM high density area
+HD_AREA_LBA   = 45000
+
+#Primary volume descriptor, sixteen sectors into the track
+PVD_SECTOR    = 16
+ISO_MAGIC     = b'CD001'
+
+#GDI track type of a data track
+TRACK_DATA    = 4
+
+def readGdiTracks(filepath):
+    #Path, lba, sector size and offset of each data track. A gdi
+    #line holds track number, lba, type, sector size, file name and
+    #an optional offset.
+    folder = os.path.dirname(filepath)
+    with open(filepath) as f:
+        lines = [ line for line in f.read().splitlines() if line.strip() ]
+
+    tracks = []
+    for line in lines[1:]:
+        fields = shlex.split(line)
+        if len(fields) < 5 or int(fields[2]) != TRACK_DATA:
+            continue
+        offset = int(fields[5]) if len(fields) > 5 else 0
+        path = os.path.join(folder, fields[4])
+        tracks.append((path, int(fields[1]), int(fields[3]), offset))
+    return tracks
+
+#==============================================================
+"""
+Track Class
+One data track file. Sectors are either 2048 bytes of user data
+or 2352 byte raw sectors with the user data after the header.
+"""
+#==============================================================
+
+class Track:
+
+    def __init__(self, filepath, lba, sectorSize, offset = 0):
+        self.lba = lba
+        self.sectorSize = sectorSize
+        self.map = formats.mapFile(filepath)
+        self.view = memoryview(self.map)[offset:]
+        self.dataOffset = 0
+
+        #Raw sectors hold 16 header bytes, or 24 for mode 2
+        if sectorSize == RAW_SECTOR:
+            self.dataOffset = 16
+            if bytes(self.view[0:12]) == RAW_SYNC and self.view[15] == 2:
+                self.dataOffset = 24
+
+        self.sectorCount = len(self.view) // sectorSize
+
+    def contains(self, lba):
+        return self.lba <= lba < self.lba + self.sectorCount
+
+    def read(self, lba, offset, length):
+        #User data from one sector on, stopping at the track end
+        if self.sectorSize == SECTOR_SIZE:
+            start = (lba - self.lba) * SECTOR_SIZE + offset
+            return self.view[start : start + length]
+
+        out = bytearray()
+        while length > 0 and self.contains(lba):
+            start = (lba - self.lba) * self.sectorSize + self.dataOffset + offset
+            count = min(length, SECTOR_SIZE - offset)
+            out += self.view[start : start + count]
+            length -= count
+            lba += 1
+            offset = 0
+        return out
+
+#==============================================================
+"""
+DiscReader Class
+File-like reads over the user data of every track, addressed as
+lba * 2048 + offset, so a texture's position on the disc works
+as its offset in the pipeline
+"""
+#==============================================================
+
+class DiscReader:
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.pos = 0
+        self.length = max([ (t.lba + t.sectorCount) * SECTOR_SIZE for t in tracks ] or [0])
+
+    def view(self, pos, length):
+        #A slice of the map when the data is contiguous in one track
+        parts = []
+        total = 0
+
+        while total < length:
+            lba, offset = divmod(pos + total, SECTOR_SIZE)
+            track = self.findTrack(lba)
+            if track is None:
+                break
+            data = track.read(lba, offset, length - total)
+            if not data:
+                break
+            parts.append(data)
+            total += len(data)
+
+        if len(parts) == 1:
+            return parts[0]
+        return b''.join(parts)
+
+    def findTrack(self, lba):
+        for track in self.tracks:
+            if track.contains(lba):
+                return track
+        return None
+
+    def read(self, length = -1):
+        if length < 0:
+            length = max(0, self.length - self.pos)
+        data = bytes(self.view(self.pos, length))
+        self.pos += len(data)
+        return data
+
+    def seek(self, offset, whence = 0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.length
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        return 1
+
+#==============================================================
+"""
+DiscImage Class
+A .gdi track list or an .iso file. For GDI dumps the file
+system is read from the high density area, whose directory
+records use absolute LBAs starting at 45000.
+"""
+#==============================================================
+
+class DiscImage:
+
+    def __init__(self, filepath):
+        self.fp = os.path.basename(filepath)
+        ext = os.path.splitext(filepath)[1].lower()
+
+        if ext == ".gdi":
+            self.tracks = self.readGdi(filepath)
+        else:
+            size = os.path.getsize(filepath)
+            sectorSize = SECTOR_SIZE
+            if size % RAW_SECTOR == 0 and size % SECTOR_SIZE != 0:
+                sectorSize = RAW_SECTOR
+            self.tracks = [ Track(filepath, 0, sectorSize) ]
+
+        self.reader = DiscReader(self.tracks)
+        self.bs = BitStream(self.reader)
+        self.files = None
+
+    def readGdi(self, filepath):
+        tracks = [ Track(path, lba, sectorSize, offset)
+                   for path, lba, sectorSize, offset in readGdiTracks(filepath) ]
+
+        #The file system is on the high density area when present
+        tracks.sort(key = lambda t: (t.lba < HD_AREA_LBA, t.lba))
+        return tracks
+
+    def readFiles(self):
+        #Path, lba and size of every file, in disc order
+        if self.files is None:
+            self.files = self.walkFiles(Budget())
+        return self.files
+
+    def walkFiles(self, budget):
+        #Directory records of the whole file system, charged to budget
+        if not self.tracks:
+            return []
+
+        root = self.tracks[0].lba + PVD_SECTOR
+        pvd = self.reader.view(root * SECTOR_SIZE, SECTOR_SIZE)
+        if bytes(pvd[1:6]) != ISO_MAGIC:
+            return []
+
+        record = pvd[156:156 + 34]
+        lba = struct.unpack_from('<I', record, 2)[0]
+        size = struct.unpack_from('<I', record, 10)[0]
+
+        files = []
+        visited = set()
+        stack = [ ("", lba, size) ]
+
+        while stack:
+            folder, lba, size = stack.pop()
+            if lba in visited:
+                continue
+            visited.add(lba)
+            budget.spend('scan', size)
+
+            data = self.reader.view(lba * SECTOR_SIZE, size)
+            ofs = 0
+            while ofs < len(data):
+                length = data[ofs]
+
+                #Records do not cross sectors, zero pads to the next
+                if length == 0:
+                    ofs = (ofs // SECTOR_SIZE + 1) * SECTOR_SIZE
+                    continue
+                if ofs + 33 > len(data):
+                    break
+                budget.spend('chunks')
+
+                extent = struct.unpack_from('<I', data, ofs + 2)[0]
+                extentSize = struct.unpack_from('<I', data, ofs + 10)[0]
+                flags = data[ofs + 25]
+                nameLen = data[ofs + 32]
+                name = bytes(data[ofs + 33 : ofs + 33 + nameLen])
+                ofs += length
+
+                #Skip the . and .. entries
+                if name in (b'\0', b'\1'):
+                    continue
+
+                name = name.decode('ascii', 'replace').split(';')[0]
+                path = folder + "/" + name if folder else name
+                if flags & 0x02:
+                    budget.check('depth', path.count("/"))
+                    stack.append((path, extent, extentSize))
+                else:
+                    files.append({ 'path' : path, 'lba' : extent, 'size' : extentSize })
+
+        files.sort(key = lambda f: f['lba'])
+        return files
+
+    def getFile(self, path):
+        #Contents of one file by path, names are case insensitive
+        path = path.replace("\\", "/").strip("/").upper()
+        for f in self.readFiles():
+            if f['path'].upper() == path:
+                return self.reader.view(f['lba'] * SECTOR_SIZE, f['size'])
+        raise KeyError(path)
+
+    def readTextureEntries(self):
+        #Textures of every file the format registry can read
+        textures = []
+        for f in self.readFiles():
+            start = f['lba'] * SECTOR_SIZE
+            magic = bytes(self.reader.view(start, 4))
+            if magic not in formats.MAGIC_LIST and magic not in formats.MAGIC_PVR:
+                continue
+
+            name = os.path.basename(f['path'])
+            data = self.reader.view(start, f['size'])
+            textures.extend(formats.sliceTextures(name, data, start))
+
+        return textures
+
+    def writePngImages(self, encoder = None):
+        for entry in self.readTextureEntries():
+            data = self.reader.view(entry['offset'], entry['length'])
+            pvr = PvrTexture(data, False, True)
+            if not pvr.isSupported():
+                continue
+
+            imgName = "output/" + entry['name'] + getattr(encoder, 'extension', '.png')
+            writeImage(imgName, pvr, encoder)
+
+        return 1
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,142 @@
+#==============================================================
+"""
+
+Format Registry
+Finds the textures inside any supported file held in memory,
+by its magic number. Containers hand each of their entries back
+to sliceTextures, so textures are found in nested files without
+extracting anything.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import mmap
+import struct
+
+#Import User Libraries
+from bitstream import BitStream, Budget, BudgetExceeded
+from pvmarchive import *
+
+#Magic numbers of single textures
+MAGIC_PVR = [ b'GBIX', b'PVRT' ]
+
+def mapFile(filepath):
+    #Read-only map of a whole file, empty files give empty bytes
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+def pvmTextures(name, view, depth, budget):
+    entries = PvmArchive(view, budget = budget).readTextureEntries()
+
+    #Inside a container the archive's name keeps apart entries of the
+    #same name in different archives, as mt5 names already are
+    if depth > 0:
+        base = os.path.splitext(name)[0]
+        for entry in entries:
+            entry['name'] = "%s_%s" % (base, entry['name'])
+    return entries
+
+def mt5Textures(name, view, depth, budget):
+    return ShenmueModel(view, name, budget).readTextureEntries()
+
+#Texture readers by magic number, each returns entries whose
+#offsets are relative to the view it was given. Container modules
+#add their own readers with registerFormat, and pass the budget on
+#to the readers of their entries, so one file's nested containers
+#share a single budget.
+MAGIC_LIST = {
+    b'PVMH'     : pvmTextures,
+    b'HRCM'     : mt5Textures
+}
+
+def registerFormat(magic, reader):
+    MAGIC_LIST[magic] = reader
+
+def sliceTextures(name, view, base = 0, depth = 0, budget = None):
+    #Texture entries inside one file held in view, with offsets
+    #moved by base to address the file containing it. A budget
+    #that runs out stops the whole file, not just this entry.
+    budget = budget or Budget()
+    budget.spend('chunks')
+    magic = bytes(view[0:4])
+
+    if magic in MAGIC_PVR:
+        tex = textureView(view)
+        offset = len(view) - len(tex)
+        return [ { 'name' : os.path.splitext(name)[0], 'offset' : base + offset,
+                   'length' : len(tex) } ]
+
+    if magic not in MAGIC_LIST:
+        return []
+    budget.check('nesting', depth)
+
+    #Truncated or malformed entries hold no textures
+    try:
+        entries = MAGIC_LIST[magic](name, view, depth, budget)
+    except BudgetExceeded:
+        raise
+    except (struct.error, ValueError):
+        return []
+
+    for entry in entries:
+        entry['offset'] += base
+    return entries
+
+#==============================================================
+"""
+ContainerArchive Class
+A memory mapped file of any registered format, read in place.
+Texture offsets are relative to the start of the file, so the
+pipeline reads them like the textures of a pvm.
+"""
+#==============================================================
+
+class ContainerArchive:
+
+    def __init__(self, filepath):
+        self.fp = os.path.basename(filepath)
+        self.map = mapFile(filepath)
+        self.view = memoryview(self.map)
+        self.bs = BitStream(self.map)
+
+    def readTextureEntries(self):
+        return sliceTextures(self.fp, self.view)
+
+    def writePngImages(self, encoder = None):
+        for entry in self.readTextureEntries():
+            data = self.view[entry['offset'] : entry['offset'] + entry['length']]
+            pvr = PvrTexture(data, False, True)
+            if not pvr.isSupported():
+                continue
+
+            imgName = "output/" + entry['name'] + getattr(encoder, 'extension', '.png')
+            writeImage(imgName, pvr, encoder)
+
+        return 1
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,166 @@
+#==============================================================
+"""
+
+Output Sinks
+Destinations for exported textures: a directory of files, or a
+single zip or tar archive written sequentially as textures
+arrive from the pipeline
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import json
+import time
+import tarfile
+import zipfile
+import threading
+
+#Suffix of the index written next to a tar archive
+INDEX_SUFFIX = '.index.json'
+
+#==============================================================
+"""
+DirectorySink Class
+One file per texture, the original output layout
+"""
+#==============================================================
+
+class DirectorySink:
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def write(self, name, data):
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        return 1
+
+#==============================================================
+"""
+ZipSink Class
+Entries are appended to one zip file, stored as-is by default
+since png data is already compressed. The zip central directory
+gives random access to each entry afterwards.
+"""
+#==============================================================
+
+class ZipSink:
+
+    extension = '.zip'
+
+    def __init__(self, path, deflate = False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.compression = zipfile.ZIP_DEFLATED if deflate else zipfile.ZIP_STORED
+        self.zip = zipfile.ZipFile(path, 'w', self.compression, allowZip64 = True)
+
+    def write(self, name, data):
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = self.compression
+        with self.lock:
+            self.zip.writestr(info, data)
+
+    def close(self):
+        with self.lock:
+            self.zip.close()
+        return 1
+
+#==============================================================
+"""
+TarSink Class
+Entries are appended to an uncompressed tar. Tar has no table
+of contents, so the data offset and size of every entry are
+saved in an index file next to the archive.
+"""
+#==============================================================
+
+class TarSink:
+
+    extension = '.tar'
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tar = tarfile.open(path, 'w', format = tarfile.PAX_FORMAT)
+        self.index = {}
+
+    def write(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+
+        with self.lock:
+            self.tar.addfile(info, io.BytesIO(data))
+            #Data ends on a 512 byte block boundary before the offset
+            padded = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            self.index[name] = [ self.tar.offset - padded, len(data) ]
+
+    def close(self):
+        with self.lock:
+            self.tar.close()
+            with open(self.path + INDEX_SUFFIX, 'w') as f:
+                json.dump(self.index, f)
+        return 1
+
+#==============================================================
+"""
+Archive Access
+Read a single entry back out of a sink without unpacking it
+"""
+#==============================================================
+
+def readEntry(path, name):
+    #Zip files are indexed by their central directory
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as z:
+            return z.read(name)
+
+    #Tar files use the index saved by TarSink
+    with open(path + INDEX_SUFFIX) as f:
+        offset, size = json.load(f)[name]
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+def createSink(kind, path, deflate = False):
+    if kind == 'zip':
+        if not path.lower().endswith(ZipSink.extension):
+            path += ZipSink.extension
+        return ZipSink(path, deflate)
+    elif kind == 'tar':
+        if not path.lower().endswith(TarSink.extension):
+            path += TarSink.extension
+        return TarSink(path)
+
+    return DirectorySink(path)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,161 @@
+#==============================================================
+"""
+
+Shenmue Packs
+Reads the texture packs scene textures are stored in: PAKF
+(.pkf) files made of TEXN chunks, and IPAC directories found in
+.pks files. Both are indexed in one pass over a memory map, and
+their textures are handed to PvrTexture as slices.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import struct
+
+#Import User Libraries
+import formats
+
+PAKF = b'PAKF'
+PAKS = b'PAKS'
+IPAC = b'IPAC'
+TEXN = b'TEXN'
+
+#TEXN chunk: tag, chunk length, 8 byte texture id, texture data
+TEXN_HEADER = 0x10
+
+#IPAC directory record: name, extension, offset, length
+IPAC_ENTRY = struct.Struct('<8s4sII')
+
+#Bytes copied at a time while searching for chunk tags, starting
+#small so that tags close together are found without large copies
+SEARCH_FIRST = 4096
+SEARCH_BLOCK = 1024 * 1024
+
+def findBytes(view, needle, start, end, budget = None):
+    #Position of needle in view[start:end], or -1. Searched in
+    #blocks so a large map is never copied at once.
+    overlap = len(needle) - 1
+    block = SEARCH_FIRST
+    while start < end:
+        stop = min(end, start + block + overlap)
+        if budget is not None:
+            budget.spend('scan', stop - start)
+        found = bytes(view[start:stop]).find(needle)
+        if found >= 0:
+            return start + found
+        start += block
+        block = min(block * 2, SEARCH_BLOCK)
+    return -1
+
+def texnName(base, texId):
+    #Printable ids are kept as text, others written in hex
+    text = texId.rstrip(b'\0')
+    if text and all(0x20 < c < 0x7F for c in text):
+        return "%s_%s" % (base, text.decode('ascii'))
+    return "%s_%s" % (base, texId.hex())
+
+def pakfTextures(name, view, depth = 0, budget = None):
+    #TEXN chunks of a PAKF block, found by searching so that other
+    #chunks between them are skipped over
+    budget = budget or formats.Budget()
+    size = struct.unpack_from('<I', view, 0x04)[0]
+    end = min(len(view), size) if size > 0x08 else len(view)
+    base = os.path.splitext(name)[0]
+
+    textures = []
+    ofs = findBytes(view, TEXN, 0x08, end, budget)
+    while ofs >= 0:
+        budget.spend('chunks')
+        length = struct.unpack_from('<I', view, ofs + 0x04)[0] if ofs + 0x08 <= end else 0
+        start = ofs + TEXN_HEADER
+        magic = bytes(view[start:start + 0x04])
+
+        #Not a chunk header, keep searching from the next word
+        if length <= TEXN_HEADER or ofs + length > end or magic not in formats.MAGIC_PVR:
+            ofs = findBytes(view, TEXN, ofs + 0x04, end, budget)
+            continue
+
+        texId = bytes(view[ofs + 0x08 : start])
+        data = view[start : ofs + length]
+        textures.extend(formats.sliceTextures(texnName(base, texId), data, start, depth + 1,
+                                              budget))
+        ofs = findBytes(view, TEXN, ofs + length, end, budget)
+
+    #Model and scene data packed after the textures
+    if bytes(view[end:end + 0x04]) == IPAC:
+        textures.extend(formats.sliceTextures(name, view[end:], end, depth + 1, budget))
+
+    return textures
+
+def ipacTextures(name, view, depth = 0, budget = None):
+    #Directory at the offset given in the header, offsets are from
+    #the start of the IPAC block
+    budget = budget or formats.Budget()
+    dictOfs, count, size = struct.unpack_from('<III', view, 0x04)
+    if dictOfs + count * IPAC_ENTRY.size > len(view):
+        return []
+
+    textures = []
+    budget.spend('chunks', count)
+    for i in range(count):
+        entry = IPAC_ENTRY.unpack_from(view, dictOfs + i * IPAC_ENTRY.size)
+        entryName, ext, offset, length = entry
+        if offset + length > len(view):
+            continue
+
+        entryName = entryName.split(b'\0')[0].decode('ascii', 'replace')
+        ext = ext.split(b'\0')[0].decode('ascii', 'replace')
+        if ext:
+            entryName += "." + ext
+
+        data = view[offset : offset + length]
+        textures.extend(formats.sliceTextures(entryName, data, offset, depth + 1, budget))
+
+    return textures
+
+def paksTextures(name, view, depth = 0, budget = None):
+    #A PAKS header is followed by an IPAC block
+    budget = budget or formats.Budget()
+    start = findBytes(view, IPAC, 0x08, len(view), budget)
+    if start < 0:
+        return []
+    return formats.sliceTextures(name, view[start:], start, depth + 1, budget)
+
+#==============================================================
+"""
+PakArchive Class
+A .pkf or .pks file, read with the registered readers above
+"""
+#==============================================================
+
+class PakArchive(formats.ContainerArchive):
+    pass
+
+formats.registerFormat(PAKF, pakfTextures)
+formats.registerFormat(PAKS, paksTextures)
+formats.registerFormat(IPAC, ipacTextures)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
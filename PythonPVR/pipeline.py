@@ -0,0 +1,483 @@
+#==============================================================
+"""
+
+Texture Pipeline
+Staged read -> decode -> encode -> write pipeline for exporting
+the textures of PowerVR archives and Shenmue models
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import queue
+import struct
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+#Import User Libraries
+from bitstream import BitStream
+from pvmarchive import *
+from afsarchive import AfsArchive
+from pakarchive import PakArchive
+from discimage import DiscImage
+from shmpool import SlabPool, attachSlab, iterRows
+from pngencode import PypngEncoder
+from outputsink import DirectorySink
+from seqio import Prefetcher, readInput, openInput
+
+#Marker passed down a queue once the stage feeding it has finished
+STAGE_DONE = None
+
+#==============================================================
+"""
+Worker Functions
+Module level so that they can be pickled to a process pool
+"""
+#==============================================================
+
+def ignoreInterrupt():
+    #Ctrl+C reaches every process of the group. The main process
+    #shuts the pool down, so the workers leave it to that.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def openArchive(filepath, data = None):
+    #Get file extension
+    ext = os.path.splitext(filepath)[1].lower()
+
+    #Parse from data when the file has already been read whole
+    source = filepath if data is None else data
+
+    if ext == ".pvm":
+        #PowerVR Archive filetype
+        return PvmArchive(source)
+    elif ext == ".mt5":
+        #Shenmue Model filetype
+        return ShenmueModel(source, os.path.basename(filepath))
+    elif ext == ".afs":
+        #Archive of pvm and mt5 files
+        return AfsArchive(filepath)
+    elif ext in (".pkf", ".pks"):
+        #Shenmue scene texture packs
+        return PakArchive(filepath)
+    elif ext in (".gdi", ".iso"):
+        #Dreamcast disc images
+        return DiscImage(filepath)
+
+    return None
+
+def openStream(filepath, data = None):
+    #Stream that texture entry offsets of a file refer to
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in (".gdi", ".iso"):
+        return DiscImage(filepath).bs
+    return BitStream(filepath if data is None else data)
+
+def readWhole(filepath):
+    #Pvm and mt5 files are read whole in large sequential reads
+    #before parsing, or through a large buffer when too big for
+    #that. Containers and disc images are memory mapped and only
+    #the pages of their textures are read.
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext not in (".pvm", ".mt5"):
+        return None
+    data = readInput(filepath)
+    if data is None:
+        data = openInput(filepath)
+    return data
+
+def decodeTexture(data, flipX = False, flipY = True):
+    #Decode a single pvr texture from its raw bytes
+    pvr = PvrTexture(data, flipX, flipY)
+
+    #Unsupported or malformed textures produce no bitmap
+    if not pvr.isSupported():
+        return None
+
+    return (pvr.width, pvr.height, pvr.getBitmap())
+
+def decodeToSlab(data, slabName, flipX = False, flipY = True):
+    #Decode rows straight into a shared memory slab
+    pvr = PvrTexture(data, flipX, flipY)
+    if not pvr.isSupported():
+        return None
+
+    buf = attachSlab(slabName).buf
+    stride = pvr.width * 4
+
+    for y, row in enumerate(pvr.iterRows()):
+        buf[y * stride : (y + 1) * stride] = row
+
+    return (pvr.width, pvr.height)
+
+def encodeContainer(data, writer, flipX = False, flipY = True):
+    #Uncompressed containers are written in the worker directly
+    pvr = PvrTexture(data, flipX, flipY)
+    if not pvr.isSupported():
+        return None
+
+    return writer.encodeTexture(pvr)
+
+def readDimensions(data):
+    #Width and height from the pvr header, without decoding
+    return struct.unpack_from('<HH', data, 0x04)
+
+def numberName(name, taken):
+    #A name already in taken gets a numbered suffix instead of
+    #overwriting the earlier output
+    unique = name
+    count = 1
+    while unique in taken:
+        count += 1
+        unique = "%s_%d" % (name, count)
+    taken.add(unique)
+
+    if unique != name:
+        print("Duplicate texture name %s, writing %s" % (name, unique))
+    return unique
+
+#==============================================================
+"""
+Stage Class
+A group of threads pulling work from one bounded queue and
+pushing results onto the next
+"""
+#==============================================================
+
+class Stage:
+
+    def __init__(self, name, func, workers, inQueue, outQueue = None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.inQueue = inQueue
+        self.outQueue = outQueue
+        self.downstream = 0
+        self.active = 0
+        self.lock = threading.Lock()
+        self.threads = []
+        self.errors = []
+
+    def start(self):
+        self.active = self.workers
+        for i in range(self.workers):
+            name = "%s-%d" % (self.name, i)
+            thread = threading.Thread(target = self.run, name = name)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def emit(self, item):
+        #Blocks while the next stage is full, giving backpressure
+        self.outQueue.put(item)
+
+    def run(self):
+        while True:
+            item = self.inQueue.get()
+            if item is STAGE_DONE:
+                break
+
+            try:
+                self.func(item, self.emit)
+            except Exception as err:
+                print("%s error: %s" % (self.name, err))
+                self.errors.append((item, err))
+
+        #Last thread out tells every thread of the next stage to stop
+        with self.lock:
+            self.active -= 1
+            if self.active == 0 and self.outQueue is not None:
+                for i in range(self.downstream):
+                    self.outQueue.put(STAGE_DONE)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+#==============================================================
+"""
+TexturePipeline Class
+Reads pvr textures from archives, decodes them on a process
+pool, compresses them to png on a thread pool and writes the
+results to the output directory. Each stage is connected by a
+bounded queue so at most queueSize items wait between stages.
+With shared memory enabled, decoded bitmaps are returned through
+a pool of slabs instead of being pickled back from the workers.
+The next prefetch files are read ahead while earlier ones decode.
+After open() the pool and slabs stay up between runs until close().
+"""
+#==============================================================
+
+class TexturePipeline:
+
+    def __init__(self, outDir = "output", readers = 1, decoders = None,
+                 encoders = None, writers = 1, queueSize = 8,
+                 processes = True, shared = True, slabs = None,
+                 encoder = None, sink = None, prefetch = 2):
+        cpus = os.cpu_count() or 1
+
+        self.outDir = outDir
+        self.readers = readers
+        self.decoders = decoders or cpus
+        self.encoders = encoders or cpus
+        self.writers = writers
+        self.queueSize = queueSize
+        self.processes = processes
+        self.shared = shared and processes
+        self.encoder = encoder or PypngEncoder()
+        self.extension = getattr(self.encoder, 'extension', '.png')
+        self.container = hasattr(self.encoder, 'encodeTexture')
+        self.pool = None
+        self.slabs = None
+        self.opened = False
+        self.sink = sink
+        self.prefetch = prefetch
+        self.prefetcher = None
+
+        #One slab for every bitmap that can be in flight at once
+        self.slabCount = slabs or (self.decoders + self.queueSize + self.encoders)
+        self.count = 0
+        self.names = set()
+        self.lock = threading.Lock()
+
+    def open(self):
+        #Start the decode pool and slabs once for many runs, as watch
+        #mode does, instead of in every run. close() stops them.
+        if not self.opened:
+            self.startPool()
+            self.opened = True
+        return self
+
+    def close(self):
+        if self.opened:
+            self.opened = False
+            self.stopPool()
+
+    def startPool(self):
+        #Decoding is cpu bound python, so it runs in processes
+        if self.processes:
+            self.pool = ProcessPoolExecutor(self.decoders, initializer = ignoreInterrupt)
+        if self.shared:
+            self.slabs = SlabPool(self.slabCount)
+
+    def stopPool(self):
+        #Workers detach from the slabs as they exit, then unlink
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.slabs is not None:
+            self.slabs.close()
+            self.slabs = None
+
+    def run(self, filepaths):
+        #Accepts file paths or jobs built by the Scheduler
+        #Write into the output directory unless given a sink
+        ownSink = self.sink is None
+        if ownSink:
+            self.sink = DirectorySink(self.outDir)
+        self.names = set()
+
+        #Queues connecting each stage
+        fileQueue   = queue.Queue()
+        readQueue   = queue.Queue(self.queueSize)
+        decodeQueue = queue.Queue(self.queueSize)
+        writeQueue  = queue.Queue(self.queueSize)
+
+        if not self.opened:
+            self.startPool()
+        if self.prefetch:
+            paths = [ job['path'] if isinstance(job, dict) else job for job in filepaths ]
+            self.prefetcher = Prefetcher(paths, self.prefetch).start()
+
+        stages = [
+            Stage("read", self.readStage, self.readers, fileQueue, readQueue),
+            Stage("decode", self.decodeStage, self.decoders, readQueue, decodeQueue),
+            Stage("encode", self.encodeStage, self.encoders, decodeQueue, writeQueue),
+            Stage("write", self.writeStage, self.writers, writeQueue)
+        ]
+
+        #Link the stop signal of each stage to the following one
+        for i in range(len(stages) - 1):
+            stages[i].downstream = stages[i + 1].workers
+
+        for job in filepaths:
+            fileQueue.put(job)
+        for i in range(self.readers):
+            fileQueue.put(STAGE_DONE)
+
+        try:
+            for stage in stages:
+                stage.start()
+
+            for stage in stages:
+                stage.join()
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.stop()
+                self.prefetcher = None
+
+            if not self.opened:
+                self.stopPool()
+            if ownSink:
+                self.sink.close()
+                self.sink = None
+
+        #Collect errors from each stage
+        errors = []
+        for stage in stages:
+            errors.extend(stage.errors)
+
+        return errors
+
+    def getCount(self):
+        return self.count
+
+    def readStage(self, item, emit):
+        #Scheduled jobs carry their textures, plain paths read them all
+        path = item['path'] if isinstance(item, dict) else item
+        if self.prefetcher is not None:
+            self.prefetcher.reached(path)
+
+        #Only the read stage reads files whole, header passes such
+        #as the scheduler's open them lazily
+        data = readWhole(path)
+
+        if isinstance(item, dict):
+            bs = openStream(path, data)
+            entries = item['entries']
+        else:
+            archive = openArchive(path, data)
+            if archive is None:
+                print("Unknown file extension: %s" % item)
+                return
+            bs = archive.bs
+            entries = None
+
+        #Read each texture as raw bytes while holding the file open
+        try:
+            if entries is None:
+                entries = archive.readTextureEntries()
+
+            #Read in file order so the reads stay sequential
+            for entry in sorted(entries, key = lambda entry: entry['offset']):
+                bs.bs.seek(entry['offset'])
+                data = bs.readBytes(entry['length'])
+                emit((entry.get('unique') or self.uniqueName(entry['name']), data))
+        finally:
+            bs.close()
+
+    def uniqueName(self, name):
+        #Numbered against the names written in this run. Entries
+        #that carry their own unique name, as watch mode jobs do,
+        #skip this.
+        with self.lock:
+            return numberName(name, self.names)
+
+    def decodeStage(self, item, emit):
+        name, data = item
+
+        #Containers need no compression, so they skip the encode stage
+        if self.container:
+            self.decodeContainer(name, data, emit)
+            return
+
+        #Return the bitmap through shared memory when it fits a slab
+        width, height = readDimensions(data)
+        if self.slabs is not None and self.slabs.fits(width * height * 4):
+            self.decodeShared(name, data, emit)
+            return
+
+        if self.pool is not None:
+            result = self.pool.submit(decodeTexture, data).result()
+        else:
+            result = decodeTexture(data)
+
+        if result is None:
+            print("Skipping unsupported texture: %s" % name)
+            return
+
+        emit((name,) + result + (None,))
+
+    def decodeContainer(self, name, data, emit):
+        if self.pool is not None:
+            result = self.pool.submit(encodeContainer, data, self.encoder).result()
+        else:
+            result = encodeContainer(data, self.encoder)
+
+        if result is None:
+            print("Skipping unsupported texture: %s" % name)
+            return
+
+        emit((name, None, None, result, None))
+
+    def decodeShared(self, name, data, emit):
+        #Blocks until a slab is free
+        slab = self.slabs.acquire()
+
+        try:
+            result = self.pool.submit(decodeToSlab, data, slab).result()
+        except:
+            self.slabs.release(slab)
+            raise
+
+        if result is None:
+            self.slabs.release(slab)
+            print("Skipping unsupported texture: %s" % name)
+            return
+
+        width, height = result
+        view = self.slabs.view(slab, width * height * 4)
+        emit((name, width, height, view, slab))
+
+    def encodeStage(self, item, emit):
+        name, width, height, bitmap, slab = item
+
+        #Already encoded by the decode stage
+        if width is None:
+            emit((name, bitmap))
+            return
+
+        if slab is None:
+            emit((name, self.encoder.encode(width, height, bitmap)))
+            return
+
+        #Encode straight from the slab, then hand it back to the pool
+        try:
+            rows = iterRows(bitmap, width * 4, height)
+            data = self.encoder.encode(width, height, rows)
+        finally:
+            bitmap.release()
+            self.slabs.release(slab)
+
+        emit((name, data))
+
+    def writeStage(self, item, emit):
+        name, data = item
+        self.sink.write(name + self.extension, data)
+
+        with self.lock:
+            self.count += 1
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,376 @@
+#==============================================================
+"""
+
+PNG Encoders
+Backends for compressing decoded RGBA rows into png files. The
+parallel encoder splits the image data into blocks that are
+deflated on a thread pool and joined into a single stream.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import png
+import zlib
+import array
+import struct
+import itertools
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+#Png constants
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+COLOR_RGBA    = 6
+BYTES_RGBA    = 4
+
+#Png scanline filter types
+FILTER_NONE   = 0
+FILTER_SUB    = 1
+FILTER_UP     = 2
+
+FILTER_LIST   = { 'none' : FILTER_NONE, 'sub' : FILTER_SUB, 'up' : FILTER_UP }
+
+#Zlib strategies by name
+STRATEGY_LIST = {
+    'default'  : zlib.Z_DEFAULT_STRATEGY,
+    'filtered' : zlib.Z_FILTERED,
+    'huffman'  : zlib.Z_HUFFMAN_ONLY,
+    'rle'      : zlib.Z_RLE
+}
+
+#Deflate window, also the dictionary carried between blocks
+WINDOW_SIZE   = 32768
+
+def writeChunk(f, tag, data):
+    #Length, tag, data and crc of a png chunk
+    f.write(struct.pack('>I', len(data)))
+    f.write(tag)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag))))
+
+def zlibHeader(level):
+    #Two byte zlib header for a 32k window at the given level
+    if level < 0 or level == 6:
+        flevel = 2
+    elif level < 2:
+        flevel = 0
+    elif level < 6:
+        flevel = 1
+    else:
+        flevel = 3
+
+    cmf = 0x78
+    flg = flevel << 6
+    flg += 31 - ((cmf << 8 | flg) % 31)
+    return bytes([cmf, flg])
+
+#Lane masks for subtractBytes, by row length
+LANE_MASKS = {}
+
+def subtractBytes(a, b, length):
+    #Byte-wise (a - b) mod 256 over whole rows at once, using
+    #big integers so that no lane borrows from its neighbour
+    if length not in LANE_MASKS:
+        high = int.from_bytes(b'\x80' * length, 'big')
+        low  = int.from_bytes(b'\x7f' * length, 'big')
+        LANE_MASKS[length] = (high, low, high | low)
+    high, low, mask = LANE_MASKS[length]
+
+    x = int.from_bytes(a, 'big')
+    y = int.from_bytes(b, 'big')
+    z = ((x | high) - (y & low)) ^ ((x ^ y ^ mask) & high)
+    return z.to_bytes(length, 'big')
+
+def filterRows(rows, stride, ftype):
+    #Each scanline prefixed with its filter type, as rows arrive
+    prev = bytes(stride)
+    head = bytes([ftype])
+
+    for row in rows:
+        row = bytes(row)
+        if ftype == FILTER_NONE:
+            yield head + row
+        elif ftype == FILTER_SUB:
+            yield head + subtractBytes(row, bytes(BYTES_RGBA) + row[:-BYTES_RGBA], stride)
+        else:
+            yield head + subtractBytes(row, prev, stride)
+        prev = row
+
+#==============================================================
+"""
+PypngEncoder Class
+Default backend, a single deflate stream written by pypng as
+rows arrive
+"""
+#==============================================================
+
+class PypngEncoder:
+
+    def __init__(self, level = 6, **options):
+        self.level = level
+
+    def write(self, f, width, height, rows):
+        writer = png.Writer(width, height, greyscale = False, alpha = True,
+                            compression = self.level)
+        writer.write(f, rows)
+
+    def encode(self, width, height, rows):
+        buf = io.BytesIO()
+        self.write(buf, width, height, rows)
+        return buf.getvalue()
+
+    def close(self):
+        return 1
+
+#==============================================================
+"""
+ParallelPngEncoder Class
+Deflates blocks of filtered scanlines on a thread pool, each
+primed with the last 32k of the block before it. Blocks end on
+a sync or full flush so they can be joined into one valid zlib
+stream. Zlib releases the gil, so blocks compress in parallel.
+A block is sent to the pool as soon as its rows have arrived
+and written as its own IDAT chunk once compressed, so only the
+blocks in flight are held in memory.
+"""
+#==============================================================
+
+class ParallelPngEncoder:
+
+    def __init__(self, level = 6, filter = 'none', strategy = 'default',
+                 threads = None, blockSize = 131072, fullFlush = False):
+        self.level = level
+        self.filter = FILTER_LIST[filter]
+        self.strategy = STRATEGY_LIST[strategy]
+        self.blockSize = max(WINDOW_SIZE, blockSize)
+        self.flush = zlib.Z_FULL_FLUSH if fullFlush else zlib.Z_SYNC_FLUSH
+        self.threads = threads or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(self.threads)
+
+    def compressBlock(self, zdict, block, last):
+        #Raw deflate of one block, primed with the preceding window
+        if zdict and self.flush != zlib.Z_FULL_FLUSH:
+            z = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9,
+                                 self.strategy, zdict)
+        else:
+            z = zlib.compressobj(self.level, zlib.DEFLATED, -15, 9,
+                                 self.strategy)
+
+        out = z.compress(block)
+        out += z.flush(zlib.Z_FINISH if last else self.flush)
+        return out
+
+    def iterBlocks(self, lines):
+        #Blocks of blockSize bytes cut from the scanlines, each with
+        #the window before it. The last block is whatever remains.
+        buf = bytearray()
+        zdict = b''
+        for line in lines:
+            buf += line
+            while len(buf) > self.blockSize:
+                block = bytes(buf[:self.blockSize])
+                del buf[:self.blockSize]
+                yield zdict, block, False
+                zdict = block[-WINDOW_SIZE:]
+        yield zdict, bytes(buf), True
+
+    def deflate(self, lines):
+        #Compressed blocks in order, the first led by the zlib header
+        #and the last followed by the checksum. At most two blocks
+        #per thread are in flight.
+        pending = collections.deque()
+        limit = self.threads * 2
+        adler = 1
+        head = zlibHeader(self.level)
+
+        for zdict, block, last in self.iterBlocks(lines):
+            adler = zlib.adler32(block, adler)
+            pending.append(self.pool.submit(self.compressBlock, zdict, block, last))
+            while len(pending) >= limit:
+                yield head + pending.popleft().result()
+                head = b''
+
+        while len(pending) > 1:
+            yield head + pending.popleft().result()
+            head = b''
+        yield head + pending.popleft().result() + struct.pack('>I', adler)
+
+    def write(self, f, width, height, rows):
+        stride = width * BYTES_RGBA
+        lines = filterRows(rows, stride, self.filter)
+
+        f.write(PNG_SIGNATURE)
+        writeChunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, COLOR_RGBA, 0, 0, 0))
+        for data in self.deflate(lines):
+            writeChunk(f, b'IDAT', data)
+        writeChunk(f, b'IEND', b'')
+
+    def encode(self, width, height, rows):
+        buf = io.BytesIO()
+        self.write(buf, width, height, rows)
+        return buf.getvalue()
+
+    def close(self):
+        self.pool.shutdown()
+        return 1
+
+#==============================================================
+"""
+OptimizedPngEncoder Class
+Inspects the whole decoded image and writes the smallest color
+type that keeps every pixel identical: palette with tRNS when
+there are at most 256 colors, greyscale, RGB when every pixel is
+opaque, or RGB with a single transparent color key.
+"""
+#==============================================================
+
+class OptimizedPngEncoder:
+
+    #Marks fully transparent alpha bytes with 1 and others with 0
+    CLEAR_TABLE  = bytes([1] + [0] * 255)
+    OPAQUE_TABLE = bytes([0] * 255 + [1])
+
+    def __init__(self, level = 6, **options):
+        self.level = level
+
+    def paletteDepth(self, count):
+        if count <= 2:
+            return 1
+        elif count <= 4:
+            return 2
+        elif count <= 16:
+            return 4
+        return 8
+
+    def choose(self, data):
+        #Return pypng writer options and a function producing rows
+        alpha = data[3::4]
+        red = data[0::4]
+        opaque = not alpha.translate(None, b'\xff')
+        gray = red == data[1::4] and red == data[2::4]
+
+        #Each pixel as one integer, compared and hashed at c speed
+        pixels = array.array('I')
+        pixels.frombytes(data)
+        colors = set(pixels)
+
+        if gray and opaque:
+            choice = ({ 'greyscale' : True }, red, 1)
+        elif opaque:
+            choice = ({ 'greyscale' : False }, self.dropAlpha(data), 3)
+        elif gray:
+            out = bytearray(len(red) * 2)
+            out[0::2] = red
+            out[1::2] = alpha
+            choice = ({ 'greyscale' : True, 'alpha' : True }, out, 2)
+        else:
+            key = self.colorKey(pixels, alpha)
+            if key is not None:
+                options = { 'greyscale' : False, 'transparent' : key }
+                choice = (options, self.dropAlpha(data), 3)
+            else:
+                choice = ({ 'greyscale' : False, 'alpha' : True }, data, 4)
+
+        #Palette only pays off when its table is smaller than the savings
+        if len(colors) <= 256:
+            depth = self.paletteDepth(len(colors))
+            paletteSize = len(colors) * 4 + len(pixels) * depth // 8
+            if paletteSize < len(pixels) * choice[2]:
+                return self.palette(pixels, colors)
+
+        return choice
+
+    def palette(self, pixels, colors):
+        #Translucent entries first so the tRNS chunk stays short
+        entries = [ tuple(struct.pack('=I', c)) for c in colors ]
+        entries.sort(key = lambda rgba: rgba[3] == 0xFF)
+        palette = [ rgba if rgba[3] != 0xFF else rgba[:3] for rgba in entries ]
+
+        lookup = {}
+        for i, rgba in enumerate(entries):
+            lookup[struct.unpack('=I', bytes(rgba))[0]] = i
+
+        indices = bytes(map(lookup.__getitem__, pixels))
+        options = { 'palette' : palette, 'bitdepth' : self.paletteDepth(len(entries)) }
+        return (options, indices, 1)
+
+    def dropAlpha(self, data):
+        out = bytearray(len(data) // 4 * 3)
+        out[0::3] = data[0::4]
+        out[1::3] = data[1::4]
+        out[2::3] = data[2::4]
+        return out
+
+    def colorKey(self, pixels, alpha):
+        #A single RGB shared by every clear pixel and no opaque pixel
+        if alpha.translate(None, b'\x00\xff'):
+            return None
+
+        rgbMask = array.array('I', b'\xff\xff\xff\x00')[0]
+        clear = alpha.translate(OptimizedPngEncoder.CLEAR_TABLE)
+        solid = alpha.translate(OptimizedPngEncoder.OPAQUE_TABLE)
+
+        keys = set(map(rgbMask.__and__, itertools.compress(pixels, clear)))
+        if len(keys) != 1:
+            return None
+
+        key = keys.pop()
+        if key in set(map(rgbMask.__and__, itertools.compress(pixels, solid))):
+            return None
+
+        return tuple(struct.pack('=I', key)[:3])
+
+    def write(self, f, width, height, rows):
+        data = bytearray()
+        for row in rows:
+            data += row
+
+        options, out, channels = self.choose(bytes(data))
+        stride = width * channels
+        lines = [ out[y * stride : (y + 1) * stride] for y in range(height) ]
+
+        writer = png.Writer(width, height, compression = self.level, **options)
+        writer.write(f, lines)
+
+    def encode(self, width, height, rows):
+        buf = io.BytesIO()
+        self.write(buf, width, height, rows)
+        return buf.getvalue()
+
+    def close(self):
+        return 1
+
+#Encoder backends by name
+ENCODER_LIST = {
+    'pypng'    : PypngEncoder,
+    'parallel' : ParallelPngEncoder,
+    'optimize' : OptimizedPngEncoder
+}
+
+def createEncoder(name = 'pypng', **options):
+    return ENCODER_LIST[name](**options)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
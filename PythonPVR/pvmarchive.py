@@ -26,8 +26,12 @@ DEALINGS IN THE SOFTWARE.
 #==============================================================
 
 import os
+import sys
 import png
 import math
+import mmap
+import array
+import struct
 from PIL import Image
 from bitstream import BitStream
 
@@ -36,16 +40,32 @@ BIT_1 = 0x02
 BIT_2 = 0x04
 BIT_3 = 0x08
 
+def writeImage(imgName, pvr, encoder = None):
+    #Stream rows from the decoder into the png compressor
+    with open(imgName, 'wb') as f:
+        #Containers such as dds take the texture with all its mipmaps
+        if hasattr(encoder, 'writeTexture'):
+            encoder.writeTexture(f, pvr)
+            return
+
+        if encoder is not None:
+            encoder.write(f, pvr.width, pvr.height, pvr.iterRows())
+            return
+
+        writer = png.Writer(pvr.width, pvr.height, greyscale = False, alpha = True)
+        writer.write(f, pvr.iterRows())
+
 class PvmArchive:
 
     #File Format Constants
     PVMH = 0x484D5650
     PVRT = 0x54525650
 
-    def __init__(self, filepath):
-        self.bs = BitStream(filepath)
+    def __init__(self, filepath, verbose = False, budget = None):
+        self.bs = BitStream(filepath, budget)
         self.texList = self.readHeader()
-        print(self.texList)
+        if verbose:
+            print(self.texList)
 
     def readHeader(self):
         #Create array
@@ -65,6 +85,7 @@ class PvmArchive:
         nbTex = self.bs.readUShort()
 
         for i in range(nbTex):
+            self.bs.budget.spend('chunks')
             tex = { 'id' : self.bs.readUShort() }
 
             if flags & BIT_3:
@@ -85,7 +106,40 @@ class PvmArchive:
         self.bs.seek_set(texOfs)
         return texList
 
-    def writePngImages(self):
+    def readTextureEntries(self):
+        #Create array
+        entries = []
+
+        #No textures without a valid header
+        if not self.texList:
+            return entries
+
+        #Start searching from the first texture entry
+        self.bs.seek_set(0)
+
+        for tex in self.texList:
+            self.bs.budget.spend('chunks')
+
+            #Look for PVRT file header
+            if not self.bs.find(PvmArchive.PVRT):
+                break
+
+            #Length and absolute position of pvr texture
+            pvrLen = self.bs.readUInt()
+            pvrOfs = self.bs.tell()
+
+            entries.append({
+                'name'   : tex.get('name', "texture[%d]" % tex['id']),
+                'offset' : pvrOfs,
+                'length' : pvrLen
+            })
+
+            #Continue search after the texture data
+            self.bs.seek_cur(pvrLen)
+
+        return entries
+
+    def writePngImages(self, encoder = None):
 
         #Loop through each texture
         for tex in self.texList:
@@ -107,9 +161,12 @@ class PvmArchive:
             #Create PvrImage to convert bitmap
             print("Name: %s, Pos: 0x%x"%(tex['name'],self.bs.tell()))
             pvr = PvrTexture(self.bs, False, True)
-            bitmap = pvr.getBitmap()
-            imgName = "output/" + tex['name'] + '.png'
-            png.from_array(bitmap, 'RGBA').save(imgName)
+
+            if not pvr.isSupported():
+                continue
+
+            imgName = "output/" + tex['name'] + getattr(encoder, 'extension', '.png')
+            writeImage(imgName, pvr, encoder)
 
             #img = Image.open(imgName)
             #img = img.rotate(180)
@@ -134,13 +191,52 @@ class ShenmueModel:
     TEXD = 0x44584554
     PVRT = 0x54525650
 
-    def __init__(self, filepath):
-        self.fp = os.path.basename(filepath)
-        self.bs = BitStream(filepath)
+    def __init__(self, filepath, name = None, budget = None):
+        #In-memory models have no path to take texture names from
+        self.fp = name or os.path.basename(filepath)
+        self.bs = BitStream(filepath, budget)
         self.iff = self.bs.readUInt()
         self.texOfs = self.bs.readUInt()
 
-    def writePngImages(self):
+    def readTextureEntries(self):
+        #Create array
+        entries = []
+
+        #Seek to texture offset
+        self.bs.seek_set(self.texOfs)
+
+        #Check offset for texture definition
+        iff = self.bs.readUInt()
+        if iff != ShenmueModel.TEXD:
+            return entries
+        iffLen = self.bs.readUInt()
+        #Read number of textures
+        nbTex = self.bs.readUInt()
+        texBase = os.path.splitext(self.fp)[0]
+
+        for i in range(nbTex):
+            self.bs.budget.spend('chunks')
+
+            #Look for pvr file header
+            if not self.bs.find(ShenmueModel.PVRT):
+                break
+
+            #Length and absolute position of pvr texture
+            pvrLen = self.bs.readUInt()
+            pvrOfs = self.bs.tell()
+
+            entries.append({
+                'name'   : "%s_%02d" % (texBase, i),
+                'offset' : pvrOfs,
+                'length' : pvrLen
+            })
+
+            #Continue search after the texture data
+            self.bs.seek_cur(pvrLen)
+
+        return entries
+
+    def writePngImages(self, encoder = None):
         #Seek to texture offset
         self.bs.seek_set(self.texOfs)
 
@@ -163,14 +259,14 @@ class ShenmueModel:
             #Length of pvrFile
             pvrLen = self.bs.readUInt()
             pvr = PvrTexture(self.bs, False, True)
-            bitmap = pvr.getBitmap()
 
-            if len(bitmap) == 0:
+            if not pvr.isSupported():
                 continue
 
-            texName = "output/%s_%02d.png" % (texBase, i)
+            texName = "output/%s_%02d" % (texBase, i)
+            texName += getattr(encoder, 'extension', '.png')
             print(texName)
-            png.from_array(bitmap, 'RGBA').save(texName)
+            writeImage(texName, pvr, encoder)
 
         return 1
 
@@ -217,7 +313,8 @@ class PvrTexture:
     BYTE_SIZE       = 1
     WORD_SIZE       = 2
     CODE_COMPONENTS = 4
-    LOOKUP_TABLE    = {}
+    LOOKUP_TABLE    = [ 0 ] * 1024
+    COLOR_TABLE     = {}
 
     #Flag test lists
     RECTANGLE       =   0x09
@@ -226,20 +323,42 @@ class PvrTexture:
     VECTOR_LIST     = [ 0x03, 0x04, 0x10, 0x11 ]
     MIPMAP_LIST     = [ 0x02, 0x04, 0x06, 0x08, 0x0F, 0x11, 0x12 ]
     UNSUPPORTED     = [ 0x05, 0x06, 0x07, 0x08, 0x0B, 0x0E, 0x0F ]
+    COLOR_LIST      = [ 0x00, 0x01, 0x02 ]
 
-    def __init__(self, bs, flipX = False, flipY = False):
-        self.bs = bs
+    #Inputs read without copying
+    BUFFER_TYPES    = (bytes, bytearray, memoryview, mmap.mmap)
+
+    def __init__(self, bs, flipX = False, flipY = False, verbose = False):
         self.flipX = flipX
         self.flipY = flipY
+        self.verbose = verbose
+        self.bitmap = None
+
+        #Buffers are decoded in place, starting at the texture header
+        if isinstance(bs, PvrTexture.BUFFER_TYPES):
+            self.bs = None
+            self.readBuffer(memoryview(bs).cast('B'))
+            return
+
+        self.bs = bs
         self.color_format = self.bs.readByte()
         self.data_format  = self.bs.readByte()
         self.bs.seek_cur(0x02)
         self.width  = self.bs.readUShort()
         self.height = self.bs.readUShort()
         self.flags  = self.setTexFlags()
-        self.bitmap = self.createBitmap()
+        self.data   = self.readData()
+
+    def readBuffer(self, view):
+        header = struct.unpack_from('<BBHHH', view, 0)
+        self.color_format, self.data_format, pad, self.width, self.height = header
+        self.flags = self.setTexFlags()
+        self.data  = view[0x08:0x08 + self.getDataLength()]
 
     def getBitmap(self):
+        #Decoded on first use
+        if self.bitmap is None:
+            self.bitmap = self.createBitmap()
         return self.bitmap
 
     def setTexFlags(self):
@@ -271,257 +390,189 @@ class PvrTexture:
 
         return flags
 
-    def createBitmap(self):
-        #Codebook array for VQ
-        codebook = []
-
-        #Mipwidth and height
-        mipWidth  = self.width
-        mipHeight = self.height
-
-        #Set offset after reading flags
-        self.bs.setOffset()
+    def getCodebookLength(self):
+        if not self.flags['isCompressed']:
+            return 0
+        return self.flags['codebook_size'] * PvrTexture.CODE_COMPONENTS * PvrTexture.WORD_SIZE
 
-        #VQ Compression read codebook in array
+    def getImageLength(self):
+        #Size of the full resolution image data
         if self.flags['isCompressed']:
-            print("Reading VQ codebook")
-
-            #Each codebook is 2x2
-            mipWidth = mipWidth / 2
-            mipHeight = mipHeight / 2
+            return (self.width // 2) * (self.height // 2)
+        return self.width * self.height * PvrTexture.WORD_SIZE
 
-            #Read each codebook entry
-            for i in range(self.flags['codebook_size']):
-                codebook.append(self.readCodebookEntry())
-
-            #Set offset for seek absolute
-            self.bs.setOffset()
-
-        #Read past smaller mipmap offsets
+    def getDataLength(self):
+        #Codebook, smaller mipmaps and the full image
+        length = self.getCodebookLength() + self.getImageLength()
         if self.flags['isMipmap']:
-            print("Seeking past mipmap data")
-            seekOfs = self.getMipmapSize()
-            self.bs.seek_cur(seekOfs)
+            length += self.getMipmapSize()
+        return length
 
-            #Set offset for seek absolute
-            self.bs.setOffset()
+    def readData(self):
+        #Read the texture data following the header once
+        self.bs.setOffset()
+        return self.bs.readBytes(self.getDataLength())
+
+    def isSupported(self):
+        #Formats the row decoder can handle
+        if self.color_format not in PvrTexture.COLOR_LIST:
+            return False
+        if len(self.data) < self.getDataLength():
+            return False
+        if self.width == 0 or self.height == 0:
+            return False
+        return (
+            self.flags['isTwiddled'] or
+            self.flags['isCompressed'] or
+            self.flags['isRectangle']
+        )
 
-        #Detwiddle texture data
-        if self.flags['isTwiddled']:
-
-            #Square texture
-            if mipWidth == mipHeight:
-                #Detwiddle image data
-                print("Square twiddled")
-                dstArray = self.detwiddle(mipWidth, mipHeight)
-
-            #Rectangular (wide) texture
-            elif mipWidth > mipHeight:
-                print("Rectangle (wide) Twiddled")
-                width = int(mipWidth/2)
-                height = mipHeight
-
-                if self.width != self.height*2:
-                    print("Returning none (wide)")
-                    return []
-
-                #Left Array
-                self.bs.seek_set(0)
-                leftArray  = self.detwiddle(width, height)
-                print("Left Array: %d"%len(leftArray))
-
-                #Seek to end of left array
-                self.bs.seek_set(width * height * 2)
-                self.bs.setOffset()
-
-                #Right Array
-                rightArray = self.detwiddle(width, height)
-                print("Right Array: %d"%len(rightArray))
-                #Merge the two arrays together
-
-                bitmap = []
-                for y in range(self.height):
-                    line = []
-
-                    for x in range(self.width/2):
-                        line.append(leftArray.pop(0))
-
-                    for x in range(self.width/2):
-                        line.append(rightArray.pop(0))
-
-                    row = []
-                    if self.flipX:
-                        for pixel in reversed(line):
-                            row.extend(pixel)
-                    else:
-                        for pixel in line:
-                            row.extend(pixel)
-
-                    if self.flipY:
-                        bitmap.insert(0, row)
-                    else:
-                        bitmap.append(row)
-
-                return bitmap
-            #Rectangular (tall) texture
-            elif mipWidth < mipHeight:
-                print("Rectangle (tall) Twiddled")
-
-                if self.width*2 != self.height:
-                    print("Returning none (tall)")
-                    return []
-
-                #Top Array
-                self.bs.seek_set(0)
-                topArray = self.detwiddle(mipWidth, mipWidth)
-
-                #Seek to end of left array
-                self.bs.seek_set(mipWidth * mipHeight)
-                self.bs.setOffset()
-
-                #Bottom Array
-                bottomArray = self.detwiddle(mipWidth, mipWidth)
-
-                #Merge the two arrays together
-                bitmap = []
-                print(len(topArray))
-                print(len(bottomArray))
-                print(self.width * self.height)
-                print("Height: %d Width: %d"%(self.height, self.width))
-                topLength = len(topArray)
-
-                #topArray + bottomArray
-                for y in range(self.width):
-                    line = []
-                    for x in range(self.width):
-                        line.append(topArray.pop(0))
-
-                    row = []
-                    if self.flipX:
-                        for pixel in reversed(line):
-                            row.extend(pixel)
-                    else:
-                        for pixel in line:
-                            row.extend(pixel)
-
-                    if self.flipY:
-                        bitmap.insert(0, row)
-                    else:
-                        bitmap.append(row)
-
-                for y in range(self.width):
-                    line = []
-                    for x in range(self.width):
-                        line.append(bottomArray.pop(0))
-
-                    row = []
-                    if self.flipX:
-                        for pixel in reversed(line):
-                            row.extend(pixel)
-                    else:
-                        for pixel in line:
-                            row.extend(pixel)
-
-                    if self.flipY:
-                        bitmap.insert(0, row)
-                    else:
-                        bitmap.append(row)
-
-                #print(bitmap)
-                return bitmap
-
-            bitmap = self.convert2dArray(dstArray)
-            return bitmap
-
-        #Create image from Codebook
-        if self.flags['isCompressed']:
-            print("VQ Compressed Decode")
-
-            #Decoded order of image data
-            imgData = self.detwiddle(mipWidth, mipHeight)
-            #Array to put data into
-            dstArray = [None] * (self.width * self.height)
-            #Destination position in dstArray
-            x , y = 0 , 0
-            for index in imgData:
-
-                #Get codebook entry
-                color = codebook[index]
-                #Assign 2x2 pixels for codebook entry
-                n = 0
-                for xOfs in range(2):
-                    for yOfs in range(2):
-                        i = (y * 2 + yOfs) * self.width + (x * 2 + xOfs)
-                        dstArray[i] = color[n]
-                        n += 1
-                #Incement destination position
-                x += 1
-                if x == mipWidth:
-                    x = 0
-                    y += 1
-
-            bitmap = self.convert2dArray(dstArray)
-            return bitmap
-
-        elif self.flags['isRectangle']:
-            dstArray = []
-
-            for y in range(self.height):
-                for x in range(self.width):
-
-                    short = self.bs.readUShort()
-                    color = self.convertColor(short)
-
-                    dstArray.append(color)
-
-            bitmap = self.convert2dArray(dstArray)
-            return bitmap
+    def createBitmap(self):
         #Unsupported data format
+        if not self.isSupported():
+            if self.verbose:
+                print("Unknown format error")
+                print("Data format:", self.data_format)
+                print(self.flags)
+            return []
+
+        return [ bytearray(row) for row in self.iterRows() ]
+
+    def iterRows(self, level = 0):
+        #Generate RGBA rows in output order, one at a time
+        if not self.isSupported() or level >= self.getMipmapCount():
+            return
+
+        width, height = self.getLevelSize(level)
+        if self.flipY:
+            order = range(height - 1, -1, -1)
         else:
-            print("Unknown format error")
-            print("Data format:", self.data_format)
-            print(self.flags)
-            return 0
-
-        return 1
-
-    def convert2dArray(self, array):
-        bitmap = []
+            order = range(height)
 
-        for y in range(self.height):
-            line = []
-
-            for x in range(self.width):
-                line.append(array[y * self.height + x])
-
-            row = []
+        if self.flags['isCompressed']:
+            readRow = self.vqRowReader(level)
+        else:
+            readRow = self.colorRowReader(level)
+
+        for y in order:
+            yield readRow(y)
+
+    def getMipmapCount(self):
+        #Number of stored levels, including the full image
+        if not self.flags['isMipmap']:
+            return 1
+        return self.width.bit_length()
+
+    def getLevelSize(self, level):
+        return (max(1, self.width >> level), max(1, self.height >> level))
+
+    def getImageOffset(self, level = 0):
+        #Image data is preceded by the codebook and smaller mipmaps
+        offset = self.getCodebookLength()
+        if level == 0:
+            if self.flags['isMipmap']:
+                offset += self.getMipmapSize()
+            return offset
+
+        #Mipmaps are stored smallest first after a short pad
+        size = self.width >> level
+        if self.flags['isCompressed']:
+            if size == 1:
+                return offset
+            offset += PvrTexture.BYTE_SIZE
+            mip = 2
+            while mip < size:
+                offset += mip * mip // PvrTexture.CODE_COMPONENTS
+                mip <<= 1
+        else:
+            offset += PvrTexture.WORD_SIZE
+            mip = 1
+            while mip < size:
+                offset += mip * mip * PvrTexture.WORD_SIZE
+                mip <<= 1
+
+        return offset
+
+    def getWords(self, offset, count):
+        #Little endian 16 bit values, a view of the data when possible
+        data = memoryview(self.data)[offset:offset + count * PvrTexture.WORD_SIZE]
+        if sys.byteorder == 'little':
+            return data.cast('H')
+
+        words = array.array('H', data)
+        words.byteswap()
+        return words
+
+    def twiddleColumns(self, width, height):
+        #Twiddled offset of each column, split into squares for rectangles
+        size = min(width, height)
+        table = PvrTexture.untwiddleTable()
+        columns = [ (x // size) * size * size | table[x % size] << 1 for x in range(width) ]
+        if self.flipX:
+            columns.reverse()
+        return columns
+
+    def twiddleRow(self, y, width, height):
+        #Twiddled offset of the start of each row
+        size = min(width, height)
+        table = PvrTexture.untwiddleTable()
+        return (y // size) * size * size | table[y % size]
+
+    def colorRowReader(self, level = 0):
+        lut = PvrTexture.colorTable(self.color_format)
+        width, height = self.getLevelSize(level)
+        words = self.getWords(self.getImageOffset(level), width * height)
+
+        if self.flags['isRectangle']:
+            def readRow(y):
+                line = words[y * width : (y + 1) * width]
+                if self.flipX:
+                    line = line[::-1]
+                return b''.join([ lut[c] for c in line ])
+            return readRow
+
+        columns = self.twiddleColumns(width, height)
+        def readRow(y):
+            base = self.twiddleRow(y, width, height)
+            return b''.join([ lut[words[base | c]] for c in columns ])
+        return readRow
+
+    def vqRowReader(self, level = 0):
+        lut = PvrTexture.colorTable(self.color_format)
+        entries = self.getWords(0, self.flags['codebook_size'] * PvrTexture.CODE_COMPONENTS)
+        offset = self.getImageOffset(level)
+        width, height = self.getLevelSize(level)
+        indices = self.data[offset:offset + max(1, (width // 2) * (height // 2))]
+
+        #Small codebooks leave byte values that index past their end
+        size = self.flags['codebook_size']
+        if size < 256 and max(indices) >= size:
+            raise ValueError("Codebook index past its %d entries" % size)
+
+        #The 1x1 mipmap is a single index, use its first color
+        if width == 1:
+            color = lut[entries[indices[0] * PvrTexture.CODE_COMPONENTS]]
+            return lambda y: color
+
+        width, height = width // 2, height // 2
+
+        #Each codebook entry covers 2x2 pixels, stored column by column
+        pairs = ([], [])
+        for i in range(0, len(entries), PvrTexture.CODE_COMPONENTS):
+            a, b, c, d = entries[i:i + PvrTexture.CODE_COMPONENTS]
             if self.flipX:
-                for pixel in reversed(line):
-                    row.extend(pixel)
+                pairs[0].append(lut[c] + lut[a])
+                pairs[1].append(lut[d] + lut[b])
             else:
-                for pixel in line:
-                    row.extend(pixel)
+                pairs[0].append(lut[a] + lut[c])
+                pairs[1].append(lut[b] + lut[d])
 
-            if self.flipY:
-                bitmap.insert(0, row)
-            else:
-                bitmap.append(row)
-
-        return bitmap
-
-    def readCodebookEntry(self):
-        #Read short for each entry
-        a = self.bs.readUShort()
-        b = self.bs.readUShort()
-        c = self.bs.readUShort()
-        d = self.bs.readUShort()
-        #Convert short to colors
-        a = self.convertColor(a)
-        b = self.convertColor(b)
-        c = self.convertColor(c)
-        d = self.convertColor(d)
-        #Return entry tupple
-        return (a, b, c, d)
+        columns = self.twiddleColumns(width, height)
+        def readRow(y):
+            base = self.twiddleRow(y >> 1, width, height)
+            pair = pairs[y & 1]
+            return b''.join([ pair[indices[base | c]] for c in columns ])
+        return readRow
 
     def getMipmapSize(self):
         mipCount = 0
@@ -559,72 +610,55 @@ class PvrTexture:
         #Return offset to seek past
         return seekOfs
 
-    def detwiddle(self, width, heigth):
-        #Create a temporary array
-        array = [None] * (width * heigth)
-
-        #Loop over each row
-        for y in range(heigth):
-            #Loop over each column
-            for x in range(width):
-                #Get untwiddled location
-                i = self.untwiddle(x, y)
-
-                #Seek to location and read to index
-                if self.flags['isCompressed']:
-                    #For VQ only change order to be decoded
-                    self.bs.seek_set(i * PvrTexture.BYTE_SIZE)
-                    array[y * heigth + x] = self.bs.readByte()
-                else:
-                    #For normal twiddled convert the color
-                    self.bs.seek_set(i * PvrTexture.WORD_SIZE)
-                    short = self.bs.readUShort()
-                    array[y * heigth + x] = self.convertColor(short)
-
-        #Return detwiddled array
-        return array
-
-    def untwiddle(self, x, y):
-        #String key for lookup table
-        key = "%d:%d"%(x,y)
-
-        #Use value if found in lookup table
-        if key in PvrTexture.LOOKUP_TABLE:
-            return PvrTexture.LOOKUP_TABLE[key]
+    @staticmethod
+    def untwiddleTable():
+        #Spread the bits of each value, filled on first use
+        table = PvrTexture.LOOKUP_TABLE
+        if table[1]:
+            return table
 
-        #Internal function to calculate position
-        def untwiddleValue(val):
+        for val in range(len(table)):
             untwiddled = 0
             for i in range(10):
-                shift = int(math.pow(2, i))
-                if val & shift :
+                shift = 1 << i
+                if val & shift:
                     untwiddled = untwiddled | (shift << i)
-            return untwiddled
+            table[val] = untwiddled
 
-        #Get position from internal function
-        pos = untwiddleValue(y)  |  untwiddleValue(x) << 1
-        #Set position to lookup table
-        PvrTexture.LOOKUP_TABLE[key] = pos
-        #Return converted position
-        return pos
+        return table
 
-    def convertColor(self, short):
+    def untwiddle(self, x, y):
+        table = PvrTexture.untwiddleTable()
+        return table[y] | table[x] << 1
+
+    @staticmethod
+    def colorTable(color_format):
+        #RGBA bytes for every 16 bit color, built once per format
+        if color_format not in PvrTexture.COLOR_TABLE:
+            PvrTexture.COLOR_TABLE[color_format] = [
+                bytes(PvrTexture.convertColor(color_format, short))
+                for short in range(0x10000)
+            ]
+        return PvrTexture.COLOR_TABLE[color_format]
+
+    @staticmethod
+    def convertColor(color_format, short):
         #Color format constants
         ARGB_1555 = 0x00
         ARGB_0565 = 0x01
         ARGB_4444 = 0x02
 
-        if self.color_format == ARGB_1555:
+        if color_format == ARGB_1555:
             a = 0xFF if (short & (1<<15)) else 0
             r = (short >> 7) & 0xf8
             g = (short >> 2) & 0xf8
             b = (short << 3) & 0xf8
-        elif self.color_format == ARGB_0565:
+        elif color_format == ARGB_0565:
             a = 0xff
             r = (short >> 8) & (0x1f<<3)
             g = (short >> 3) & (0x3f<<2)
             b = (short << 3) & (0x1f<<3)
-        elif self.color_format == ARGB_4444:
+        elif color_format == ARGB_4444:
             a = (short >> 8) & 0xf0
             r = (short >> 4) & 0xf0
             g = (short >> 0) & 0xf0
@@ -639,6 +673,91 @@ class PvrTexture:
 
 
 
+#==============================================================
+"""
+Decode Functions
+Library interface for decoding a single pvr texture from bytes,
+a memoryview or an mmap. The result is a memoryview of RGBA
+bytes shaped (height, width, 4), which NumPy, PIL and Blender
+can use through the buffer protocol without a copy.
+"""
+#==============================================================
+
+GBIX = b'GBIX'
+PVRT = b'PVRT'
+
+def textureView(buf):
+    #Skip the optional GBIX chunk and PVRT chunk header
+    view = memoryview(buf).cast('B')
+
+    if view[0:4] == GBIX:
+        if len(view) < 0x08:
+            raise ValueError("GBIX chunk is truncated")
+        length = struct.unpack_from('<I', view, 0x04)[0]
+        view = view[0x08 + length:]
+    if view[0:4] == PVRT:
+        view = view[0x08:]
+
+    return view
+
+def openTexture(view, flipX = False, flipY = False):
+    #Texture over a textureView, with the header and the data it
+    #describes checked to be there before anything is read
+    if len(view) < 0x08:
+        raise ValueError("Texture header needs 8 bytes, found %d" % len(view))
+
+    pvr = PvrTexture(view, flipX, flipY)
+    size = (pvr.width, pvr.height)
+
+    #Sizes the twiddled and vq layouts cannot hold
+    if pvr.flags['isTwiddled'] or pvr.flags['isCompressed']:
+        if any(side & (side - 1) for side in size):
+            raise ValueError("Twiddled texture of %dx%d" % size)
+    if pvr.flags['isCompressed'] and min(size) < 2:
+        raise ValueError("Compressed texture of %dx%d" % size)
+    if pvr.flags['isMipmap'] and pvr.width != pvr.height:
+        raise ValueError("Mipmapped texture of %dx%d" % size)
+
+    if len(pvr.data) < pvr.getDataLength():
+        raise ValueError("Texture data needs %d bytes, found %d" %
+                         (pvr.getDataLength(), len(pvr.data)))
+    return pvr
+
+def decodeSize(buf, mip = 0):
+    #Width and height of a decoded mipmap level
+    pvr = openTexture(textureView(buf))
+    return pvr.getLevelSize(mip)
+
+def decode(buf, *, mip = 0, out = None, flipX = False, flipY = True):
+    """
+    Decode one texture. mip selects a stored mipmap level, 0 being
+    the full image. When out is given, the pixels are written into
+    it, so a caller can reuse one buffer. Rows are top first by
+    default, as in the exported pngs. Truncated or malformed input
+    raises ValueError.
+    """
+    pvr = openTexture(textureView(buf), flipX, flipY)
+    if not pvr.isSupported() or mip >= pvr.getMipmapCount():
+        raise ValueError("Unsupported pvr texture or mipmap level")
+
+    width, height = pvr.getLevelSize(mip)
+    stride = width * 4
+    size = stride * height
+
+    if out is None:
+        out = bytearray(size)
+
+    view = memoryview(out).cast('B')
+    if len(view) < size:
+        raise ValueError("Output buffer needs %d bytes" % size)
+
+    y = 0
+    for row in pvr.iterRows(mip):
+        view[y : y + stride] = row
+        y += stride
+
+    return view[:size].cast('B', (height, width, 4))
+
 #==============================================================
 """
 Program End
@@ -0,0 +1,304 @@
+#==============================================================
+"""
+
+PVR Encoder
+Converts RGBA images back into pvr textures so edited textures
+can be put back into the game. Colors are packed a whole image
+at a time with byte translation tables, pixels are reordered
+with a cached permutation table, and mipmaps are made with a 2x2
+box filter.
+
+    python pvrencode.py <image.png> <texture.pvr> [--color 565] [--format twiddled_mm]
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import sys
+import png
+import array
+import struct
+import argparse
+import operator
+
+#Import User Libraries
+from pvmarchive import *
+
+#Color formats
+ARGB_1555          = 0x00
+RGB_565            = 0x01
+ARGB_4444          = 0x02
+
+#Data formats
+TWIDDLED           = 0x01
+TWIDDLED_MM        = 0x02
+VQ                 = 0x03
+VQ_MM              = 0x04
+RECTANGLE          = 0x09
+TWIDDLED_RECTANGLE = 0x0D
+SMALLVQ            = 0x10
+SMALLVQ_MM         = 0x11
+
+COLOR_NAMES = { '1555' : ARGB_1555, '565' : RGB_565, '4444' : ARGB_4444 }
+FORMAT_NAMES = {
+    'twiddled'    : TWIDDLED,
+    'twiddled_mm' : TWIDDLED_MM,
+    'rectangle'   : RECTANGLE,
+    'twiddled_rectangle' : TWIDDLED_RECTANGLE
+}
+
+def splitTable(bits, high, shift):
+    #Part of a quantized channel that lands in the high or low byte
+    step = 8 - bits
+    top = (1 << bits) - 1
+    table = []
+    for v in range(256):
+        q = min(top, (v + (1 << step >> 1)) >> step) << shift
+        table.append((q >> 8) & 0xFF if high else q & 0xFF)
+    return bytes(table)
+
+#Per channel tables giving the (high, low) byte of each format:
+#1555 is a rrrrr gg|ggg bbbbb, 565 rrrrr ggg|ggg bbbbb, 4444 aaaa rrrr|gggg bbbb
+PACK_TABLES = {
+    ARGB_1555 : (
+        (bytes([ 0x80 if v >= 0x80 else 0 for v in range(256) ]), bytes(256)),
+        (splitTable(5, True, 10), splitTable(5, False, 10)),
+        (splitTable(5, True, 5), splitTable(5, False, 5)),
+        (splitTable(5, True, 0), splitTable(5, False, 0))
+    ),
+    RGB_565 : (
+        (bytes(256), bytes(256)),
+        (splitTable(5, True, 11), splitTable(5, False, 11)),
+        (splitTable(6, True, 5), splitTable(6, False, 5)),
+        (splitTable(5, True, 0), splitTable(5, False, 0))
+    ),
+    ARGB_4444 : (
+        (splitTable(4, True, 12), splitTable(4, False, 12)),
+        (splitTable(4, True, 8), splitTable(4, False, 8)),
+        (splitTable(4, True, 4), splitTable(4, False, 4)),
+        (splitTable(4, True, 0), splitTable(4, False, 0))
+    )
+}
+
+def orBytes(planes, length):
+    #Byte-wise OR of planes whose bits never overlap
+    total = 0
+    for plane in planes:
+        total |= int.from_bytes(plane, 'little')
+    return total.to_bytes(length, 'little')
+
+def packColors(rgba, colorFormat):
+    #RGBA bytes to little endian 16 bit words for a whole image
+    count = len(rgba) // 4
+    channels = [ rgba[i::4] for i in (3, 0, 1, 2) ]
+    tables = PACK_TABLES[colorFormat]
+
+    high = orBytes([ c.translate(t[0]) for c, t in zip(channels, tables) ], count)
+    low = orBytes([ c.translate(t[1]) for c, t in zip(channels, tables) ], count)
+
+    out = bytearray(count * 2)
+    out[0::2] = low
+    out[1::2] = high
+    return out
+
+#Permutations by (width, height), built on first use
+PERMUTATIONS = {}
+
+def twiddlePermutation(width, height):
+    #Source pixel of each twiddled position. Rectangles are split
+    #into squares the way the decoder reads them.
+    key = (width, height)
+    if key in PERMUTATIONS:
+        return PERMUTATIONS[key]
+
+    size = min(width, height)
+    table = PvrTexture.untwiddleTable()
+    columns = [ (x // size) * size * size | table[x % size] << 1 for x in range(width) ]
+    rows = [ (y // size) * size * size | table[y % size] for y in range(height) ]
+
+    perm = [ 0 ] * (width * height)
+    for y, row in enumerate(rows):
+        base = y * width
+        for x, column in enumerate(columns):
+            perm[row | column] = base + x
+
+    PERMUTATIONS[key] = operator.itemgetter(*perm) if len(perm) > 1 else (lambda s: (s[0],))
+    return PERMUTATIONS[key]
+
+def flipRows(rgba, width, height):
+    #Reverse the row order, pvr rows are stored bottom first here
+    stride = width * 4
+    out = bytearray(len(rgba))
+    for y in range(height):
+        src = (height - 1 - y) * stride
+        out[y * stride : (y + 1) * stride] = rgba[src : src + stride]
+    return out
+
+def boxFilter(rgba, width, height):
+    #Average each 2x2 block, every channel at once in 16 bit lanes
+    half = width // 2
+    pixels = array.array('I')
+    pixels.frombytes(bytes(rgba))
+
+    out = bytearray()
+    for y in range(0, height, 2):
+        top = pixels[y * width : (y + 1) * width]
+        bottom = pixels[(y + 1) * width : (y + 2) * width]
+        quads = [ top[0::2], top[1::2], bottom[0::2], bottom[1::2] ]
+
+        length = half * 4
+        total = 0
+        for quad in quads:
+            wide = bytearray(length * 2)
+            wide[0::2] = quad.tobytes()
+            total += int.from_bytes(wide, 'little')
+
+        #Round, divide by four and drop what shifted in from the next lane
+        lanes = LANE_CONSTANTS.get(length)
+        if lanes is None:
+            lanes = (int.from_bytes(b'\x02\x00' * length, 'little'),
+                     int.from_bytes(b'\xff\x00' * length, 'little'))
+            LANE_CONSTANTS[length] = lanes
+        total = ((total + lanes[0]) >> 2) & lanes[1]
+        out += total.to_bytes(length * 2, 'little')[0::2]
+
+    return out
+
+#Rounding and mask constants for boxFilter, by row length
+LANE_CONSTANTS = {}
+
+def mipmapChain(rgba, width):
+    #Levels of a square image from full size down to 1x1
+    levels = [ bytes(rgba) ]
+    while width > 1:
+        rgba = boxFilter(rgba, width, width)
+        width //= 2
+        levels.append(bytes(rgba))
+    return levels
+
+def pvrHeader(colorFormat, dataFormat, width, height, dataLength):
+    #PVRT chunk header followed by the texture header
+    return struct.pack('<4sIBBHHH', b'PVRT', dataLength + 8, colorFormat, dataFormat,
+                       0, width, height)
+
+def gbixHeader(index):
+    return struct.pack('<4sIII', b'GBIX', 8, index, 0)
+
+def checkSize(width, height, square = False):
+    for size in (width, height):
+        if size < 8 or size > 1024 or size & (size - 1):
+            raise ValueError("Texture sizes must be powers of two from 8 to 1024")
+    if square and width != height:
+        raise ValueError("Mipmapped textures must be square")
+
+#==============================================================
+"""
+Encode Functions
+encodeTexture() takes RGBA bytes with the top row first, as read
+from a png or returned by decode(), and returns a PVRT chunk.
+With flipY the rows are stored bottom first, matching the flipY
+the exporter decodes with, so exported textures round-trip.
+"""
+#==============================================================
+
+def encodeLevel(rgba, width, height, colorFormat, dataFormat, flipY = True):
+    #Packed 16 bit words of one level in storage order
+    if flipY:
+        rgba = flipRows(rgba, width, height)
+    words = packColors(rgba, colorFormat)
+    if dataFormat == RECTANGLE:
+        return words
+
+    linear = array.array('H')
+    linear.frombytes(bytes(words))
+    twiddled = array.array('H', twiddlePermutation(width, height)(linear))
+    return twiddled.tobytes()
+
+def encodeTexture(rgba, width, height, colorFormat = ARGB_1555, dataFormat = TWIDDLED,
+                  flipY = True, gbix = None):
+    if dataFormat not in (TWIDDLED, TWIDDLED_MM, RECTANGLE, TWIDDLED_RECTANGLE):
+        raise ValueError("Unsupported data format: 0x%02x" % dataFormat)
+    if colorFormat not in PACK_TABLES:
+        raise ValueError("Unsupported color format: 0x%02x" % colorFormat)
+    if len(rgba) < width * height * 4:
+        raise ValueError("Image data is too short")
+    checkSize(width, height, dataFormat == TWIDDLED_MM)
+
+    rgba = bytes(memoryview(rgba).cast('B')[:width * height * 4])
+
+    if dataFormat == TWIDDLED_MM:
+        #Smallest level first, after a two byte pad
+        levels = mipmapChain(rgba, width)
+        data = bytearray(PvrTexture.WORD_SIZE)
+        size = 1
+        for level in reversed(levels):
+            data += encodeLevel(level, size, size, colorFormat, dataFormat, flipY)
+            size <<= 1
+    else:
+        data = encodeLevel(rgba, width, height, colorFormat, dataFormat, flipY)
+
+    out = bytearray()
+    if gbix is not None:
+        out += gbixHeader(gbix)
+    out += pvrHeader(colorFormat, dataFormat, width, height, len(data))
+    out += data
+    return bytes(out)
+
+def readImage(filepath):
+    #Width, height and top-first RGBA bytes of a png
+    width, height, rows, info = png.Reader(filename = filepath).asRGBA8()
+    data = bytearray()
+    for row in rows:
+        data += bytes(row)
+    return (width, height, data)
+
+def encodeImage(filepath, colorFormat = ARGB_1555, dataFormat = TWIDDLED, flipY = True,
+                gbix = None):
+    width, height, data = readImage(filepath)
+    return encodeTexture(data, width, height, colorFormat, dataFormat, flipY, gbix)
+
+# Call main function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage = "python pvrencode.py <image.png> <texture.pvr>")
+    parser.add_argument("image")
+    parser.add_argument("texture")
+    parser.add_argument("--color", default = "1555", choices = sorted(COLOR_NAMES))
+    parser.add_argument("--format", default = "twiddled", choices = sorted(FORMAT_NAMES))
+    parser.add_argument("--gbix", type = int, default = None,
+                        help = "global index, written as a GBIX header")
+    parser.add_argument("--no-flip", action = "store_true",
+                        help = "store rows top first")
+    args = parser.parse_args()
+
+    try:
+        data = encodeImage(args.image, COLOR_NAMES[args.color], FORMAT_NAMES[args.format],
+                           not args.no_flip, args.gbix)
+    except ValueError as err:
+        print(err)
+        sys.exit(1)
+
+    with open(args.texture, 'wb') as f:
+        f.write(data)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,306 @@
+#==============================================================
+"""
+
+Texture Repacker
+Replaces textures inside .pvm and .mt5 files. Only the replaced
+PVRT chunks and the header fields that describe them are written;
+every other byte is copied from the source file to the new one
+by the kernel, with copy_file_range or sendfile where available.
+
+    python repack.py <in.pvm> <out.pvm> -r <name or index> <texture.pvr> ...
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import sys
+import struct
+import argparse
+import tempfile
+
+#Import User Libraries
+from pvmarchive import *
+import formats
+
+PVMH = b'PVMH'
+HRCM = b'HRCM'
+
+#Chunk tag and length before every GBIX and PVRT body
+CHUNK_HEADER = 0x08
+
+#TEXN chunk holding each texture of a model: tag, chunk length and
+#an 8 byte texture id, then the GBIX and PVRT chunks
+TEXN = b'TEXN'
+TEXN_HEADER = 0x10
+
+#Replaced chunks grow or shrink by a multiple of this, so every
+#chunk after them keeps its alignment
+ALIGNMENT = 32
+
+#Largest span handed to the kernel in one call
+COPY_BLOCK = 64 * 1024 * 1024
+
+def copyRange(src, dst, offset, length):
+    #Copy length bytes at offset in src to the position of dst,
+    #trying copy_file_range, then sendfile, then plain reads
+    while length > 0:
+        count = min(length, COPY_BLOCK)
+        done = 0
+        for method in list(COPY_METHODS):
+            try:
+                done = method(src, dst, offset, count)
+                break
+            except OSError:
+                if method is readWrite:
+                    raise
+                COPY_METHODS.remove(method)
+
+        #The source ended early
+        if done == 0:
+            raise ValueError("Source file ended at 0x%x" % offset)
+        offset += done
+        length -= done
+
+def copyFileRange(src, dst, offset, count):
+    return os.copy_file_range(src, dst, count, offset)
+
+def sendFile(src, dst, offset, count):
+    return os.sendfile(dst, src, offset, count)
+
+def readWrite(src, dst, offset, count):
+    data = os.pread(src, min(count, 1024 * 1024), offset)
+    os.write(dst, data)
+    return len(data)
+
+COPY_METHODS = [ readWrite ]
+if hasattr(os, 'sendfile'):
+    COPY_METHODS.insert(0, sendFile)
+if hasattr(os, 'copy_file_range'):
+    COPY_METHODS.insert(0, copyFileRange)
+
+def dimensionCode(width, height):
+    #PVM dimension field: log2 of each size less two, the width in
+    #the low nibble and the height in the next
+    code = (width.bit_length() - 3) & 0x0F
+    code |= ((height.bit_length() - 3) & 0x0F) << 4
+    return struct.pack('<H', code)
+
+def readReplacement(buf):
+    #PVRT chunk body and global index of a texture file
+    view = memoryview(buf).cast('B')
+    tex = textureView(view)
+    pvr = openTexture(tex)
+    length = CHUNK_HEADER + pvr.getDataLength()
+
+    index = None
+    if bytes(view[0:4]) == GBIX and len(view) - len(tex) >= 0x0C:
+        index = struct.unpack_from('<I', view, 0x08)[0]
+    return (bytes(tex[:length]), index)
+
+#==============================================================
+"""
+Repacker Class
+Reads the texture index of a file once. replace() queues new
+textures and write() streams the file to its new location,
+copying the spans between the edits straight across. Entries
+are addressed by name or by their position in the file.
+"""
+#==============================================================
+
+class Repacker:
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.name = os.path.basename(filepath)
+        self.map = formats.mapFile(filepath)
+        self.view = memoryview(self.map)
+        self.magic = bytes(self.view[0:4])
+        self.size = len(self.view)
+
+        if self.magic not in (PVMH, HRCM):
+            raise ValueError("Not a pvm or mt5 file: %s" % self.name)
+
+        #A header that runs past the end of the file is bad input
+        #like any other
+        try:
+            if self.magic == PVMH:
+                self.entries = PvmArchive(self.view).readTextureEntries()
+                self.headerFields = self.readPvmFields()
+            else:
+                self.entries = ShenmueModel(self.view, self.name).readTextureEntries()
+                self.headerFields = []
+        except struct.error as err:
+            raise ValueError("Truncated file %s: %s" % (self.name, err))
+
+        self.replaced = {}
+
+    def close(self):
+        self.view.release()
+        if hasattr(self.map, 'close'):
+            self.map.close()
+
+    def readPvmFields(self):
+        #Offsets of the format, dimension and global index field of
+        #each entry
+        flags, count = struct.unpack_from('<HH', self.view, 0x08)
+        ofs = 0x0C
+        fields = []
+        for i in range(count):
+            ofs += 2
+            if flags & BIT_3:
+                ofs += 0x1C
+            entry = { 'format' : None, 'size' : None, 'index' : None }
+            if flags & BIT_2:
+                entry['format'] = ofs
+                ofs += 2
+            if flags & BIT_1:
+                entry['size'] = ofs
+                ofs += 2
+            if flags & BIT_0:
+                entry['index'] = ofs
+                ofs += 4
+            fields.append(entry)
+        return fields
+
+    def findEntry(self, key):
+        #Entry number from a name or a position
+        for i, entry in enumerate(self.entries):
+            if entry['name'] == key:
+                return i
+        try:
+            i = int(key)
+        except (TypeError, ValueError):
+            raise KeyError(key)
+        if not 0 <= i < len(self.entries):
+            raise KeyError(key)
+        return i
+
+    def replace(self, key, buf):
+        self.replaced[self.findEntry(key)] = readReplacement(buf)
+
+    def readEdits(self):
+        #Sorted (offset, old length, new bytes) for every change
+        edits = []
+        growth = 0
+
+        for i, (body, index) in sorted(self.replaced.items()):
+            entry = self.entries[i]
+            start = entry['offset'] - CHUNK_HEADER
+            oldLength = entry['length']
+
+            #Pad so the size changes by a multiple of the alignment
+            pad = -(len(body) - oldLength) % ALIGNMENT
+            body += bytes(pad)
+            chunk = PVRT + struct.pack('<I', len(body)) + body
+            edits.append((start, CHUNK_HEADER + oldLength, chunk))
+            growth += len(body) - oldLength
+
+            #Global index in a GBIX chunk just before the texture
+            gbix = start - CHUNK_HEADER - 8
+            hasGbix = gbix >= 0 and bytes(self.view[gbix:gbix + 4]) == GBIX
+            if index is not None and hasGbix:
+                edits.append((gbix + CHUNK_HEADER, 4, struct.pack('<I', index)))
+
+            #Length of the TEXN chunk around the texture in a model
+            texn = (gbix if hasGbix else start) - TEXN_HEADER
+            if texn >= 0 and bytes(self.view[texn:texn + 4]) == TEXN:
+                texnLen = struct.unpack_from('<I', self.view, texn + 0x04)[0]
+                edits.append((texn + 0x04, 4,
+                              struct.pack('<I', texnLen + len(body) - oldLength)))
+
+            if i < len(self.headerFields):
+                fields = self.headerFields[i]
+                if fields['format'] is not None:
+                    edits.append((fields['format'], 2, body[0:2]))
+                if fields['size'] is not None:
+                    width, height = struct.unpack_from('<HH', body, 0x04)
+                    edits.append((fields['size'], 2, dimensionCode(width, height)))
+                if fields['index'] is not None and index is not None:
+                    edits.append((fields['index'], 4, struct.pack('<I', index)))
+
+        #The TEXD chunk of a model holds every texture
+        if self.magic == HRCM and growth:
+            texOfs = struct.unpack_from('<I', self.view, 0x04)[0]
+            texLen = struct.unpack_from('<I', self.view, texOfs + 0x04)[0]
+            edits.append((texOfs + 0x04, 4, struct.pack('<I', texLen + growth)))
+
+        edits.sort(key = lambda e: e[0])
+        return edits
+
+    def write(self, outpath):
+        #Stream into a temporary file beside the output, so the
+        #source can also be the destination
+        edits = self.readEdits()
+        folder = os.path.dirname(os.path.abspath(outpath))
+        fd, temp = tempfile.mkstemp(dir = folder, suffix = ".tmp")
+
+        try:
+            with open(self.filepath, 'rb') as src:
+                pos = 0
+                for offset, length, data in edits:
+                    copyRange(src.fileno(), fd, pos, offset - pos)
+                    os.write(fd, data)
+                    pos = offset + length
+                copyRange(src.fileno(), fd, pos, self.size - pos)
+            os.close(fd)
+            fd = None
+            self.close()
+            os.replace(temp, outpath)
+        finally:
+            if fd is not None:
+                os.close(fd)
+            if os.path.exists(temp):
+                os.remove(temp)
+
+        return len(edits)
+
+def repackFile(filepath, outpath, replacements):
+    #replacements maps entry names or positions to texture files
+    repacker = Repacker(filepath)
+    try:
+        for key, texture in replacements:
+            with open(texture, 'rb') as f:
+                repacker.replace(key, f.read())
+        return repacker.write(outpath)
+    finally:
+        repacker.close()
+
+# Call main function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage = "python repack.py <in.pvm> <out.pvm> -r <name or index> <texture.pvr>")
+    parser.add_argument("source")
+    parser.add_argument("output")
+    parser.add_argument("-r", "--replace", nargs = 2, action = "append", default = [],
+                        metavar = ("ENTRY", "TEXTURE"))
+    args = parser.parse_args()
+
+    try:
+        repackFile(args.source, args.output, args.replace)
+    except (KeyError, ValueError) as err:
+        print("Repack error: %s" % err)
+        sys.exit(1)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
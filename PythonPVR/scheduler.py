@@ -0,0 +1,271 @@
+#==============================================================
+"""
+
+Job Scheduler
+Estimates the cost of exporting each file from its headers and
+orders the work longest first, so large models do not end up
+running alone at the end of a batch
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import struct
+
+#Import User Libraries
+from bitstream import BudgetExceeded
+from pvmarchive import *
+from pipeline import openArchive
+from seqio import localityKey, localityOrder
+
+#Relative cost per pixel of each texture layout
+COST_TWIDDLED  = 1.0
+COST_RECTANGLE = 0.8
+COST_VQ        = 0.6
+
+#Relative cost of each vertex and strip index in a model
+COST_VERTEX    = 0.5
+COST_INDEX     = 0.2
+
+#Approximate memory used by one decode process
+WORKER_BASE    = 48 * 1024 * 1024
+BYTES_PER_PIXEL = 64
+
+def availableMemory():
+    #Free physical memory in bytes, or None when it cannot be read
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        pages = os.sysconf('SC_AVPHYS_PAGES')
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def readTextureHeader(bs, offset):
+    #Data format, width and height of the pvr texture at offset
+    bs.bs.seek(offset)
+    header = bs.readBytes(0x08)
+    if len(header) < 0x08:
+        return None
+    colorFormat, dataFormat, pad, width, height = struct.unpack('<BBHHH', header)
+    return (dataFormat, width, height)
+
+def textureCost(header):
+    #Cost of decoding one texture from its header
+    if header is None:
+        return 0.0
+
+    dataFormat, width, height = header
+    pixels = width * height
+
+    if dataFormat in PvrTexture.VECTOR_LIST:
+        return pixels * COST_VQ
+    elif dataFormat == PvrTexture.RECTANGLE:
+        return pixels * COST_RECTANGLE
+
+    return pixels * COST_TWIDDLED
+
+def modelGeometry(bs, mdlOfs):
+    #Count vertices and strip indices of an mt5 node tree
+    nbVertex = 0
+    nbIndex = 0
+    visited = set()
+    stack = [mdlOfs]
+
+    while stack:
+        ofs = stack.pop()
+        if not ofs or ofs in visited or ofs + 0x34 > bs.length:
+            continue
+        visited.add(ofs)
+        bs.budget.spend('chunks')
+
+        bs.bs.seek(ofs + 0x04)
+        model = bs.readUInt()
+        bs.bs.seek(ofs + 0x2C)
+        child = bs.readUInt()
+        sibling = bs.readUInt()
+        stack.append(child)
+        stack.append(sibling)
+
+        if not model or model + 0x10 > bs.length:
+            continue
+
+        bs.bs.seek(model + 0x04)
+        vertexOfs = bs.readUInt()
+        count = bs.readUInt()
+        polygonOfs = bs.readUInt()
+
+        if vertexOfs:
+            nbVertex += count
+        if polygonOfs:
+            nbIndex += countStripIndices(bs, polygonOfs)
+
+    return (nbVertex, nbIndex)
+
+def countStripIndices(bs, ofs):
+    #Walk the strip headers of a polygon list, skipping index data
+    STRIP_ENTRY = { 0x11 : 6, 0x13 : 2, 0x1c : 10 }
+
+    total = 0
+    polygonStart = False
+    bs.bs.seek(ofs)
+
+    while bs.tell() < bs.length - 4:
+        bs.budget.spend('chunks')
+        head = bs.readUShort()
+        flag = bs.readUShort()
+
+        if head == 0x8000 and flag == 0xFFFF:
+            break
+        elif flag == 0x0010 and head in (0x0002, 0x0003):
+            polygonStart = True
+        elif polygonStart and head in STRIP_ENTRY:
+            polygonStart = False
+            nbStrips = bs.readUShort()
+            for i in range(nbStrips):
+                if bs.tell() >= bs.length - 2:
+                    break
+                stripLen = abs(bs.readShort())
+                bs.budget.spend('strips', stripLen)
+                total += stripLen
+                bs.seek_cur(stripLen * STRIP_ENTRY[head])
+
+            if bs.tell() % 4 == 2:
+                bs.seek_cur(0x02)
+
+    return total
+
+#==============================================================
+"""
+Scheduler Class
+Builds a list of jobs, one per file or per group of textures
+when a file is large enough to hold up the end of a run. Jobs
+are sorted from most to least expensive.
+"""
+#==============================================================
+
+class Scheduler:
+
+    def __init__(self, workers = None, splitFactor = 1.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.splitFactor = splitFactor
+        self.largestTexture = 0
+
+    def estimate(self, filepath):
+        #Return a job with the cost of every texture in the file
+        archive = openArchive(filepath)
+        if archive is None:
+            return None
+
+        bs = archive.bs
+        try:
+            entries = archive.readTextureEntries()
+            for entry in entries:
+                header = readTextureHeader(bs, entry['offset'])
+                entry['cost'] = textureCost(header)
+                if header is not None:
+                    self.largestTexture = max(self.largestTexture, header[1] * header[2])
+
+            #Models are also charged for the geometry the reader walks
+            geometry = 0.0
+            if isinstance(archive, ShenmueModel):
+                bs.seek_set(0x08)
+                nbVertex, nbIndex = modelGeometry(bs, bs.readUInt())
+                geometry = nbVertex * COST_VERTEX + nbIndex * COST_INDEX
+        finally:
+            bs.close()
+
+        entries.sort(key = lambda entry: entry['cost'], reverse = True)
+        cost = geometry + sum(entry['cost'] for entry in entries)
+
+        return { 'path' : filepath, 'entries' : entries, 'cost' : cost }
+
+    def split(self, job, limit):
+        #Break a job into groups of textures no larger than limit
+        if job['cost'] <= limit or len(job['entries']) < 2:
+            return [job]
+
+        jobs = []
+        group = []
+        groupCost = 0.0
+
+        for entry in job['entries']:
+            if group and groupCost + entry['cost'] > limit:
+                jobs.append({ 'path' : job['path'], 'entries' : group, 'cost' : groupCost })
+                group = []
+                groupCost = 0.0
+            group.append(entry)
+            groupCost += entry['cost']
+
+        if group:
+            jobs.append({ 'path' : job['path'], 'entries' : group, 'cost' : groupCost })
+
+        return jobs
+
+    def schedule(self, filepaths, locality = False):
+        #Estimate every file, split the large ones, longest job first.
+        #Headers are read in disk order; with locality the jobs also
+        #run in that order, keeping groups of one file together.
+        jobs = []
+        for filepath in localityOrder(filepaths):
+            try:
+                job = self.estimate(filepath)
+            except BudgetExceeded as err:
+                print("Skipping %s: %s" % (filepath, err))
+                continue
+            if job is None:
+                print("Unknown file extension: %s" % filepath)
+                continue
+            jobs.append(job)
+
+        #A fair share of the run for each worker
+        total = sum(job['cost'] for job in jobs)
+        limit = max(1.0, total / self.workers * self.splitFactor)
+
+        result = []
+        for job in jobs:
+            result.extend(self.split(job, limit))
+
+        result.sort(key = lambda job: job['cost'], reverse = True)
+        if locality:
+            result.sort(key = lambda job: localityKey(job['path']))
+        return result
+
+    def workerCount(self):
+        #Limit decode processes to what fits in available memory
+        memory = availableMemory()
+        if memory is None:
+            return self.workers
+
+        perWorker = WORKER_BASE + self.largestTexture * BYTES_PER_PIXEL
+        return max(1, min(self.workers, int(memory // perWorker)))
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,168 @@
+#==============================================================
+"""
+
+Sequential Input
+Reads input files in large sequential chunks instead of many
+small reads between seeks, with posix_fadvise hints where the
+platform has them. A Prefetcher reads the next few files of a
+run into the page cache while the current one is decoded, and
+localityOrder() sorts a batch so files close together on disk
+are read one after another.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import threading
+
+#Size of each sequential read
+READ_CHUNK = 1024 * 1024
+
+#Files up to this size are read into memory whole, larger ones
+#are read through a buffer of READ_CHUNK bytes
+READ_LIMIT = 64 * 1024 * 1024
+
+#Files up to this size are read ahead in full by the Prefetcher,
+#larger ones only get a hint
+PREFETCH_LIMIT = 256 * 1024 * 1024
+
+def advise(fd, *hints):
+    #posix_fadvise for the whole file, ignored where unsupported
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for hint in hints:
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, hint))
+        except (OSError, AttributeError):
+            pass
+
+def readInput(filepath):
+    #Whole file in one pass of large reads, or None when too large
+    with open(filepath, 'rb', buffering = 0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > READ_LIMIT:
+            return None
+        advise(f.fileno(), 'POSIX_FADV_SEQUENTIAL')
+
+        data = bytearray(size)
+        view = memoryview(data)
+        pos = 0
+        while pos < size:
+            count = f.readinto(view[pos : pos + READ_CHUNK])
+            if not count:
+                break
+            pos += count
+
+    #The file shrank while it was read
+    if pos < size:
+        del data[pos:]
+    return data
+
+def openInput(filepath):
+    #Buffered file for inputs too large to read whole
+    f = open(filepath, 'rb', buffering = READ_CHUNK)
+    advise(f.fileno(), 'POSIX_FADV_SEQUENTIAL')
+    return f
+
+def localityKey(filepath):
+    #Device, folder and inode number. File systems allocate the
+    #files of one folder close together, roughly in inode order.
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return (0, os.path.dirname(os.path.abspath(filepath)), 0)
+    return (st.st_dev, os.path.dirname(os.path.abspath(filepath)), st.st_ino)
+
+def localityOrder(filepaths):
+    return sorted(filepaths, key = localityKey)
+
+def warmFile(filepath, buf):
+    #Pull a file into the page cache, reading into a reused buffer
+    try:
+        with open(filepath, 'rb', buffering = 0) as f:
+            size = os.fstat(f.fileno()).st_size
+            advise(f.fileno(), 'POSIX_FADV_SEQUENTIAL', 'POSIX_FADV_WILLNEED')
+            if size > PREFETCH_LIMIT:
+                return 0
+            total = 0
+            count = f.readinto(buf)
+            while count:
+                total += count
+                count = f.readinto(buf)
+            return total
+    except OSError:
+        return 0
+
+#==============================================================
+"""
+Prefetcher Class
+A background thread that stays up to depth files ahead of the
+files the readers have reached. Readers call reached() as they
+open each file; paths not in the run are ignored.
+"""
+#==============================================================
+
+class Prefetcher:
+
+    def __init__(self, filepaths, depth = 2):
+        self.paths = list(dict.fromkeys(filepaths))
+        self.index = { path : i for i, path in enumerate(self.paths) }
+        self.depth = depth
+        self.position = -1
+        self.stopped = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def reached(self, filepath):
+        with self.cond:
+            i = self.index.get(filepath)
+            if i is not None and i > self.position:
+                self.position = i
+                self.cond.notify_all()
+
+    def run(self):
+        buf = bytearray(READ_CHUNK)
+        for i, path in enumerate(self.paths):
+            with self.cond:
+                while not self.stopped and i > self.position + self.depth:
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                #The readers got here first
+                if i <= self.position:
+                    continue
+            warmFile(path, buf)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,117 @@
+#==============================================================
+"""
+
+Shared Memory Slab Pool
+Reusable shared memory segments that decode processes write
+RGBA bitmaps into, so the parent receives a view instead of a
+pickled copy of every image
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import queue
+import threading
+from multiprocessing import shared_memory
+
+#Largest dreamcast texture is 1024x1024 RGBA
+SLAB_SIZE = 1024 * 1024 * 4
+
+#Segments attached inside a worker process, kept open between jobs
+ATTACHED = {}
+
+def attachSlab(name):
+    #Attach to a segment created by the parent, once per process
+    if name not in ATTACHED:
+        ATTACHED[name] = shared_memory.SharedMemory(name = name)
+    return ATTACHED[name]
+
+def iterRows(view, stride, height):
+    #Yield each row as a view into the slab, released after use
+    for y in range(height):
+        row = view[y * stride : (y + 1) * stride]
+        yield row
+        row.release()
+
+#==============================================================
+"""
+SlabPool Class
+Fixed number of equally sized segments. acquire() blocks when
+every slab is in use, which bounds the decoded bitmaps in flight.
+Every segment is unlinked by close(), so long batch runs do not
+leave segments behind in /dev/shm.
+"""
+#==============================================================
+
+class SlabPool:
+
+    def __init__(self, count, slabSize = SLAB_SIZE):
+        self.slabSize = slabSize
+        self.slabs = {}
+        self.free = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        try:
+            for i in range(count):
+                shm = shared_memory.SharedMemory(create = True, size = slabSize)
+                self.slabs[shm.name] = shm
+                self.free.put(shm.name)
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+    def fits(self, nbytes):
+        return nbytes <= self.slabSize
+
+    def acquire(self):
+        #Name of a free slab, waiting for one to be released if needed
+        return self.free.get()
+
+    def release(self, name):
+        self.free.put(name)
+
+    def view(self, name, nbytes):
+        #Zero-copy view over the first nbytes of a slab
+        return self.slabs[name].buf[:nbytes]
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        for shm in self.slabs.values():
+            shm.close()
+            shm.unlink()
+        self.slabs = {}
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
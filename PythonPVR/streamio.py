@@ -0,0 +1,206 @@
+#==============================================================
+"""
+
+Stream Mode
+Reads pvr textures, or any file holding them, from stdin and
+writes the converted images to stdout, so blobs extracted by
+other tools never need a temporary file
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import sys
+import struct
+
+#Import User Libraries
+from pvmarchive import *
+import formats
+import afsarchive
+import pakarchive
+
+#Magic numbers of a single texture
+MAGIC_LIST = [ b'GBIX', b'PVRT' ]
+
+#Name given to a texture read on its own
+STREAM_NAME = "texture"
+
+#Frame layout: name length, name, width, height, payload length
+FRAME_NAME = struct.Struct('<I')
+FRAME_HEAD = struct.Struct('<III')
+
+def readExact(f, length):
+    #Read length bytes, or None at the end of the stream
+    data = bytearray()
+    while len(data) < length:
+        chunk = f.read(length - len(data))
+        if not chunk:
+            break
+        data += chunk
+
+    if len(data) < length:
+        return None
+    return bytes(data)
+
+def readFrames(f):
+    #Yield each length prefixed input blob until the end of stdin
+    while True:
+        head = readExact(f, FRAME_NAME.size)
+        if head is None:
+            return
+
+        data = readExact(f, FRAME_NAME.unpack(head)[0])
+        if data is None:
+            raise ValueError("Input frame is truncated")
+        yield data
+
+def writeFrame(f, name, width, height, payload):
+    name = name.encode('utf-8')
+    f.write(FRAME_NAME.pack(len(name)))
+    f.write(name)
+    f.write(FRAME_HEAD.pack(width, height, len(payload)))
+    f.write(payload)
+
+def readTextureFrames(f):
+    #Yield (name, width, height, payload) up to the end frame of one
+    #input, the reverse of writeFrame
+    while True:
+        head = readExact(f, FRAME_NAME.size)
+        if head is None:
+            raise ValueError("Output frame is truncated")
+        name = readExact(f, FRAME_NAME.unpack(head)[0])
+        head = readExact(f, FRAME_HEAD.size)
+        if name is None or head is None:
+            raise ValueError("Output frame is truncated")
+
+        width, height, length = FRAME_HEAD.unpack(head)
+        payload = readExact(f, length)
+        if payload is None:
+            raise ValueError("Output frame is truncated")
+        if not name and not width and not height and not length:
+            return
+        yield (name.decode('utf-8'), width, height, payload)
+
+def writeEnd(f):
+    #An empty frame closes the textures of one input
+    writeFrame(f, "", 0, 0, b'')
+    f.flush()
+
+def splitTextures(data):
+    #Return (name, texture view) for every texture in the blob
+    magic = bytes(data[0:4])
+
+    if magic in MAGIC_LIST:
+        return [ (STREAM_NAME, textureView(data)) ]
+    elif magic not in formats.MAGIC_LIST:
+        raise ValueError("Unknown input format")
+
+    view = memoryview(data)
+    textures = []
+    for entry in formats.sliceTextures(STREAM_NAME, view):
+        end = entry['offset'] + entry['length']
+        textures.append((entry['name'], view[entry['offset']:end]))
+
+    return textures
+
+def encodeTexture(view, encoder, raw = False):
+    #Returns (width, height, payload) or None when unsupported
+    pvr = openTexture(view, False, True)
+    if not pvr.isSupported():
+        return None
+
+    if raw:
+        #Flat bytes, so the frame length counts bytes and not rows
+        payload = decode(view).cast('B')
+    elif hasattr(encoder, 'encodeTexture'):
+        payload = encoder.encodeTexture(pvr)
+    else:
+        payload = encoder.encode(pvr.width, pvr.height, pvr.iterRows())
+
+    return (pvr.width, pvr.height, payload)
+
+def convert(data, out, encoder, raw = False, framed = False):
+    #A single texture is written bare unless framing is requested
+    textures = splitTextures(data)
+    single = len(textures) == 1 and textures[0][0] == STREAM_NAME
+
+    count = 0
+    for name, view in textures:
+        try:
+            result = encodeTexture(view, encoder, raw)
+        except ValueError as err:
+            #A truncated texture is skipped like an unsupported one
+            print("Skipping texture %s: %s" % (name, err), file = sys.stderr)
+            continue
+        if result is None:
+            print("Skipping unsupported texture: %s" % name, file = sys.stderr)
+            continue
+
+        width, height, payload = result
+        if single and not framed:
+            out.write(payload)
+        else:
+            writeFrame(out, name, width, height, payload)
+        count += 1
+
+    return count
+
+#==============================================================
+"""
+Stream Functions
+run() converts one input read until the end of stdin. With
+frames, stdin carries any number of inputs, each prefixed with
+its length, and every input is answered with its texture frames
+and an empty end frame. The process stays open between inputs,
+so one filter serves a whole ingestion run.
+"""
+#==============================================================
+
+def run(encoder, raw = False, frames = False, stdin = None, stdout = None):
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+
+    if not frames:
+        data = stdin.read()
+        try:
+            count = convert(data, stdout, encoder, raw)
+        except ValueError as err:
+            print("Stream error: %s" % err, file = sys.stderr)
+            return 1
+        stdout.flush()
+        return 0 if count else 1
+
+    errors = 0
+    for data in readFrames(stdin):
+        #A bad input is reported and answered with an empty result
+        try:
+            convert(data, stdout, encoder, raw, True)
+        except ValueError as err:
+            print("Stream error: %s" % err, file = sys.stderr)
+            errors += 1
+        writeEnd(stdout)
+
+    return 1 if errors else 0
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,138 @@
+#==============================================================
+"""
+
+Budget Corpus
+Writes the inputs test_budget.py runs the parsers on: mutations
+of the seed files in corpus/, and hostile files built to exhaust
+one budget each. The .mt5 files, with node trees of their own, are
+also walked by the Noesis importer in Noesis/tests. The output is
+the same on every run.
+
+    python makecorpus.py
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+#==============================================================
+
+import os
+import struct
+import random
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+SEEDS = [ "seed.pvm", "seed.mt5", "seed.pkf", "seed.pks", "seed.afs" ]
+
+#Tags written over random words, so mutations reach the readers
+#of other formats and nest containers in odd places
+TAGS = [ b'AFS\0', b'PVMH', b'HRCM', b'PAKF', b'IPAC', b'TEXN', b'PVRT', b'GBIX' ]
+
+#Mutated files made from each seed
+MUTATIONS = 8
+
+def mutate(data, rand):
+    data = bytearray(data)
+    for i in range(rand.randrange(1, 20)):
+        k = rand.randrange(len(data))
+        data[k] = rand.choice([ 0x00, 0xFF, rand.randrange(256) ])
+    if rand.random() < 0.5:
+        k = rand.randrange(len(data) - 4) & ~3
+        data[k:k + 4] = rand.choice(TAGS)
+    return bytes(data)
+
+def selfNesting(count = 64):
+    #Every entry of the archive is the archive itself
+    table = struct.pack('<II', 0, 8 + 8 * count) * count
+    return b'AFS\0' + struct.pack('<I', count) + table
+
+def deepNesting(levels = 12):
+    #Each archive holds the next, one level deeper than allowed
+    data = open(os.path.join(CORPUS, "seed.pvm"), 'rb').read()
+    for i in range(levels):
+        body = data + bytes(-len(data) % 0x800)
+        data = b'AFS\0' + struct.pack('<III', 1, 0x800, len(data))
+        data += bytes(0x800 - len(data)) + body
+    return data
+
+def longScan(size = 512 * 1024):
+    #One texture promised, then only zeros to search through
+    return b'PVMH' + struct.pack('<IHHH', 8, 0, 1, 0) + bytes(size)
+
+def tagStorm(count = 4096):
+    #TEXN tags one after another, none of them a real chunk
+    return b'PAKF' + struct.pack('<I', 0) + b'TEXN' * count
+
+def nodeChain(count, link):
+    #Model with count nodes and no meshes, each node linked to the next
+    #as its child (0x2C) or its sibling (0x30), and an empty TEXD
+    nodes = bytearray()
+    for i in range(count):
+        node = bytearray(0x40)
+        struct.pack_into('<3f', node, 0x14, 1.0, 1.0, 1.0)
+        if i + 1 < count:
+            struct.pack_into('<I', node, link, 0x0C + (i + 1) * 0x40)
+        nodes += node
+    texOfs = 0x0C + len(nodes)
+    return b'HRCM' + struct.pack('<II', texOfs, 0x0C) + nodes + b'TEXD' + struct.pack('<II', 0x0C, 0)
+
+def nodeLoop():
+    #One node that is its own sibling
+    data = bytearray(nodeChain(1, 0x30))
+    struct.pack_into('<I', data, 0x0C + 0x30, 0x0C)
+    return bytes(data)
+
+def main():
+    rand = random.Random(44)
+    for seed in SEEDS:
+        with open(os.path.join(CORPUS, seed), 'rb') as f:
+            data = f.read()
+        name, ext = os.path.splitext(seed)
+        for i in range(MUTATIONS):
+            with open(os.path.join(CORPUS, "mutated_%s_%02d%s" % (ext[1:], i, ext)), 'wb') as f:
+                f.write(mutate(data, rand))
+
+    hostile = {
+        "nesting_self.afs" : selfNesting(),
+        "nesting_deep.afs" : deepNesting(),
+        "scan_zeros.pvm"   : longScan(),
+        "chunks_storm.pkf" : tagStorm()
+    }
+    for name, data in hostile.items():
+        with open(os.path.join(CORPUS, name), 'wb') as f:
+            f.write(data)
+
+    #Node trees for the model importers. A long row of siblings is a
+    #valid map model, deep nesting and a loop are not.
+    nodes = {
+        "nodes_siblings.mt5" : nodeChain(2048, 0x30),
+        "nodes_deep.mt5"     : nodeChain(600, 0x2C),
+        "nodes_loop.mt5"     : nodeLoop()
+    }
+    for name, data in nodes.items():
+        with open(os.path.join(CORPUS, name), 'wb') as f:
+            f.write(data)
+
+# Call main function
+if __name__ == "__main__":
+    main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,98 @@
+#==============================================================
+"""
+
+Budget Tests
+Runs the texture readers over the files in corpus/. Every file
+must finish within its budget or stop with BudgetExceeded, and
+the hostile files must exhaust the budget they were built for.
+makecorpus.py writes the mutated and hostile files.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+#==============================================================
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Import User Libraries
+from bitstream import Budget, BudgetExceeded
+import formats
+import afsarchive
+import pakarchive
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+#Budget each hostile file must exhaust, and the limits it is read
+#with so the test stays quick
+HOSTILE = {
+    "nesting_self.afs" : ('nesting', {}),
+    "nesting_deep.afs" : ('nesting', {}),
+    "scan_zeros.pvm"   : ('scan', { 'scan' : 64 * 1024 }),
+    "chunks_storm.pkf" : ('chunks', { 'chunks' : 1024 })
+}
+
+#Seconds any one file may take, far more than a budget allows
+TIME_LIMIT = 5.0
+
+def readCorpus(name, budget):
+    with open(os.path.join(CORPUS, name), 'rb') as f:
+        data = f.read()
+    return formats.sliceTextures(name, memoryview(data), budget = budget)
+
+class BudgetTest(unittest.TestCase):
+
+    def test_corpus_within_budget(self):
+        names = sorted(n for n in os.listdir(CORPUS) if n not in HOSTILE)
+        self.assertTrue(names)
+        for name in names:
+            budget = Budget()
+            start = time.perf_counter()
+            try:
+                entries = readCorpus(name, budget)
+            except BudgetExceeded:
+                entries = None
+            self.assertLess(time.perf_counter() - start, TIME_LIMIT, name)
+
+            #A file that finished stayed within every limit
+            if entries is not None:
+                for key, used in budget.used.items():
+                    self.assertLessEqual(used, budget.limits[key], name)
+            if name.startswith("seed"):
+                self.assertTrue(entries, name)
+
+    def test_hostile_files_exceed_budget(self):
+        for name, (expected, limits) in sorted(HOSTILE.items()):
+            start = time.perf_counter()
+            with self.assertRaises(BudgetExceeded, msg = name) as caught:
+                readCorpus(name, Budget(**limits))
+            self.assertEqual(caught.exception.name, expected, name)
+            self.assertLess(time.perf_counter() - start, TIME_LIMIT, name)
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,191 @@
+#==============================================================
+"""
+
+Png Encoder Tests
+Every png backend must write the pixels it was given. The parallel
+encoder must also compress rows as they arrive rather than after
+the whole image has been read, and the optimizing encoder must keep
+every pixel whichever color type it picks.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import png
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Import User Libraries
+import pngencode
+
+def noisyImage(width, height, seed):
+    #Smooth runs with some noise, so blocks compress unevenly
+    rand = random.Random(seed)
+    rows = []
+    for y in range(height):
+        row = bytearray()
+        for x in range(width):
+            row += bytes(((x + y) & 0xFF, (x * 3) & 0xFF, rand.randrange(4) * 60, 255 - y % 7))
+        rows.append(bytes(row))
+    return rows
+
+def readPixels(data):
+    #RGBA rows of any png, with palettes and color keys expanded
+    width, height, rows, info = png.Reader(bytes = data).asRGBA8()
+    return width, height, [ bytes(row) for row in rows ]
+
+class CountingRows:
+
+    #Rows handed out one at a time, counting how many were taken
+    def __init__(self, rows):
+        self.rows = rows
+        self.taken = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.taken += 1
+            yield row
+
+class ChunkLog(io.BytesIO):
+
+    #Rows taken when each IDAT chunk started to be written
+    def __init__(self, rows):
+        io.BytesIO.__init__(self)
+        self.source = rows
+        self.idat = []
+
+    def write(self, data):
+        if data == b'IDAT':
+            self.idat.append(self.source.taken)
+        return io.BytesIO.write(self, data)
+
+class ParallelPngTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        rows = noisyImage(96, 200, 30)
+        for name in sorted(pngencode.FILTER_LIST):
+            for fullFlush in (False, True):
+                encoder = pngencode.ParallelPngEncoder(filter = name, threads = 3,
+                                                       blockSize = 32768, fullFlush = fullFlush)
+                try:
+                    data = encoder.encode(96, 200, iter(rows))
+                finally:
+                    encoder.close()
+                self.assertEqual(readPixels(data), (96, 200, rows), name)
+
+    def test_small_image(self):
+        #One block, shorter than the window
+        rows = noisyImage(3, 2, 31)
+        encoder = pngencode.ParallelPngEncoder()
+        try:
+            self.assertEqual(readPixels(encoder.encode(3, 2, rows)), (3, 2, rows))
+        finally:
+            encoder.close()
+
+    def test_rows_streamed(self):
+        #256 rows of 1k, so 8 blocks of 32k with one thread and at
+        #most two blocks in flight
+        rows = CountingRows(noisyImage(256, 256, 32))
+        out = ChunkLog(rows)
+        encoder = pngencode.ParallelPngEncoder(threads = 1, blockSize = 32768)
+        try:
+            encoder.write(out, 256, 256, rows)
+        finally:
+            encoder.close()
+
+        self.assertGreater(len(out.idat), 4)
+        self.assertLess(out.idat[0], 128)
+        self.assertEqual(readPixels(out.getvalue())[2], rows.rows)
+
+def pixelRows(pixels, width):
+    data = b''.join(bytes(p) for p in pixels)
+    return [ data[i : i + width * 4] for i in range(0, len(data), width * 4) ]
+
+class OptimizedPngTest(unittest.TestCase):
+
+    def encode(self, pixels, width = 32):
+        #Pixels must come back identical, whichever color type is used
+        rows = pixelRows(pixels, width)
+        height = len(rows)
+        data = pngencode.OptimizedPngEncoder().encode(width, height, iter(rows))
+        self.assertEqual(readPixels(data), (width, height, rows))
+        return png.Reader(bytes = data).read()[3]
+
+    def test_palette(self):
+        #Few colors, some translucent, stored as indices with tRNS
+        colors = [ (200, 10, 10, 255), (0, 0, 0, 0), (10, 200, 30, 128), (5, 5, 250, 255) ]
+        info = self.encode([ colors[(i * 7 + i // 32) % 4] for i in range(32 * 16) ])
+        self.assertIn('palette', info)
+        self.assertEqual(info['bitdepth'], 2)
+
+    def test_greyscale(self):
+        info = self.encode([ (i % 256,) * 3 + (255,) for i in range(32 * 32) ])
+        self.assertTrue(info['greyscale'])
+        self.assertFalse(info['alpha'])
+
+    def test_greyscale_alpha(self):
+        info = self.encode([ (i % 256,) * 3 + ((i * 5) % 256,) for i in range(32 * 32) ])
+        self.assertTrue(info['greyscale'])
+        self.assertTrue(info['alpha'])
+
+    def test_over_256_colors(self):
+        #Too many colors for a palette, all opaque
+        info = self.encode([ (i % 256, i // 256, 7, 255) for i in range(32 * 32) ])
+        self.assertNotIn('palette', info)
+        self.assertEqual(info['planes'], 3)
+
+    def test_color_key(self):
+        #One fully transparent color, no opaque pixel of that color
+        pixels = [ (i % 256, i // 256, 7, 255) for i in range(32 * 32) ]
+        for i in range(0, len(pixels), 3):
+            pixels[i] = (1, 2, 3, 0)
+        info = self.encode(pixels)
+        self.assertEqual(info['planes'], 3)
+        self.assertEqual(info['transparent'], (1, 2, 3))
+
+    def test_partial_alpha(self):
+        #Translucent pixels need full RGBA
+        pixels = [ (i % 256, i // 256, 7, 255 if i % 5 else 100) for i in range(32 * 32) ]
+        self.assertEqual(self.encode(pixels)['planes'], 4)
+
+    def test_no_key_possible(self):
+        #Clear pixels of more than one color, or a clear color that is
+        #also used opaque, keep their RGB through full RGBA
+        pixels = [ (i % 256, i // 256, 7, 255) for i in range(32 * 32) ]
+        pixels[0] = (9, 9, 9, 0)
+        pixels[1] = (8, 8, 8, 0)
+        self.assertEqual(self.encode(pixels)['planes'], 4)
+
+        pixels[1] = (9, 9, 9, 255)
+        self.assertEqual(self.encode(pixels)['planes'], 4)
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,140 @@
+#==============================================================
+"""
+
+Repacker Tests
+Replacing a texture with one of another size must leave every
+chunk and header field that describes it consistent.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import sys
+import struct
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Import User Libraries
+from pvmarchive import decode
+import pvrencode
+import repack
+
+def makeTexture(width, height, gbix = None):
+    rgba = bytes((x * 5 + y) & 0xFF for y in range(height) for x in range(width * 4))
+    return pvrencode.encodeTexture(rgba, width, height, pvrencode.RGB_565,
+                                   pvrencode.TWIDDLED, gbix = gbix)
+
+def makePvm(textures):
+    #Every header field: name, format, dimensions and global index
+    header = struct.pack('<HH', 0x0F, len(textures))
+    for i, (name, texture) in enumerate(textures):
+        header += struct.pack('<H', i) + name.encode('ascii').ljust(0x1C, b'\0')
+        header += struct.pack('<HHI', 0, 0, i)
+    body = b''.join(texture for name, texture in textures)
+    return b'PVMH' + struct.pack('<I', len(header)) + header + body
+
+def makeMt5(textures):
+    #Empty model followed by a TEXD chunk of TEXN chunks
+    texd = b''
+    for i, texture in enumerate(textures):
+        texd += b'TEXN' + struct.pack('<I', 0x10 + len(texture)) + struct.pack('<Q', i)
+        texd += texture
+    texd = b'TEXD' + struct.pack('<II', 0x0C + len(texd), len(textures)) + texd
+    return b'HRCM' + struct.pack('<II', 0x0C, 0) + texd
+
+def walkTexd(data):
+    #Texture chunks found by following the chunk lengths
+    texOfs = struct.unpack_from('<I', data, 0x04)[0]
+    tag, length, count = struct.unpack_from('<4sII', data, texOfs)
+    ofs = texOfs + 0x0C
+    found = []
+    for i in range(count):
+        tag, length = struct.unpack_from('<4sI', data, ofs)
+        if tag != b'TEXN':
+            raise ValueError("Expected TEXN at 0x%x" % ofs)
+        found.append(data[ofs + 0x10 : ofs + length])
+        ofs += length
+    if ofs != texOfs + struct.unpack_from('<I', data, texOfs + 0x04)[0]:
+        raise ValueError("TEXD length does not match its chunks")
+    return found
+
+class RepackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def repack(self, data, replacements):
+        source = os.path.join(self.folder.name, "source")
+        output = os.path.join(self.folder.name, "output")
+        with open(source, 'wb') as f:
+            f.write(data)
+        for i, (key, texture) in enumerate(replacements):
+            path = os.path.join(self.folder.name, "new%d.pvr" % i)
+            with open(path, 'wb') as f:
+                f.write(texture)
+            replacements[i] = (key, path)
+        repack.repackFile(source, output, replacements)
+        with open(output, 'rb') as f:
+            return f.read()
+
+    def test_mt5_texn_lengths(self):
+        textures = [ makeTexture(16, 16, 7), makeTexture(8, 8), makeTexture(16, 16, 9) ]
+        larger = makeTexture(32, 32, 7)
+        out = self.repack(makeMt5(textures), [ ('0', larger), ('1', makeTexture(16, 8)) ])
+
+        found = walkTexd(out)
+        self.assertEqual(len(found), 3)
+        self.assertEqual(bytes(decode(found[0])), bytes(decode(larger)))
+        self.assertEqual(bytes(decode(found[2])), bytes(decode(textures[2])))
+
+    def test_pvm_header_fields(self):
+        textures = [ ('one', makeTexture(16, 16, 1)), ('two', makeTexture(8, 8, 2)) ]
+        out = self.repack(makePvm(textures), [ ('one', makeTexture(64, 32, 5)) ])
+
+        entry = 0x0C + 0x02 + 0x1C
+        fmt, size, index = struct.unpack_from('<HHI', out, entry)
+        self.assertEqual(size, (64).bit_length() - 3 | ((32).bit_length() - 3) << 4)
+        self.assertEqual(fmt & 0xFF, pvrencode.RGB_565)
+        self.assertEqual(index, 5)
+        self.assertEqual(repack.dimensionCode(8, 8), struct.pack('<H', 0x11))
+
+    def test_bad_input(self):
+        #Truncated sources and replacements raise ValueError
+        texture = makeTexture(16, 16, 1)
+        for cut in (4, 0x14, len(texture) - 1):
+            with self.assertRaises(ValueError, msg = cut):
+                self.repack(makePvm([ ('one', texture) ]), [ ('one', texture[:cut]) ])
+        with self.assertRaises(ValueError):
+            self.repack(makePvm([ ('one', texture) ])[:0x20], [ ('one', texture) ])
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,122 @@
+#==============================================================
+"""
+
+Stream Mode Tests
+Frames written by streamio must read back with the byte counts
+they announce.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import sys
+import struct
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Import User Libraries
+from pvmarchive import decode
+import pvrencode
+import streamio
+
+def makeTexture(width, height):
+    rgba = bytes((x * 7 + y * 3) & 0xFF for y in range(height) for x in range(width * 4))
+    return pvrencode.encodeTexture(rgba, width, height, pvrencode.ARGB_1555,
+                                   pvrencode.TWIDDLED)
+
+def makePvm(textures):
+    #PVM with names only, followed by each PVRT chunk
+    header = struct.pack('<HH', 0x08, len(textures))
+    for i, (name, texture) in enumerate(textures):
+        header += struct.pack('<H', i) + name.encode('ascii').ljust(0x1C, b'\0')
+    body = b''.join(texture for name, texture in textures)
+    return b'PVMH' + struct.pack('<I', len(header)) + header + body
+
+class StreamFrameTest(unittest.TestCase):
+
+    def roundTrip(self, data):
+        stdin = io.BytesIO(struct.pack('<I', len(data)) + data)
+        stdout = io.BytesIO()
+        self.assertEqual(streamio.run(None, raw = True, frames = True,
+                                      stdin = stdin, stdout = stdout), 0)
+        stdout.seek(0)
+        frames = list(streamio.readTextureFrames(stdout))
+        self.assertEqual(stdout.read(), b'')
+        return frames
+
+    def test_raw_single_texture(self):
+        texture = makeTexture(32, 32)
+        frames = self.roundTrip(texture)
+        self.assertEqual(len(frames), 1)
+        name, width, height, payload = frames[0]
+        self.assertEqual((width, height, len(payload)), (32, 32, 32 * 32 * 4))
+        self.assertEqual(payload, bytes(decode(texture).cast('B')))
+
+    def test_raw_archive(self):
+        textures = [ ('one', makeTexture(32, 32)), ('two', makeTexture(16, 8)) ]
+        frames = self.roundTrip(makePvm(textures))
+        self.assertEqual([ (f[1], f[2], len(f[3])) for f in frames ],
+                         [ (32, 32, 4096), (16, 8, 512) ])
+
+class MalformedInputTest(unittest.TestCase):
+
+    def test_decode_raises_value_error(self):
+        texture = makeTexture(16, 16)
+        header = texture[0x08:0x10]
+        inputs = [ b'', b'junk', b'GBIX', b'GBIX' + struct.pack('<I', 4),
+                   texture[:12], texture[:-1], header,
+                   header[:2] + struct.pack('<HHH', 0, 24, 16) + bytes(1024) ]
+        for data in inputs:
+            with self.assertRaises(ValueError, msg = data[:16]):
+                decode(data)
+
+    def test_stream_errors(self):
+        stdin = io.BytesIO(b'junk')
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(streamio.run(None, raw = True, stdin = stdin,
+                                          stdout = io.BytesIO()), 1)
+        self.assertIn("Stream error", stderr.getvalue())
+
+    def test_truncated_texture_skipped(self):
+        #The good texture before a truncated one is still written
+        texture = makeTexture(16, 16)
+        data = makePvm([ ('good', texture), ('cut', texture[:-100]) ])
+        stdin = io.BytesIO(struct.pack('<I', len(data)) + data)
+        stdout = io.BytesIO()
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(streamio.run(None, raw = True, frames = True,
+                                          stdin = stdin, stdout = stdout), 0)
+        stdout.seek(0)
+        frames = list(streamio.readTextureFrames(stdout))
+        self.assertEqual([ f[0] for f in frames ], [ 'good' ])
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
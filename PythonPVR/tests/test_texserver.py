@@ -0,0 +1,165 @@
+#==============================================================
+"""
+
+Texture Server Tests
+A texture that fails to decode must get an error response and be
+counted on the stats page, and concurrent requests for one image
+must share a single read and decode.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import http.client
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Import User Libraries
+import texserver
+from test_streamio import makeTexture, makePvm
+
+class InlinePool:
+
+    #Decodes in the calling thread, counting each submit
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+class TextureServerTest(unittest.TestCase):
+
+    def setUp(self):
+        #A good texture followed by one missing most of its data, or
+        #cut short after its header
+        self.root = tempfile.mkdtemp()
+        good = makeTexture(16, 16)
+        for name, cut in (("test.pvm", good[:-200]), ("header.pvm", good[:12])):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(makePvm([ ('good', good), ('cut', cut) ]))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_decode_errors_answered(self):
+        service = texserver.TextureService(self.root, workers = 1)
+        texserver.TextureHandler.service = service
+        server = ThreadingHTTPServer(("127.0.0.1", 0), texserver.TextureHandler)
+        thread = threading.Thread(target = server.serve_forever)
+        thread.start()
+
+        def get(path):
+            conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout = 30)
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                return response.status, response.read()
+            finally:
+                conn.close()
+
+        try:
+            self.assertEqual(get("/texture?file=test.pvm&index=0")[0], 200)
+            self.assertEqual(get("/texture?file=test.pvm&index=1")[0], 422)
+            self.assertEqual(get("/texture?file=header.pvm&index=1&format=raw")[0], 422)
+            self.assertEqual(get("/texture?file=test.pvm&index=2")[0], 404)
+            self.assertEqual(get("/texture?file=test.pvm&format=bmp")[0], 400)
+            stats = json.loads(get("/stats")[1])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            service.close()
+
+        self.assertEqual(stats['errors'], { '400' : 1, '404' : 1, '422' : 2 })
+        self.assertEqual(stats['requests'], 5)
+
+    def test_concurrent_misses_read_once(self):
+        service = texserver.TextureService(self.root, workers = 1)
+        service.pool.shutdown()
+        service.pool = InlinePool()
+
+        #The first read waits until the second request has had time
+        #to reach the pending decode
+        reading = threading.Event()
+        release = threading.Event()
+        reads = []
+        openStream = texserver.openStream
+
+        def slowOpen(path):
+            reads.append(path)
+            reading.set()
+            release.wait(10)
+            return openStream(path)
+
+        texserver.openStream = slowOpen
+        results = []
+        request = lambda: results.append(service.getTexture("test.pvm", 0, 0, 'png'))
+        try:
+            first = threading.Thread(target = request)
+            first.start()
+            self.assertTrue(reading.wait(10))
+            second = threading.Thread(target = request)
+            second.start()
+            second.join(0.2)
+            release.set()
+            first.join()
+            second.join()
+        finally:
+            texserver.openStream = openStream
+
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(service.pool.submitted, 1)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(service.pending, {})
+
+    def test_failed_decode_shared(self):
+        #Every request joined to a failed decode gets the error
+        service = texserver.TextureService(self.root, workers = 1)
+        service.pool.shutdown()
+        service.pool = InlinePool()
+        for i in range(2):
+            with self.assertRaises(texserver.DecodeError):
+                service.getTexture("test.pvm", 1, 0, 'png')
+        self.assertEqual(service.pending, {})
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,155 @@
+#==============================================================
+"""
+
+VQ Encoder Tests
+Textures written by vqencode must decode back to the image they
+were made from. Images with no more distinct blocks than the
+codebook holds come back exactly, others within a small error.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import sys
+import math
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Import User Libraries
+from pvmarchive import PvrTexture, textureView, decode
+import vqencode
+from vqencode import VQ, VQ_MM, SMALLVQ, SMALLVQ_MM, ARGB_1555, RGB_565, ARGB_4444
+
+DATA_FORMATS = [ VQ, VQ_MM, SMALLVQ, SMALLVQ_MM ]
+
+#Colors each format stores exactly
+COLORS = {
+    ARGB_1555 : [ (248, 0, 0, 255), (0, 248, 0, 0), (0, 0, 248, 255), (64, 128, 200, 255) ],
+    RGB_565   : [ (248, 0, 0, 255), (0, 252, 0, 255), (0, 0, 248, 255), (64, 128, 200, 255) ],
+    ARGB_4444 : [ (240, 0, 0, 240), (0, 240, 0, 16), (0, 0, 240, 128), (64, 128, 208, 0) ]
+}
+
+def quadrants(width, colors):
+    #One color in each quarter, so every mipmap level down to 2x2
+    #is made of the same four single color blocks
+    half = width // 2
+    rgba = bytearray()
+    for y in range(width):
+        for x in range(width):
+            rgba += bytes(colors[(y >= half) * 2 + (x >= half)])
+    return bytes(rgba)
+
+def gradient(width):
+    rand = random.Random(width)
+    rgba = bytearray()
+    for y in range(width):
+        for x in range(width):
+            rgba += bytes(((x * 255) // width, (y * 255) // width,
+                           ((x ^ y) * 4 + rand.randrange(8)) & 0xFF, 255))
+    return bytes(rgba)
+
+def scaleDown(rgba, width):
+    #Box filter of one level, as the mipmap chain is made
+    half = width // 2
+    out = bytearray()
+    for y in range(half):
+        for x in range(half):
+            for c in range(4):
+                total = sum(rgba[((y * 2 + j) * width + x * 2 + i) * 4 + c]
+                            for j in range(2) for i in range(2))
+                out.append((total + 2) // 4)
+    return bytes(out)
+
+def rmsError(a, b):
+    return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)) / len(a))
+
+class VqRoundTripTest(unittest.TestCase):
+
+    def encode(self, rgba, width, colorFormat, dataFormat, seed = 0):
+        data = vqencode.encodeVqTexture(rgba, width, width, colorFormat, dataFormat,
+                                        preset = 'fast', seed = seed, workers = 1)
+        pvr = PvrTexture(textureView(data))
+        self.assertTrue(pvr.isSupported())
+        self.assertEqual(len(data) - 0x10, pvr.getDataLength())
+        return data, pvr
+
+    def test_exact_round_trip(self):
+        for dataFormat in DATA_FORMATS:
+            for colorFormat, colors in sorted(COLORS.items()):
+                name = "color %d data 0x%02x" % (colorFormat, dataFormat)
+                width = 32
+                rgba = quadrants(width, colors)
+                data, pvr = self.encode(rgba, width, colorFormat, dataFormat)
+
+                #Every level but the last 1x1 is made of stored blocks
+                mipmap = dataFormat in (VQ_MM, SMALLVQ_MM)
+                levels = pvr.getMipmapCount() - 1 if mipmap else 1
+                self.assertEqual(pvr.getMipmapCount(), 6 if mipmap else 1, name)
+                for level in range(levels):
+                    size = width >> level
+                    self.assertEqual(bytes(decode(data, mip = level)), rgba, name)
+                    rgba = rgba if size <= 2 else quadrants(size // 2, colors)
+
+    def test_lossy_round_trip(self):
+        #More distinct blocks than any codebook holds
+        for dataFormat in DATA_FORMATS:
+            width = 64 if dataFormat == VQ else 32
+            rgba = gradient(width)
+            data, pvr = self.encode(rgba, width, ARGB_1555, dataFormat, seed = 3)
+            self.assertLess(rmsError(bytes(decode(data)), rgba), 20.0, hex(dataFormat))
+
+            if dataFormat in (VQ_MM, SMALLVQ_MM):
+                half = bytes(decode(data, mip = 1))
+                self.assertLess(rmsError(half, scaleDown(rgba, width)), 20.0, hex(dataFormat))
+
+    def test_same_output_for_seed(self):
+        rgba = gradient(32)
+        first = self.encode(rgba, 32, RGB_565, SMALLVQ, seed = 5)[0]
+        second = self.encode(rgba, 32, RGB_565, SMALLVQ, seed = 5)[0]
+        self.assertEqual(first, second)
+
+class WeightsTest(unittest.TestCase):
+
+    def test_find_and_add(self):
+        values = [ 3, 0, 5, 1, 0, 0, 7 ]
+        weights = vqencode.Weights(values)
+        self.assertEqual(weights.total, 16)
+
+        #Each target lands on the entry whose range holds it
+        expected = [ i for i, v in enumerate(values) for _ in range(v) ]
+        self.assertEqual([ weights.find(t) for t in range(16) ], expected)
+
+        weights.add(6, -7)
+        weights.add(1, 2)
+        self.assertEqual(weights.total, 11)
+        self.assertEqual([ weights.find(t) for t in range(11) ],
+                         [ 0, 0, 0, 1, 1, 2, 2, 2, 2, 2, 3 ])
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,136 @@
+#==============================================================
+"""
+
+Watcher Tests
+Converting only the changed textures of a file must write them to
+the same outputs as the first full pass, including textures that
+share a name with others in the same file or in other files.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import os
+import png
+import sys
+import shutil
+import struct
+import tempfile
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Import User Libraries
+from pvmarchive import decode
+from pipeline import TexturePipeline
+from watcher import Watcher
+import pvrencode
+
+def makeTexture(width, height, seed):
+    rgba = bytes((x * seed + y * 3) & 0xFF for y in range(height) for x in range(width * 4))
+    return pvrencode.encodeTexture(rgba, width, height, pvrencode.ARGB_1555,
+                                   pvrencode.TWIDDLED)
+
+def makePvm(textures):
+    #PVM with names only, its header padded so every PVRT chunk
+    #starts on a word as in the game files
+    header = struct.pack('<HH', 0x08, len(textures))
+    for i, (name, texture) in enumerate(textures):
+        header += struct.pack('<H', i) + name.encode('ascii').ljust(0x1C, b'\0')
+    header += bytes(-len(header) % 4)
+    body = b''.join(texture for name, texture in textures)
+    return b'PVMH' + struct.pack('<I', len(header)) + header + body
+
+class WatcherNamesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, "source")
+        self.output = os.path.join(self.root, "output")
+        os.mkdir(self.source)
+        self.pipeline = TexturePipeline(self.output, decoders = 1, encoders = 1,
+                                        processes = False, prefetch = 0)
+        self.watcher = Watcher([ self.source ], self.pipeline.run, settle = 0, inotify = False)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def writeArchive(self, name, textures, mtime):
+        path = os.path.join(self.source, name)
+        with open(path, 'wb') as f:
+            f.write(makePvm(textures))
+        os.utime(path, ns = (mtime, mtime))
+
+    def step(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.watcher.step()
+
+    def readOutputs(self):
+        #Decoded pixels of every written file, by file name
+        outputs = {}
+        for name in os.listdir(self.output):
+            rows = png.Reader(filename = os.path.join(self.output, name)).asRGBA8()[2]
+            outputs[name] = b''.join(bytes(row) for row in rows)
+        return outputs
+
+    def test_partial_reconvert_keeps_names(self):
+        textures = [ makeTexture(16, 16, 1), makeTexture(8, 8, 2), makeTexture(16, 16, 3) ]
+        self.writeArchive("a.pvm", [ ('dup', textures[0]), ('dup', textures[1]),
+                                     ('solo', textures[2]) ], 10 ** 18)
+        self.writeArchive("b.pvm", [ ('dup', makeTexture(8, 16, 4)) ], 10 ** 18)
+
+        self.assertEqual(self.step(), 4)
+        first = self.readOutputs()
+        self.assertEqual(sorted(first), [ "dup.png", "dup_2.png", "dup_3.png", "solo.png" ])
+        self.assertEqual(first["dup_2.png"], bytes(decode(textures[1])))
+
+        #Only the second texture named dup changes
+        changed = makeTexture(8, 8, 5)
+        self.writeArchive("a.pvm", [ ('dup', textures[0]), ('dup', changed),
+                                     ('solo', textures[2]) ], 2 * 10 ** 18)
+        self.assertEqual(self.step(), 1)
+
+        second = self.readOutputs()
+        self.assertEqual(sorted(second), sorted(first))
+        self.assertEqual(second["dup_2.png"], bytes(decode(changed)))
+        for name in ("dup.png", "dup_3.png", "solo.png"):
+            self.assertEqual(second[name], first[name], name)
+
+    def test_removed_file_frees_names(self):
+        self.writeArchive("a.pvm", [ ('dup', makeTexture(8, 8, 1)) ], 10 ** 18)
+        self.writeArchive("b.pvm", [ ('dup', makeTexture(8, 8, 2)) ], 10 ** 18)
+        self.step()
+        self.assertEqual(self.watcher.names, { "dup", "dup_2" })
+
+        os.remove(os.path.join(self.source, "a.pvm"))
+        self.step()
+        self.assertEqual(self.watcher.names, { "dup_2" })
+        self.assertEqual(self.watcher.outputs, { (os.path.join(self.source, "b.pvm"), ('dup', 0)) : "dup_2" })
+
+if __name__ == "__main__":
+    unittest.main()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,155 @@
+#==============================================================
+"""
+
+Texture Containers
+Writes decoded pvr textures as uncompressed RGBA DDS or KTX
+files, keeping every mipmap level stored in the pvr. Rows go
+from the decoder straight to the file without compression.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import io
+import struct
+
+#DDS header flags
+DDSD_CAPS        = 0x00000001
+DDSD_HEIGHT      = 0x00000002
+DDSD_WIDTH       = 0x00000004
+DDSD_PITCH       = 0x00000008
+DDSD_PIXELFORMAT = 0x00001000
+DDSD_MIPMAPCOUNT = 0x00020000
+
+DDPF_ALPHAPIXELS = 0x00000001
+DDPF_RGB         = 0x00000040
+
+DDSCAPS_COMPLEX  = 0x00000008
+DDSCAPS_TEXTURE  = 0x00001000
+DDSCAPS_MIPMAP   = 0x00400000
+
+#KTX constants for GL_RGBA / GL_UNSIGNED_BYTE
+KTX_IDENTIFIER   = b'\xabKTX 11\xbb\r\n\x1a\n'
+KTX_ENDIANNESS   = 0x04030201
+GL_UNSIGNED_BYTE = 0x1401
+GL_RGBA          = 0x1908
+GL_RGBA8         = 0x8058
+
+#==============================================================
+"""
+DdsWriter Class
+DirectDraw Surface with a 32 bit RGBA pixel format, levels
+written from largest to smallest
+"""
+#==============================================================
+
+class DdsWriter:
+
+    extension = '.dds'
+
+    def writeHeader(self, f, width, height, mipCount):
+        flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PITCH | DDSD_PIXELFORMAT
+        caps = DDSCAPS_TEXTURE
+        if mipCount > 1:
+            flags |= DDSD_MIPMAPCOUNT
+            caps |= DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
+
+        f.write(b'DDS ')
+        f.write(struct.pack('<7I', 124, flags, height, width, width * 4, 0, mipCount))
+        f.write(bytes(11 * 4))
+
+        #Pixel format, bytes in memory are R, G, B, A
+        f.write(struct.pack('<8I', 32, DDPF_RGB | DDPF_ALPHAPIXELS, 0, 32,
+                            0x000000FF, 0x0000FF00, 0x00FF0000, 0xFF000000))
+        f.write(struct.pack('<5I', caps, 0, 0, 0, 0))
+
+    def writeTexture(self, f, pvr):
+        mipCount = pvr.getMipmapCount()
+        self.writeHeader(f, pvr.width, pvr.height, mipCount)
+
+        for level in range(mipCount):
+            for row in pvr.iterRows(level):
+                f.write(row)
+
+    def encodeTexture(self, pvr):
+        buf = io.BytesIO()
+        self.writeTexture(buf, pvr)
+        return buf.getvalue()
+
+    def close(self):
+        return 1
+
+#==============================================================
+"""
+KtxWriter Class
+Khronos KTX 1.1 with an RGBA8 format. Rows are written top
+first and marked as such with the KTXorientation key.
+"""
+#==============================================================
+
+class KtxWriter:
+
+    extension = '.ktx'
+
+    def writeHeader(self, f, width, height, mipCount):
+        #Key value data, padded to four bytes
+        key = b'KTXorientation\0S=r,T=d\0'
+        keyValue = struct.pack('<I', len(key)) + key
+        keyValue += bytes(-len(keyValue) % 4)
+
+        f.write(KTX_IDENTIFIER)
+        f.write(struct.pack('<13I', KTX_ENDIANNESS, GL_UNSIGNED_BYTE, 1, GL_RGBA,
+                            GL_RGBA8, GL_RGBA, width, height, 0, 0, 1, mipCount,
+                            len(keyValue)))
+        f.write(keyValue)
+
+    def writeTexture(self, f, pvr):
+        mipCount = pvr.getMipmapCount()
+        self.writeHeader(f, pvr.width, pvr.height, mipCount)
+
+        #RGBA rows are always four byte aligned, so no row padding
+        for level in range(mipCount):
+            width, height = pvr.getLevelSize(level)
+            f.write(struct.pack('<I', width * height * 4))
+            for row in pvr.iterRows(level):
+                f.write(row)
+
+    def encodeTexture(self, pvr):
+        buf = io.BytesIO()
+        self.writeTexture(buf, pvr)
+        return buf.getvalue()
+
+    def close(self):
+        return 1
+
+#Container writers by name
+CONTAINER_LIST = {
+    'dds' : DdsWriter,
+    'ktx' : KtxWriter
+}
+
+def createContainer(name):
+    return CONTAINER_LIST[name]()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
@@ -0,0 +1,406 @@
+#==============================================================
+"""
+
+Texture Server
+Local http service that decodes textures on demand for asset
+browsers. Archives are indexed once, decoded images are kept in
+a memory bounded cache, and misses are decoded on a process pool.
+
+    python texserver.py --root <folder> [--port 8080]
+
+    GET /list?file=MAP01.MT5
+    GET /texture?file=MAP01.MT5&index=0&mip=0&format=png
+    GET /stats
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import json
+import time
+import argparse
+import threading
+import collections
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import Future, ProcessPoolExecutor, BrokenExecutor
+
+#Import User Libraries
+from pvmarchive import *
+from pipeline import openArchive, openStream
+from pngencode import PypngEncoder
+
+#Response content types by output format
+FORMAT_LIST = {
+    'png' : 'image/png',
+    'raw' : 'application/octet-stream'
+}
+
+#Latencies kept for the percentiles on the stats page
+LATENCY_SAMPLES = 1024
+
+class DecodeError(Exception):
+
+    #Raised when the stored data of a texture cannot be decoded
+    pass
+
+def renderTexture(data, mip, fmt, level):
+    #Decode one mipmap level in a worker process
+    view = decode(data, mip = mip)
+    if fmt == 'raw':
+        return bytes(view)
+
+    height, width = view.shape[0:2]
+    stride = width * 4
+    flat = view.cast('B')
+    rows = [ flat[y * stride : (y + 1) * stride] for y in range(height) ]
+    return PypngEncoder(level).encode(width, height, rows)
+
+#==============================================================
+"""
+ImageCache Class
+Least recently used cache of encoded images, bounded by the
+total size of the stored bytes rather than the entry count
+"""
+#==============================================================
+
+class ImageCache:
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.size = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        #Images larger than the whole cache are not stored
+        if len(data) > self.maxBytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.size += len(data)
+
+            while self.size > self.maxBytes:
+                oldKey, oldData = self.entries.popitem(last = False)
+                self.size -= len(oldData)
+
+    def getStats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries'  : len(self.entries),
+                'bytes'    : self.size,
+                'maxBytes' : self.maxBytes,
+                'hits'     : self.hits,
+                'misses'   : self.misses,
+                'hitRate'  : self.hits / total if total else 0.0
+            }
+
+#==============================================================
+"""
+TextureService Class
+Keeps the texture list of every archive that has been opened,
+checked against the file's mtime and size so edited files are
+indexed again. Concurrent requests for the same missing image
+share one decode.
+"""
+#==============================================================
+
+class TextureService:
+
+    def __init__(self, root, cacheBytes = 256 * 1024 * 1024, workers = None, level = 6):
+        self.root = os.path.realpath(root)
+        self.cache = ImageCache(cacheBytes)
+        self.pool = ProcessPoolExecutor(workers or os.cpu_count() or 1)
+        self.level = level
+        self.archives = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.latency = collections.deque(maxlen = LATENCY_SAMPLES)
+        self.requests = 0
+        self.notModified = 0
+        self.errors = collections.Counter()
+        self.started = time.time()
+
+    def resolve(self, name):
+        #Only files inside the root folder are served
+        path = os.path.realpath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, path]) != self.root or not os.path.isfile(path):
+            raise KeyError(name)
+        return path
+
+    def getArchive(self, name):
+        #Returns (path, version, entries), indexing the file on first use
+        path = self.resolve(name)
+        stat = os.stat(path)
+        version = "%x-%x" % (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            cached = self.archives.get(path)
+            if cached is not None and cached[0] == version:
+                return (path,) + cached
+
+        archive = openArchive(path)
+        if archive is None:
+            raise KeyError(name)
+        try:
+            entries = archive.readTextureEntries()
+        finally:
+            archive.bs.close()
+
+        with self.lock:
+            self.archives[path] = (version, entries)
+        return (path, version, entries)
+
+    def listTextures(self, name):
+        path, version, entries = self.getArchive(name)
+        return [ { 'index' : i, 'name' : entry['name'], 'length' : entry['length'] }
+                 for i, entry in enumerate(entries) ]
+
+    def getEtag(self, name, index, mip, fmt):
+        path, version, entries = self.getArchive(name)
+        if index < 0 or index >= len(entries):
+            raise KeyError(index)
+        return '"%s-%d-%d-%s"' % (version, index, mip, fmt)
+
+    def getTexture(self, name, index, mip, fmt):
+        #Returns (etag, image bytes)
+        path, version, entries = self.getArchive(name)
+        etag = self.getEtag(name, index, mip, fmt)
+        key = (path, etag)
+
+        data = self.cache.get(key)
+        if data is not None:
+            return (etag, data)
+
+        #Join a decode already running for the same image before
+        #reading anything, so concurrent misses read the file once
+        with self.lock:
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.pending[key] = future
+
+        if owner:
+            try:
+                data = self.render(path, entries[index], mip, fmt)
+                self.cache.put(key, data)
+                future.set_result(data)
+            except BaseException as err:
+                future.set_exception(err)
+            finally:
+                #Cached before it stops being pending, so no request
+                #in between decodes it again
+                with self.lock:
+                    self.pending.pop(key, None)
+
+        return (etag, future.result())
+
+    def render(self, path, entry, mip, fmt):
+        bs = openStream(path)
+        try:
+            bs.bs.seek(entry['offset'])
+            raw = bs.readBytes(entry['length'])
+        finally:
+            bs.close()
+
+        #Anything the worker raises comes from the texture data,
+        #only a failed pool is the server's own fault
+        try:
+            return self.pool.submit(renderTexture, raw, mip, fmt, self.level).result()
+        except BrokenExecutor:
+            raise
+        except Exception as err:
+            raise DecodeError("%s: %s" % (entry['name'], err))
+
+    def record(self, seconds, status = 200):
+        with self.lock:
+            self.requests += 1
+            if status == 304:
+                self.notModified += 1
+            elif status >= 400:
+                self.errors[status] += 1
+            self.latency.append(seconds)
+
+    def getStats(self):
+        with self.lock:
+            samples = sorted(self.latency)
+            stats = {
+                'requests'    : self.requests,
+                'notModified' : self.notModified,
+                'errors'      : { str(k) : v for k, v in sorted(self.errors.items()) },
+                'archives'    : len(self.archives),
+                'uptime'      : time.time() - self.started
+            }
+
+        def percentile(p):
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+        stats['latencyMs'] = {
+            'p50'  : percentile(0.50),
+            'p95'  : percentile(0.95),
+            'p99'  : percentile(0.99),
+            'max'  : samples[-1] * 1000 if samples else 0.0
+        }
+        stats['cache'] = self.cache.getStats()
+        return stats
+
+    def close(self):
+        self.pool.shutdown()
+
+#==============================================================
+"""
+TextureHandler Class
+Maps each url to the service and writes the response
+"""
+#==============================================================
+
+class TextureHandler(BaseHTTPRequestHandler):
+
+    service = None
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        query = { k : v[-1] for k, v in parse_qs(url.query).items() }
+        status = 200
+        message = None
+
+        try:
+            if url.path == '/texture':
+                status = self.sendTexture(query)
+            elif url.path == '/list':
+                self.sendJson(self.service.listTextures(query['file']))
+            elif url.path == '/stats':
+                self.sendJson(self.service.getStats())
+            else:
+                status = 404
+        except (KeyError, IndexError):
+            status = 404
+        except DecodeError as err:
+            #The request was fine, the texture it names is broken
+            status = 422
+            message = str(err)
+        except ValueError as err:
+            status = 400
+            message = str(err)
+        except Exception as err:
+            status = 500
+            message = "%s: %s" % (type(err).__name__, err)
+
+        if status >= 400:
+            self.send_error(status, message)
+        self.service.record(time.perf_counter() - start, status)
+
+    def sendTexture(self, query):
+        name = query['file']
+        index = int(query.get('index', 0))
+        mip = int(query.get('mip', 0))
+        fmt = query.get('format', 'png')
+        if fmt not in FORMAT_LIST:
+            raise ValueError("Unknown format: %s" % fmt)
+
+        #Conditional requests are answered without decoding
+        etag = self.service.getEtag(name, index, mip, fmt)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return 304
+
+        etag, data = self.service.getTexture(name, index, mip, fmt)
+        self.send_response(200)
+        self.send_header('Content-Type', FORMAT_LIST[fmt])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(data)
+        return 200
+
+    def sendJson(self, obj):
+        data = json.dumps(obj).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        #Requests are counted on the stats page instead
+        return
+
+def serve(root, host = "127.0.0.1", port = 8080, cacheBytes = 256 * 1024 * 1024,
+          workers = None, level = 6):
+    service = TextureService(root, cacheBytes, workers, level)
+    TextureHandler.service = service
+    server = ThreadingHTTPServer((host, port), TextureHandler)
+    server.daemon_threads = True
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+
+# Call main function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage = "python texserver.py --root <folder>")
+    parser.add_argument("--root", default = ".")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8080)
+    parser.add_argument("--cache", type = int, default = 256,
+                        help = "decoded image cache size in megabytes")
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "decode processes (default: cpu count)")
+    parser.add_argument("--level", type = int, default = 6,
+                        help = "deflate compression level")
+    args = parser.parse_args()
+
+    try:
+        serve(args.root, args.host, args.port, args.cache * 1024 * 1024,
+              args.workers, args.level)
+    except KeyboardInterrupt:
+        pass
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
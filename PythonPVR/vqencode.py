@@ -0,0 +1,436 @@
+#==============================================================
+"""
+
+VQ Encoder
+Compresses RGBA images into VQ and SmallVQ pvr textures. Every
+2x2 block of pixels becomes a 16 value vector, the vectors are
+clustered into a codebook with k-means++ seeding and mini-batch
+k-means, and each block is stored as the index of its nearest
+codebook entry. Batches are assigned by a pool of processes.
+NumPy is not used: vectors are tuples, distances go through
+math.dist and sums through map, so Python loops run once per
+vector rather than once per value.
+
+    python vqencode.py <image.png> <texture.pvr> [--format smallvq_mm] [--preset best]
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import sys
+import math
+import bisect
+import random
+import operator
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+#Import User Libraries
+from pvmarchive import *
+from pvrencode import *
+
+FORMAT_NAMES = {
+    'vq'         : VQ,
+    'vq_mm'      : VQ_MM,
+    'smallvq'    : SMALLVQ,
+    'smallvq_mm' : SMALLVQ_MM
+}
+
+#Vector length, four RGBA pixels
+DIMENSIONS = 16
+
+#Vectors per iteration (0 for all of them), vectors used to seed
+#the codebook, and the most iterations to run
+PRESETS = {
+    'fast'   : { 'batch' : 1024, 'init' : 2048,  'iterations' : 10 },
+    'normal' : { 'batch' : 4096, 'init' : 8192,  'iterations' : 30 },
+    'best'   : { 'batch' : 0,    'init' : 32768, 'iterations' : 60 }
+}
+
+#Stop once no entry moves further than this
+TOLERANCE = 0.5
+
+#Fewer vectors than this are assigned without the process pool
+POOL_THRESHOLD = 8192
+
+def codebookSize(dataFormat, width):
+    #Same rules the decoder reads the codebook with
+    header = pvrHeader(ARGB_1555, dataFormat, width, width, 0)
+    pvr = PvrTexture(header[8:])
+    return pvr.flags['codebook_size']
+
+def maskAlpha(rgba, colorFormat):
+    #565 has no alpha, so it should not pull on the clustering
+    if colorFormat != RGB_565:
+        return rgba
+    rgba = bytearray(rgba)
+    rgba[3::4] = bytes(len(rgba) // 4)
+    return rgba
+
+def blockVectors(rgba, width, height):
+    #Vectors of every 2x2 block in row order of the block grid. The
+    #pixels are ordered the way codebook entries store them: top
+    #left, bottom left, top right, bottom right.
+    stride = width * 4
+    vectors = []
+    for y in range(0, height, 2):
+        top = rgba[y * stride : (y + 1) * stride]
+        bottom = rgba[(y + 1) * stride : (y + 2) * stride]
+        for x in range(0, stride, 8):
+            vectors.append(tuple(top[x : x + 4] + bottom[x : x + 4] +
+                                 top[x + 4 : x + 8] + bottom[x + 4 : x + 8]))
+    return vectors
+
+#==============================================================
+"""
+Nearest Class
+Finds the closest codebook entry to a vector. Entries are sorted
+by the sum of their values; the difference of two sums bounds
+the distance between the vectors, so the search walks out from
+the vector's own sum and stops once no closer entry can remain.
+"""
+#==============================================================
+
+class Nearest:
+
+    def __init__(self, centers):
+        order = sorted(range(len(centers)), key = lambda i: sum(centers[i]))
+        self.centers = [ centers[i] for i in order ]
+        self.index = order
+        self.keys = [ sum(c) for c in self.centers ]
+        self.scale = math.sqrt(DIMENSIONS)
+
+    def find(self, vector):
+        centers = self.centers
+        keys = self.keys
+        key = sum(vector)
+        hi = bisect.bisect_left(keys, key)
+        lo = hi - 1
+        best = math.inf
+        found = 0
+
+        while lo >= 0 or hi < len(keys):
+            #Step to whichever side has the closer sum
+            if hi >= len(keys) or (lo >= 0 and key - keys[lo] <= keys[hi] - key):
+                i = lo
+                lo -= 1
+            else:
+                i = hi
+                hi += 1
+
+            if abs(key - keys[i]) >= best * self.scale:
+                break
+            dist = math.dist(vector, centers[i])
+            if dist < best:
+                best = dist
+                found = i
+
+        return self.index[found]
+
+#==============================================================
+"""
+Weights Class
+Running totals of a list of whole number weights, as a Fenwick
+tree. Changing one weight and drawing an index with probability
+proportional to its weight both take log n steps, so k-means++
+seeding does not rebuild a list of totals for every entry drawn.
+"""
+#==============================================================
+
+class Weights:
+
+    def __init__(self, values):
+        self.size = len(values)
+        self.tree = [ 0 ] + list(values)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(values)
+
+    def add(self, index, amount):
+        self.total += amount
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += amount
+            i += i & -i
+
+    def find(self, target):
+        #Index whose range of running totals holds target
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+def assignVectors(job):
+    #Nearest entry of every vector, run in the process pool
+    centers, vectors = job
+    nearest = Nearest(centers)
+    return [ nearest.find(v) for v in vectors ]
+
+#==============================================================
+"""
+VqCompressor Class
+Builds a codebook for a set of block vectors. The seed makes the
+result the same on every run, however many processes are used.
+"""
+#==============================================================
+
+class VqCompressor:
+
+    def __init__(self, size, preset = 'normal', seed = 0, workers = None):
+        if preset not in PRESETS:
+            raise ValueError("Unknown preset: %s" % preset)
+        self.size = size
+        self.settings = PRESETS[preset]
+        self.rng = random.Random(seed)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def assign(self, centers, vectors):
+        #Split large jobs across processes, results keep their order
+        if self.workers == 1 or len(vectors) < POOL_THRESHOLD:
+            return assignVectors((centers, vectors))
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        step = -(-len(vectors) // self.workers)
+        jobs = [ (centers, vectors[i : i + step]) for i in range(0, len(vectors), step) ]
+
+        indices = []
+        for part in self.pool.map(assignVectors, jobs):
+            indices.extend(part)
+        return indices
+
+    def sample(self, vectors, weights, count):
+        #Weighted draw, or everything when count covers it
+        if count == 0 or count >= sum(weights):
+            return vectors, weights
+        picked = Counter(self.rng.choices(range(len(vectors)), weights, k = count))
+        keys = sorted(picked)
+        return [ vectors[i] for i in keys ], [ picked[i] for i in keys ]
+
+    def seedCenters(self, vectors, weights):
+        #k-means++: each new entry is picked with probability
+        #proportional to its squared distance from the entries so far.
+        #Vectors are whole numbers, so the weighted squared distances
+        #are too, and their running totals stay exact.
+        vectors, weights = self.sample(vectors, weights, self.settings['init'])
+        first = self.rng.choices(range(len(vectors)), weights)[0]
+        centers = [ vectors[first] ]
+        near = [ math.dist(v, centers[0]) for v in vectors ]
+        owner = [ 0 ] * len(vectors)
+        dists = Weights([ round(d * d) * w for d, w in zip(near, weights) ])
+
+        while len(centers) < self.size and dists.total > 0:
+            pick = dists.find(self.rng.randrange(dists.total))
+            center = vectors[pick]
+            between = [ math.dist(center, c) for c in centers ]
+            centers.append(center)
+
+            #A vector only moves to the new entry when that entry is
+            #less than twice its distance from the vector's own entry
+            for i, v in enumerate(vectors):
+                if between[owner[i]] >= 2 * near[i]:
+                    continue
+                d = math.dist(v, center)
+                if d < near[i]:
+                    old = round(near[i] * near[i]) * weights[i]
+                    dists.add(i, round(d * d) * weights[i] - old)
+                    near[i] = d
+                    owner[i] = len(centers) - 1
+
+        return [ list(map(float, c)) for c in centers ]
+
+    def train(self, vectors, weights):
+        #Codebook entries as lists of floats, at most size of them
+        if len(vectors) <= self.size:
+            return [ list(map(float, v)) for v in vectors ]
+
+        centers = self.seedCenters(vectors, weights)
+        fullBatch = self.settings['batch'] == 0
+        counts = [ 0 ] * len(centers)
+
+        for _ in range(self.settings['iterations']):
+            batch, batchWeights = self.sample(vectors, weights, self.settings['batch'])
+            indices = self.assign(centers, batch)
+
+            #Weighted sums of the vectors of each entry, a column at
+            #a time
+            members = [ [] for _ in centers ]
+            for i, v, w in zip(indices, batch, batchWeights):
+                members[i].append((v, w))
+            totals = [ 0 ] * len(centers)
+            sums = [ None ] * len(centers)
+            for i, group in enumerate(members):
+                if not group:
+                    continue
+                vecs, ws = zip(*group)
+                totals[i] = sum(ws)
+                sums[i] = [ sum(map(operator.mul, column, ws)) for column in zip(*vecs) ]
+
+            #Move each entry toward its batch mean, by less as more
+            #vectors have been assigned to it over the iterations
+            if fullBatch:
+                counts = [ 0 ] * len(centers)
+            shift = 0.0
+            for i, center in enumerate(centers):
+                if not totals[i]:
+                    continue
+                counts[i] += totals[i]
+                rate = 1.0 / counts[i]
+                moved = [ c + (s - totals[i] * c) * rate for c, s in zip(center, sums[i]) ]
+                shift = max(shift, math.dist(moved, center))
+                centers[i] = moved
+
+            if shift < TOLERANCE:
+                break
+
+        return centers
+
+#==============================================================
+"""
+Encode Functions
+encodeVqTexture() takes top-first RGBA bytes like encodeTexture()
+and returns a PVRT chunk. Mipmapped formats share one codebook
+between every level; the 1x1 level uses the first color of the
+entry it points to, as the decoder reads it.
+"""
+#==============================================================
+
+def packCodebook(centers, size, colorFormat):
+    #Quantized codebook words, and the entries as the decoder sees them
+    raw = bytearray()
+    for center in centers:
+        raw += bytes(min(255, max(0, int(c + 0.5))) for c in center)
+    raw += bytes((size - len(centers)) * DIMENSIONS)
+
+    words = packColors(raw, colorFormat)
+    lut = PvrTexture.colorTable(colorFormat)
+    decoded = []
+    for i in range(0, len(words), 2 * PvrTexture.CODE_COMPONENTS):
+        entry = b''.join(lut[words[j] | words[j + 1] << 8]
+                         for j in range(i, i + 2 * PvrTexture.CODE_COMPONENTS, 2))
+        decoded.append(tuple(maskAlpha(entry, colorFormat)))
+    return words, decoded
+
+def encodeVqTexture(rgba, width, height, colorFormat = ARGB_1555, dataFormat = VQ,
+                    flipY = True, gbix = None, preset = 'normal', seed = 0, workers = None):
+    if dataFormat not in (VQ, VQ_MM, SMALLVQ, SMALLVQ_MM):
+        raise ValueError("Unsupported data format: 0x%02x" % dataFormat)
+    if colorFormat not in PACK_TABLES:
+        raise ValueError("Unsupported color format: 0x%02x" % colorFormat)
+    if len(rgba) < width * height * 4:
+        raise ValueError("Image data is too short")
+    checkSize(width, height, True)
+
+    rgba = bytes(memoryview(rgba).cast('B')[:width * height * 4])
+    mipmap = dataFormat in (VQ_MM, SMALLVQ_MM)
+    size = codebookSize(dataFormat, width)
+
+    #Levels in storage order, smallest first
+    levels = mipmapChain(rgba, width) if mipmap else [ rgba ]
+    levels = [ maskAlpha(level, colorFormat) for level in reversed(levels) ]
+    sizes = [ width >> (len(levels) - 1 - i) for i in range(len(levels)) ]
+    if flipY:
+        levels = [ flipRows(level, s, s) for level, s in zip(levels, sizes) ]
+    blocks = [ blockVectors(level, s, s) if s > 1 else [] for level, s in zip(levels, sizes) ]
+
+    #Train on the distinct vectors of every level
+    counts = Counter(v for level in blocks for v in level)
+    vectors = list(counts)
+    weights = [ counts[v] for v in vectors ]
+
+    compressor = VqCompressor(size, preset, seed, workers)
+    try:
+        centers = compressor.train(vectors, weights)
+        words, decoded = packCodebook(centers, size, colorFormat)
+        found = dict(zip(vectors, compressor.assign(decoded[:len(centers)], vectors)))
+    finally:
+        compressor.close()
+
+    data = bytearray(words)
+    for level, s, vecs in zip(levels, sizes, blocks):
+        if s == 1:
+            #Entry whose first color is nearest the single pixel
+            pixel = tuple(level)
+            best = min(range(len(centers)), key = lambda i: math.dist(pixel, decoded[i][0:4]))
+            data.append(best)
+            continue
+        indices = bytes(found[v] for v in vecs)
+        data += bytes(twiddlePermutation(s // 2, s // 2)(indices))
+
+    out = bytearray()
+    if gbix is not None:
+        out += gbixHeader(gbix)
+    out += pvrHeader(colorFormat, dataFormat, width, height, len(data))
+    out += data
+    return bytes(out)
+
+def encodeVqImage(filepath, colorFormat = ARGB_1555, dataFormat = VQ, flipY = True,
+                  gbix = None, preset = 'normal', seed = 0, workers = None):
+    width, height, data = readImage(filepath)
+    return encodeVqTexture(data, width, height, colorFormat, dataFormat, flipY, gbix,
+                           preset, seed, workers)
+
+# Call main function
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage = "python vqencode.py <image.png> <texture.pvr>")
+    parser.add_argument("image")
+    parser.add_argument("texture")
+    parser.add_argument("--color", default = "1555", choices = sorted(COLOR_NAMES))
+    parser.add_argument("--format", default = "vq", choices = sorted(FORMAT_NAMES))
+    parser.add_argument("--preset", default = "normal", choices = sorted(PRESETS))
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "processes used to assign vectors")
+    parser.add_argument("--gbix", type = int, default = None,
+                        help = "global index, written as a GBIX header")
+    parser.add_argument("--no-flip", action = "store_true",
+                        help = "store rows top first")
+    args = parser.parse_args()
+
+    try:
+        data = encodeVqImage(args.image, COLOR_NAMES[args.color], FORMAT_NAMES[args.format],
+                             not args.no_flip, args.gbix, args.preset, args.seed, args.workers)
+    except ValueError as err:
+        print(err)
+        sys.exit(1)
+
+    with open(args.texture, 'wb') as f:
+        f.write(data)
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================
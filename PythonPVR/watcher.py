@@ -0,0 +1,297 @@
+#==============================================================
+"""
+
+Watch Mode
+Watches a folder for new or edited pvm and mt5 files and sends
+only the textures that changed back through the pipeline. The
+folder is polled with mtime and size snapshots; on Linux inotify
+wakes the loop as soon as a file is written.
+
+Copyright Benjamin Collins 2016,2018
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this
+software and associated documentation files (the "Software"), to deal in the Software
+without restriction, including without limitation the rights to use, copy, modify, merge,
+publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or
+substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+
+"""
+#==============================================================
+
+import os
+import sys
+import time
+import ctypes
+import select
+import hashlib
+import collections
+import ctypes.util
+
+#Import User Libraries
+from pipeline import openArchive, numberName
+from discimage import readGdiTracks
+
+#File types that are converted
+WATCH_EXTENSIONS = ( ".pvm", ".mt5", ".afs", ".pkf", ".pks", ".gdi", ".iso" )
+
+#inotify event masks
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_WATCH_MASK  = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+#==============================================================
+"""
+Inotify Class
+Wakes the watcher when anything in the folder tree is written.
+Events are only used as a signal; the snapshot decides what
+actually changed, so dropped or merged events are harmless.
+"""
+#==============================================================
+
+class Inotify:
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched = set()
+
+    def addDirectory(self, path):
+        if path in self.watched:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_WATCH_MASK)
+        if wd >= 0:
+            self.watched.add(path)
+
+    def wait(self, timeout):
+        #True when events arrived before the timeout
+        ready = select.select([self.fd], [], [], timeout)[0]
+        if not ready:
+            return False
+
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+def createInotify():
+    #None where inotify is not available
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return Inotify()
+    except (OSError, AttributeError):
+        return None
+
+def statFile(path):
+    #(mtime, size) of a file. A gdi adds those of its data tracks,
+    #which are what change when the disc image is rebuilt.
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    if path.lower().endswith(".gdi"):
+        for track in readGdiTracks(path):
+            stat = os.stat(track[0])
+            key += (stat.st_mtime_ns, stat.st_size)
+    return key
+
+#==============================================================
+"""
+Watcher Class
+Keeps an (mtime, size) snapshot of every watched file and a
+digest of every texture inside them. A changed file is converted
+once its snapshot has stayed the same for the settle time, which
+folds a burst of writes into one conversion. Each texture keeps
+the output name it was first given, so converting only the changed
+textures numbers duplicate names as the first full pass did.
+"""
+#==============================================================
+
+class Watcher:
+
+    def __init__(self, paths, convert, interval = 0.25, settle = 0.2, inotify = True):
+        self.paths = [ os.path.abspath(p) for p in paths ]
+        self.convert = convert
+        self.interval = interval
+        self.settle = settle
+        self.inotify = createInotify() if inotify else None
+        self.snapshot = {}
+        self.digests = {}
+        self.pending = {}
+        self.outputs = {}
+        self.names = set()
+
+    def scan(self):
+        #Stat every watched file, adding new folders to inotify
+        snapshot = {}
+        folders = []
+
+        for path in self.paths:
+            if os.path.isdir(path):
+                folders.append(path)
+            elif path.lower().endswith(WATCH_EXTENSIONS):
+                try:
+                    snapshot[path] = statFile(path)
+                except (OSError, ValueError):
+                    pass
+
+        while folders:
+            folder = folders.pop()
+            if self.inotify is not None:
+                self.inotify.addDirectory(folder)
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks = False):
+                            folders.append(entry.path)
+                        elif entry.name.lower().endswith(WATCH_EXTENSIONS):
+                            try:
+                                snapshot[entry.path] = statFile(entry.path)
+                            except (OSError, ValueError):
+                                pass
+            except OSError:
+                continue
+
+        return snapshot
+
+    def readDigests(self, path):
+        #Digest of each texture's bytes, by texture name and how
+        #many textures of that name came before it in the file
+        archive = openArchive(path)
+        if archive is None:
+            return {}
+
+        digests = {}
+        seen = collections.Counter()
+        bs = archive.bs
+        try:
+            for entry in archive.readTextureEntries():
+                bs.bs.seek(entry['offset'])
+                data = bs.readBytes(entry['length'])
+                digest = hashlib.blake2b(data, digest_size = 16).digest()
+                digests[(entry['name'], seen[entry['name']])] = (digest, entry)
+                seen[entry['name']] += 1
+        finally:
+            bs.close()
+
+        return digests
+
+    def outputName(self, path, key):
+        #Name a texture is written under, numbered against every
+        #watched texture the first time it is seen and kept after
+        output = self.outputs.get((path, key))
+        if output is None:
+            output = numberName(key[0], self.names)
+            self.outputs[(path, key)] = output
+        return output
+
+    def releaseNames(self, path, keys):
+        #Textures that are gone free their names
+        for key in keys:
+            self.names.discard(self.outputs.pop((path, key), None))
+
+    def changedJobs(self, paths):
+        #Jobs holding only the textures whose bytes changed
+        jobs = []
+        for path in sorted(paths):
+            try:
+                digests = self.readDigests(path)
+            except Exception as err:
+                print("Watch error: %s: %s" % (path, err))
+                continue
+
+            previous = self.digests.get(path, {})
+            self.releaseNames(path, set(previous) - set(digests))
+
+            entries = []
+            for key, (digest, entry) in digests.items():
+                entry['unique'] = self.outputName(path, key)
+                if previous.get(key, (None,))[0] != digest:
+                    entries.append(entry)
+            self.digests[path] = digests
+
+            if entries:
+                jobs.append({ 'path' : path, 'entries' : entries, 'cost' : 0.0 })
+
+        return jobs
+
+    def update(self):
+        #Compare a new snapshot and return the files that settled
+        now = time.monotonic()
+        snapshot = self.scan()
+
+        for path, stat in snapshot.items():
+            if self.snapshot.get(path) != stat:
+                self.pending[path] = now
+
+        for path in set(self.snapshot) - set(snapshot):
+            self.releaseNames(path, self.digests.pop(path, {}))
+            self.pending.pop(path, None)
+        self.snapshot = snapshot
+
+        ready = [ path for path, changed in self.pending.items()
+                  if now - changed >= self.settle ]
+        for path in ready:
+            del self.pending[path]
+
+        return ready
+
+    def step(self):
+        ready = self.update()
+        if not ready:
+            return 0
+
+        jobs = self.changedJobs(ready)
+        if not jobs:
+            return 0
+
+        start = time.perf_counter()
+        count = sum(len(job['entries']) for job in jobs)
+        self.convert(jobs)
+        print("Converted %d textures from %d files in %.2fs" %
+              (count, len(jobs), time.perf_counter() - start))
+        return count
+
+    def wait(self):
+        #Sleep until the next poll, or until inotify wakes us
+        timeout = self.interval if self.pending else max(self.interval, 1.0)
+        if self.inotify is None:
+            time.sleep(self.interval)
+        elif self.inotify.wait(timeout):
+            #Let a burst of writes finish before scanning
+            time.sleep(min(self.interval, self.settle))
+
+    def run(self):
+        #Files present at start are converted in the first step
+        try:
+            while True:
+                self.step()
+                self.wait()
+        finally:
+            if self.inotify is not None:
+                self.inotify.close()
+
+#==============================================================
+"""
+Program End
+"""
+#==============================================================